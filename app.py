@@ -3,26 +3,125 @@ PDF Tools Web Application
 A Flask-based web application for various PDF operations.
 """
 
-from flask import Flask, render_template, request, send_file, jsonify, after_this_request
-from pypdf import PdfReader, PdfWriter
+from flask import (
+    Flask, Request, Response, render_template, request, send_file, jsonify, after_this_request, g,
+    has_request_context
+)
+from pypdf import PdfWriter
+from pypdf.errors import FileNotDecryptedError
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NullObject, NumberObject,
+    StreamObject
+)
 from werkzeug.utils import secure_filename
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from merge_pdfs import merge_documents, read_pdf
+from server_sizing import plan as plan_server
 import os
 import uuid
 import tempfile
 import shutil
+import signal
 from datetime import datetime
 import zipfile
 import io
+import hashlib
+import atexit
+import contextlib
+import copy
+import functools
+import itertools
+import json
+import multiprocessing
+import queue
+import re
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 app = Flask(__name__)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max total upload
-app.config['UPLOAD_FOLDER'] = tempfile.mkdtemp()
+# Set UPLOAD_FOLDER to share sessions between gunicorn workers
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER') or tempfile.mkdtemp()
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Job processes import the app again; keep them on the same folder
+os.environ.setdefault('UPLOAD_FOLDER', app.config['UPLOAD_FOLDER'])
 ALLOWED_PDF_EXTENSIONS = {'pdf'}
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
 
+# Number of job processes that run PDF/image work outside the request worker;
+# by default this worker's share of the machine's job slots (server_sizing.py)
+server_plan = plan_server(web_workers=int(os.environ.get('WEB_CONCURRENCY', 0)) or None)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 0)) or server_plan['job_workers']
+# Threads per job for per-image work (Pillow releases the GIL while coding);
+# only a lone job process gets the spare cores by default
+app.config['IMAGE_THREADS'] = int(os.environ.get('IMAGE_THREADS', 0)) or (
+    1 if app.config['JOB_WORKERS'] * server_plan['web_workers'] > 1 else server_plan['image_threads']
+)
+JOB_STATE_FILENAME = 'job.json'
+# Seconds a job may run before it fails with a 504 (0 = no limit), per operation
+# with JOB_TIMEOUT as the default; override with e.g. JOB_TIMEOUTS="compress=900,merge=300"
+DEFAULT_JOB_TIMEOUTS = {
+    'compress': 600,
+    'compress_image': 600,
+    'convert_image': 300,
+    'images_to_pdf': 300,
+    'pipeline': 300,
+    'watermark_images': 600,
+}
+app.config['JOB_TIMEOUT'] = int(os.environ.get('JOB_TIMEOUT', 120))
+app.config['JOB_TIMEOUTS'] = dict(DEFAULT_JOB_TIMEOUTS, **{
+    name.strip(): int(seconds)
+    for name, _, seconds in (item.partition('=') for item in os.environ.get('JOB_TIMEOUTS', '').split(','))
+    if seconds
+})
+# Replace a job process after this many jobs, or after a job peaked above
+# this many bytes of RSS, to hand back memory pypdf and Pillow keep (0 = never)
+app.config['JOB_MAX_TASKS'] = int(os.environ.get('JOB_MAX_TASKS', 0))
+app.config['JOB_MAX_RSS_BYTES'] = int(os.environ.get('JOB_MAX_RSS_BYTES', 0))
+
+# On-disk result cache shared by all workers; RESULT_CACHE_MAX_BYTES=0 disables it
+app.config['RESULT_CACHE_FOLDER'] = os.environ.get(
+    'RESULT_CACHE_FOLDER', os.path.join(tempfile.gettempdir(), 'pdf-tools-cache')
+)
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['RESULT_CACHE_TTL'] = int(os.environ.get('RESULT_CACHE_TTL', 24 * 60 * 60))
+os.makedirs(app.config['RESULT_CACHE_FOLDER'], exist_ok=True)
+
+# Session janitor: age limit, total size limit (0 = none) and sweep interval (0 = off)
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 60 * 60))
+app.config['UPLOAD_QUOTA_BYTES'] = int(os.environ.get('UPLOAD_QUOTA_BYTES', 0))
+app.config['JANITOR_INTERVAL'] = int(os.environ.get('JANITOR_INTERVAL', 5 * 60))
+
+# Metrics of every process are dumped here and summed by /metrics
+app.config['METRICS_FOLDER'] = os.environ.get(
+    'METRICS_FOLDER', os.path.join(tempfile.gettempdir(), 'pdf-tools-metrics')
+)
+os.makedirs(app.config['METRICS_FOLDER'], exist_ok=True)
+# Seconds between metric dumps of a web worker; jobs and /metrics always dump
+app.config['METRICS_DUMP_INTERVAL'] = float(os.environ.get('METRICS_DUMP_INTERVAL', 10))
+# Add a Server-Timing header with per-phase timings to JSON responses
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+# jpegtran (libjpeg-turbo) enables lossless JPEG rotate/flip/crop; without it the pixel path is used
+app.config['JPEGTRAN'] = os.environ.get('JPEGTRAN', 'jpegtran')
+
 
 def allowed_file(filename, allowed_extensions):
     """Check if file has allowed extension."""
@@ -37,24 +136,1018 @@ def get_session_folder():
     return session_id, session_folder
 
 
+# ============== UPLOAD INGESTION ==============
+# Uploaded file parts are streamed by the multipart parser straight into a
+# hidden file in UPLOAD_FOLDER, hashed as they arrive, and checked against the
+# magic bytes expected for their extension as soon as the first bytes are in.
+# A mismatch aborts parsing of the request body right there. Routes then move
+# the file into the session folder with save_upload instead of copying it.
+INCOMING_PREFIX = '.incoming-'
+PDF_SNIFF_LENGTH = 1024  # readers accept junk before %PDF- within the first 1 KB
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',
+    b'\xff\xd8\xff',
+    b'GIF87a',
+    b'GIF89a',
+    b'BM',
+    b'II*\x00',
+    b'MM\x00*'
+)
+
+
+class UploadRejected(Exception):
+    """Raised while parsing an upload whose content does not match its type."""
+    # Not a ValueError: Werkzeug silently swallows those while parsing forms
+
+
+def content_matches_extension(header, extension):
+    """Check an upload's first bytes against the magic bytes for its extension."""
+    if extension in ALLOWED_PDF_EXTENSIONS:
+        return b'%PDF-' in header[:PDF_SNIFF_LENGTH]
+    if extension in ALLOWED_IMAGE_EXTENSIONS:
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return True
+        return header.startswith(IMAGE_SIGNATURES)
+    # Unknown extensions are rejected by the routes' allowed_file check
+    return True
+
+
+class IngestFile:
+    """Writable upload stream that hashes and sniffs content on the way to disk."""
+
+    def __init__(self, folder, filename):
+        self.filename = filename or ''
+        self.extension = self.filename.rsplit('.', 1)[1].lower() if '.' in self.filename else ''
+        self.path = os.path.join(folder, f"{INCOMING_PREFIX}{uuid.uuid4()}")
+        self.file = open(self.path, 'w+b')
+        self.digest = hashlib.sha256()
+        self.header = b''
+        self.sniffed = False
+        self.claimed = False
+
+    def sniff(self):
+        self.sniffed = True
+        if not content_matches_extension(self.header, self.extension):
+            raise UploadRejected(f"Invalid file: {self.filename}. Its content does not match its type.")
+
+    def write(self, data):
+        if not self.sniffed:
+            self.header += data[:PDF_SNIFF_LENGTH]
+            if len(self.header) >= PDF_SNIFF_LENGTH:
+                self.sniff()
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def seek(self, *args):
+        # The parser seeks back to 0 once the part is complete
+        if not self.sniffed:
+            self.sniff()
+        return self.file.seek(*args)
+
+    def claim(self, filepath):
+        """Move the finished upload to filepath and return its SHA-256."""
+        self.file.close()
+        os.replace(self.path, filepath)
+        self.claimed = True
+        return self.digest.hexdigest()
+
+    def close(self):
+        self.file.close()
+        if not self.claimed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class IngestRequest(Request):
+    """Request that streams file uploads through IngestFile."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = IngestFile(app.config['UPLOAD_FOLDER'], filename)
+        self.__dict__.setdefault('ingest_files', []).append(stream)
+        return stream
+
+    def _load_form_data(self):
+        # Uploads are written to disk while the form is parsed
+        with timed_phase('upload'):
+            super()._load_form_data()
+
+    def close(self):
+        super().close()
+        # Also covers streams of a body whose parsing was aborted
+        for stream in self.__dict__.get('ingest_files', []):
+            stream.close()
+
+
+app.request_class = IngestRequest
+
+
+def save_upload(file, filepath):
+    """Save an uploaded file to filepath and return its SHA-256."""
+    if isinstance(file.stream, IngestFile):
+        return file.stream.claim(filepath)
+    file.save(filepath)
+    return file_sha256(filepath)
+
+
+# ============== RESULT CACHE ==============
+# Finished results are kept on local disk, keyed on the SHA-256 of the inputs
+# plus the operation and its normalized parameters. A hit copies (or hard
+# links) the stored output into the new session without running the job.
+# Entries are evicted oldest-used first above RESULT_CACHE_MAX_BYTES and once
+# older than RESULT_CACHE_TTL seconds. Hits and misses are counted in the
+# metrics (pdftools_result_cache_total), so they add up over all workers.
+RESULT_CACHE_PAYLOAD_FILENAME = 'result.json'
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_cache_key(operation, input_digests, **params):
+    """Build the cache key for an operation on inputs with the given SHA-256s, or None if disabled."""
+    if app.config['RESULT_CACHE_MAX_BYTES'] <= 0:
+        return None
+
+    digest = hashlib.sha256(operation.encode('utf-8'))
+    for input_digest in input_digests:
+        digest.update(input_digest.encode('ascii'))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Hard link src to dst, copying when linking is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def copy_result_outputs(src_folder, dst_folder, filename):
+    """Copy a result's output file, or the output folder of a streamed zip."""
+    src_path = os.path.join(src_folder, filename)
+    if os.path.isfile(src_path):
+        link_or_copy(src_path, os.path.join(dst_folder, filename))
+    else:
+        shutil.copytree(
+            os.path.join(src_folder, 'output'),
+            os.path.join(dst_folder, 'output'),
+            copy_function=link_or_copy,
+            dirs_exist_ok=True
+        )
+
+
+def load_cached_result(cache_key, session_id, session_folder):
+    """Return the cached payload for a key with its outputs copied into the session, or None."""
+    entry_folder = os.path.join(app.config['RESULT_CACHE_FOLDER'], cache_key)
+    try:
+        with open(os.path.join(entry_folder, RESULT_CACHE_PAYLOAD_FILENAME)) as f:
+            payload = json.load(f)
+
+        if time.time() - os.path.getmtime(entry_folder) > app.config['RESULT_CACHE_TTL']:
+            raise OSError('expired')
+
+        # Copy beside the inputs first: the entry may be evicted mid-copy, and
+        # on a miss the job still needs its inputs
+        staging_folder = os.path.join(session_folder, f".cached-{uuid.uuid4()}")
+        os.makedirs(staging_folder)
+        try:
+            copy_result_outputs(entry_folder, staging_folder, payload['filename'])
+        except OSError:
+            shutil.rmtree(staging_folder, ignore_errors=True)
+            raise
+        # Mark as recently used for LRU eviction
+        os.utime(entry_folder)
+    except (OSError, ValueError, KeyError):
+        observe('pdftools_result_cache_total', 1, result='miss')
+        return None
+
+    clear_session_folder(session_folder, keep=os.path.basename(staging_folder))
+    for entry in os.listdir(staging_folder):
+        os.replace(os.path.join(staging_folder, entry), os.path.join(session_folder, entry))
+    os.rmdir(staging_folder)
+
+    observe('pdftools_result_cache_total', 1, result='hit')
+    payload['session_id'] = session_id
+    return payload
+
+
+def store_cached_result(cache_key, session_folder, payload):
+    """Store a successful result's payload and outputs under its cache key."""
+    cache_folder = app.config['RESULT_CACHE_FOLDER']
+    entry_folder = os.path.join(cache_folder, cache_key)
+    if os.path.exists(entry_folder):
+        return
+
+    # Build the entry beside the cache and rename it into place atomically
+    tmp_folder = f"{entry_folder}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(tmp_folder, exist_ok=True)
+        copy_result_outputs(session_folder, tmp_folder, payload['filename'])
+        with open(os.path.join(tmp_folder, RESULT_CACHE_PAYLOAD_FILENAME), 'w') as f:
+            json.dump(payload, f)
+        os.rename(tmp_folder, entry_folder)
+    except OSError:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        return
+
+    evict_cached_results()
+
+
+def folder_size(folder):
+    """Return the total size in bytes of the files under a folder."""
+    total = 0
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def list_cached_results():
+    """Return [(last_used, size, path), ...] for the complete cache entries."""
+    cache_folder = app.config['RESULT_CACHE_FOLDER']
+    entries = []
+    for name in os.listdir(cache_folder):
+        path = os.path.join(cache_folder, name)
+        if name.endswith('.tmp') or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), folder_size(path), path))
+        except OSError:
+            pass
+    return entries
+
+
+def evict_cached_results():
+    """Drop expired entries, then least recently used ones until under the size limit."""
+    entries = sorted(list_cached_results())
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+
+    for last_used, size, path in entries:
+        if now - last_used <= app.config['RESULT_CACHE_TTL'] and total <= app.config['RESULT_CACHE_MAX_BYTES']:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+# ============== SESSION JANITOR ==============
+# Session folders that are never downloaded would otherwise stay on disk
+# forever. The sweeper removes folders older than SESSION_TTL seconds, then
+# evicts the oldest ones while UPLOAD_FOLDER exceeds UPLOAD_QUOTA_BYTES.
+# Queued/running jobs and folders still receiving uploads are left alone,
+# unless a job's state has not changed for longer than the longest job timeout
+# plus SESSION_TTL: such a job was lost with its worker and is failed and swept.
+# A lock file keeps concurrent sweepers (one per gunicorn worker, or the
+# janitor.py CLI) from working at the same time.
+JANITOR_LOCK_FILENAME = '.janitor.lock'
+JANITOR_GRACE_SECONDS = 60
+_janitor_pid = None
+
+
+def session_last_activity(session_folder):
+    """Return the most recent modification time of a session folder or its job state."""
+    last_activity = os.path.getmtime(session_folder)
+    state_path = os.path.join(session_folder, JOB_STATE_FILENAME)
+    if os.path.exists(state_path):
+        last_activity = max(last_activity, os.path.getmtime(state_path))
+    return last_activity
+
+
+def longest_job_timeout():
+    """The longest time any job may run, or None if some job may run forever."""
+    timeouts = [app.config['JOB_TIMEOUT'], *app.config['JOB_TIMEOUTS'].values()]
+    return None if 0 in timeouts else max(timeouts)
+
+
+def session_is_active(session_folder, ttl):
+    """
+    Check whether a session's job is still queued or running.
+    A job whose state is older than the longest job timeout plus ttl was lost
+    (its worker or job process died): it is marked failed and reported inactive.
+    """
+    state_path = os.path.join(session_folder, JOB_STATE_FILENAME)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        age = time.time() - os.path.getmtime(state_path)
+    except (OSError, ValueError):
+        return False
+
+    if state.get('status') not in ('queued', 'running'):
+        return False
+    timeout = longest_job_timeout()
+    if timeout is None or age <= timeout + ttl:
+        return True
+    fail_job(session_folder, 500, 'The job was lost before it finished. Please try again.')
+    return False
+
+
+def sweep_session_folders(upload_folder, ttl, quota=0):
+    """
+    Remove expired session folders, then the oldest ones above the quota.
+    Returns a report dict with the number of folders removed and bytes reclaimed,
+    or None if another sweeper holds the lock.
+    """
+    lock_file = open(os.path.join(upload_folder, JANITOR_LOCK_FILENAME), 'a')
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+
+        now = time.time()
+        sessions = []
+        stale_uploads = []
+        for name in os.listdir(upload_folder):
+            path = os.path.join(upload_folder, name)
+            if name.startswith(INCOMING_PREFIX):
+                # Partial uploads left behind by a crashed worker
+                try:
+                    if now - os.path.getmtime(path) > ttl:
+                        stale_uploads.append((os.path.getsize(path), path))
+                except OSError:
+                    pass
+                continue
+            if not os.path.isdir(path):
+                continue
+            try:
+                sessions.append((session_last_activity(path), folder_size(path), path))
+            except OSError:
+                # Removed by a download while we were listing
+                continue
+        sessions.sort()
+
+        report = {'expired': 0, 'evicted': 0, 'reclaimed_bytes': 0, 'remaining_bytes': 0}
+        total = sum(size for _, size, _ in sessions)
+
+        for size, path in stale_uploads:
+            try:
+                os.remove(path)
+                report['reclaimed_bytes'] += size
+            except OSError:
+                pass
+
+        for last_activity, size, path in sessions:
+            age = now - last_activity
+            if age < JANITOR_GRACE_SECONDS or session_is_active(path, ttl):
+                continue
+            if age > ttl:
+                reason = 'expired'
+            elif quota and total > quota:
+                reason = 'evicted'
+            else:
+                continue
+
+            shutil.rmtree(path, ignore_errors=True)
+            report[reason] += 1
+            report['reclaimed_bytes'] += size
+            total -= size
+
+        report['remaining_bytes'] = total
+        return report
+
+    finally:
+        lock_file.close()
+
+
+def janitor_loop():
+    """Sweep the upload folder every JANITOR_INTERVAL seconds."""
+    while True:
+        time.sleep(app.config['JANITOR_INTERVAL'])
+        try:
+            report = sweep_session_folders(
+                app.config['UPLOAD_FOLDER'],
+                app.config['SESSION_TTL'],
+                app.config['UPLOAD_QUOTA_BYTES']
+            )
+            if report and (report['expired'] or report['evicted']):
+                app.logger.info(
+                    "Janitor removed %d expired and %d evicted sessions, reclaimed %d bytes",
+                    report['expired'], report['evicted'], report['reclaimed_bytes']
+                )
+        except Exception:
+            app.logger.exception("Janitor sweep failed")
+
+
+@app.before_request
+def start_janitor():
+    """Start the janitor thread once per worker process."""
+    global _janitor_pid
+    if app.config['JANITOR_INTERVAL'] > 0 and _janitor_pid != os.getpid():
+        _janitor_pid = os.getpid()
+        threading.Thread(target=janitor_loop, name='session-janitor', daemon=True).start()
+
+
+# ============== METRICS ==============
+# Every process (web workers and job processes) keeps its own counters
+# and dumps them to METRICS_FOLDER/<pid>-<start>.json; /metrics sums the files
+# so the numbers cover the whole deployment, like job.json does for jobs.
+# Files of exited processes are folded into METRICS_AGGREGATE_FILENAME.
+METRICS_AGGREGATE_FILENAME = 'aggregate.json'
+METRICS_LOCK_FILENAME = '.metrics.lock'
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** n for n in range(11))  # 1 KB .. 1 GB
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+METRIC_HELP = {
+    'pdftools_request_seconds': ('Request handling time by route', SECONDS_BUCKETS),
+    'pdftools_request_bytes': ('Request body size by route', BYTES_BUCKETS),
+    'pdftools_phase_seconds': ('Time spent per phase of an operation', SECONDS_BUCKETS),
+    'pdftools_input_bytes': ('Total input size per operation', BYTES_BUCKETS),
+    'pdftools_output_bytes': ('Output size per operation', BYTES_BUCKETS),
+    'pdftools_pages': ('Pages handled per operation', COUNT_BUCKETS),
+    'pdftools_images': ('Images handled per operation', COUNT_BUCKETS),
+    'pdftools_peak_rss_bytes': ('Peak resident memory of the job process per operation', BYTES_BUCKETS),
+    # Counters: no buckets, the value is the sum
+    'pdftools_result_cache_total': ('Result cache lookups by result (hit or miss)', ()),
+}
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+_metrics_started = time.time()
+_metrics_dumped = 0.0
+# Phase timings of the job running in this job process, None outside jobs
+_job_timings = None
+
+
+def observe(name, value, **labels):
+    """Add a sample to a histogram of this process."""
+    buckets = METRIC_HELP[name][1]
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        series = _metrics.get(key)
+        if series is None:
+            series = _metrics[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        series['buckets'][index] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+
+def current_timings():
+    """Phase timings of the job running in this process, or of the current request."""
+    if _job_timings is not None:
+        return _job_timings
+    if has_request_context():
+        return g.setdefault('timings', {})
+    return {}
+
+
+@contextlib.contextmanager
+def timed_phase(phase):
+    """Add the time spent in the block to the current request's or job's phase timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = current_timings()
+        # Image batches time their phases from several threads at once
+        with _metrics_lock:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+def reset_peak_rss():
+    """Reset the process's peak RSS counter (Linux), so the next reading covers one job."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, or None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def record_job_metrics(operation, timings, input_bytes, payload, rss):
+    """Record a finished job's phases, sizes and counts."""
+    for phase, seconds in timings.items():
+        observe('pdftools_phase_seconds', seconds, operation=operation, phase=phase)
+    observe('pdftools_input_bytes', input_bytes, operation=operation)
+    if payload.get('file_size') is not None:
+        observe('pdftools_output_bytes', payload['file_size'], operation=operation)
+    if payload.get('total_pages') is not None:
+        observe('pdftools_pages', payload['total_pages'], operation=operation)
+    images = payload.get('images_processed', payload.get('images_converted', payload.get('total_images')))
+    if images is not None:
+        observe('pdftools_images', images, operation=operation)
+    if rss is not None:
+        observe('pdftools_peak_rss_bytes', rss, operation=operation)
+
+
+def reset_metrics():
+    """Start empty metrics under a new file, e.g. in a new job process."""
+    global _metrics, _metrics_lock, _metrics_started, _metrics_dumped
+    _metrics = {}
+    _metrics_lock = threading.Lock()
+    _metrics_started = time.time()
+    _metrics_dumped = 0.0
+
+
+def write_metrics_file(path, metrics):
+    """Atomically write summed metrics to a JSON file."""
+    data = [[name, dict(labels), series] for (name, labels), series in metrics.items()]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def dump_metrics(force=False):
+    """
+    Write this process's metrics to the shared metrics folder, at most once
+    per METRICS_DUMP_INTERVAL unless forced.
+    """
+    global _metrics_dumped
+    now = time.monotonic()
+    if not force and now - _metrics_dumped < app.config['METRICS_DUMP_INTERVAL']:
+        return
+    _metrics_dumped = now
+    with _metrics_lock:
+        if not _metrics:
+            return
+        metrics = copy.deepcopy(_metrics)
+    path = os.path.join(app.config['METRICS_FOLDER'], f"{os.getpid()}-{int(_metrics_started)}.json")
+    try:
+        write_metrics_file(path, metrics)
+    except OSError:
+        pass
+
+
+# Web workers flush what the interval held back when they exit
+atexit.register(dump_metrics, force=True)
+
+
+def sum_metric_files(folder, entries):
+    """Sum the metrics in the given files of the metrics folder."""
+    totals = {}
+    for entry in entries:
+        try:
+            with open(os.path.join(folder, entry)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, series in data:
+            if name not in METRIC_HELP:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            total = totals.get(key)
+            if total is None:
+                totals[key] = {'buckets': list(series['buckets']), 'sum': series['sum'], 'count': series['count']}
+            else:
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], series['buckets'])]
+                total['sum'] += series['sum']
+                total['count'] += series['count']
+    return totals
+
+
+def process_exited(pid):
+    """Return True if no process with this pid exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # Exists but belongs to another user
+        pass
+    return False
+
+
+def fold_exited_metrics(folder):
+    """
+    Merge the metric files of exited processes into the aggregate file and
+    remove them, so the folder holds one file per live process.
+    """
+    # os.kill(pid, 0) sends CTRL_C_EVENT on Windows; only fold where flock exists
+    if fcntl is None:
+        return
+    with open(os.path.join(folder, METRICS_LOCK_FILENAME), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # Another worker is folding
+
+        exited = []
+        for entry in os.listdir(folder):
+            pid = entry.split('-', 1)[0]
+            if entry.endswith('.json') and pid.isdigit() and process_exited(int(pid)):
+                exited.append(entry)
+        if not exited:
+            return
+
+        totals = sum_metric_files(folder, [METRICS_AGGREGATE_FILENAME] + exited)
+        try:
+            write_metrics_file(os.path.join(folder, METRICS_AGGREGATE_FILENAME), totals)
+        except OSError:
+            return
+        for entry in exited:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(folder, entry))
+
+
+def collect_metrics():
+    """Sum the metrics dumped by every process."""
+    folder = app.config['METRICS_FOLDER']
+    dump_metrics(force=True)
+    fold_exited_metrics(folder)
+    return sum_metric_files(folder, [entry for entry in os.listdir(folder) if entry.endswith('.json')])
+
+
+def render_prometheus(totals):
+    """Format summed histograms in the Prometheus text exposition format."""
+    def label_text(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}' if pairs else ''
+
+    lines = []
+    for name, (help_text, buckets) in METRIC_HELP.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {"histogram" if buckets else "counter"}')
+        for (series_name, labels), series in sorted(totals.items()):
+            if series_name != name:
+                continue
+            if not buckets:
+                lines.append(f'{name}{label_text(labels)} {series["sum"]:g}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{label_text(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{label_text(labels)} {series["sum"]}')
+            lines.append(f'{name}_count{label_text(labels)} {series["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing_header(timings):
+    """Format phase timings as a Server-Timing header value."""
+    return ', '.join(f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in timings.items())
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request time and size, and add a Server-Timing header to JSON responses."""
+    started = g.get('request_started')
+    if started is None or request.endpoint in (None, 'static', 'metrics'):
+        return response
+
+    elapsed = time.perf_counter() - started
+    # Same names as the job operations (watermark_pdf_route -> watermark_pdf)
+    route = request.endpoint.removesuffix('_route')
+    observe('pdftools_request_seconds', elapsed, route=route, status=response.status_code)
+    if request.content_length:
+        observe('pdftools_request_bytes', request.content_length, route=route)
+    for phase, seconds in g.get('timings', {}).items():
+        observe('pdftools_phase_seconds', seconds, operation=route, phase=phase)
+    dump_metrics()
+
+    if app.config['SERVER_TIMING'] and response.mimetype == 'application/json':
+        # Finished job results also carry the timings of the job itself
+        timings = dict(g.get('job_timings') or {}, **g.get('timings', {}))
+        timings['total'] = elapsed
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+# ============== JOB QUEUE ==============
+# Jobs are identified by their session id. State lives in job.json inside the
+# session folder so that any gunicorn worker can answer /jobs/<id>, and the
+# existing session_id/filename download contract keeps working unchanged.
+_job_queue = None
+_job_slots = []
+_job_slots_pid = None
+_job_slots_lock = threading.Lock()
+# Handlers a job process must not inherit from a gunicorn or dev server worker
+JOB_PROCESS_SIGNALS = ('SIGTERM', 'SIGQUIT', 'SIGHUP', 'SIGUSR1', 'SIGUSR2', 'SIGWINCH', 'SIGABRT')
+# Job processes are started by a forkserver (spawn on Windows), not forked from
+# the web worker: its request threads may hold locks (metrics, logging, IO)
+# that a forked child would inherit locked. They import the app afresh, with
+# the app preloaded in the forkserver, and get the worker's config.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    JOB_PROCESS_CONTEXT = multiprocessing.get_context('forkserver')
+    JOB_PROCESS_CONTEXT.set_forkserver_preload([__name__])
+else:
+    JOB_PROCESS_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class JobSlot:
+    """
+    One job process and the thread that feeds it jobs from the worker's queue.
+
+    The process is reused between jobs. It is replaced after JOB_MAX_TASKS
+    jobs or once a job went over JOB_MAX_RSS_BYTES, and only once it has
+    exited, so a slot never holds more than one job process. A job that runs
+    past its timeout is killed with its process, which also stops its thread
+    pools and any Pillow call that cannot be interrupted from inside.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.jobs = 0
+        # Session folder of the running job, None while idle
+        self.session_folder = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def start_process(self):
+        self.connection, child_connection = JOB_PROCESS_CONTEXT.Pipe()
+        self.process = JOB_PROCESS_CONTEXT.Process(
+            target=job_process_loop, args=(child_connection, dict(app.config)), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.jobs = 0
+
+    def stop_process(self, kill=False):
+        """Stop the job process (at once if kill) and return its exit code."""
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join()
+        exitcode = self.process.exitcode
+        self.connection.close()
+        self.process = None
+        return exitcode
+
+    def run(self):
+        while True:
+            session_folder, task, args, cache_key = _job_queue.get()
+            self.session_folder = session_folder
+            try:
+                self.run_job(session_folder, task, args, cache_key)
+            except Exception as e:
+                fail_job(session_folder, 500, f'Job failed: {e}')
+            finally:
+                self.session_folder = None
+                _job_queue.task_done()
+
+    def run_job(self, session_folder, task, args, cache_key):
+        if self.process is None:
+            self.start_process()
+        timeout = job_timeout(task)
+        self.connection.send((session_folder, task, args, cache_key))
+        self.jobs += 1
+
+        try:
+            finished = self.connection.poll(timeout or None)
+            rss = self.connection.recv() if finished else None
+        except (EOFError, OSError):
+            # The process died mid-job, e.g. at the hands of the OOM killer
+            exitcode = self.stop_process(kill=True)
+            fail_job(session_folder, 500, f'Job failed: the job process exited with code {exitcode}')
+            return
+
+        if not finished:
+            self.stop_process(kill=True)
+            fail_job(session_folder, 504, f'Operation timed out after {timeout} seconds')
+            return
+
+        max_tasks, max_rss = app.config['JOB_MAX_TASKS'], app.config['JOB_MAX_RSS_BYTES']
+        if (max_tasks and self.jobs >= max_tasks) or (max_rss and rss and rss > max_rss):
+            self.stop_process()
+
+
+def job_process_loop(connection, config):
+    """
+    Run the jobs a JobSlot sends until it sends None; reply with each job's
+    peak RSS. config is the starting worker's app.config.
+    """
+    app.config.update(config)
+    for name in JOB_PROCESS_SIGNALS:
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    # Ctrl+C on the dev server reaches the whole process group; the server stops the jobs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with contextlib.suppress(ValueError, AttributeError):
+        signal.set_wakeup_fd(-1)
+    # A file of its own, even if the pid of an earlier job process comes back
+    reset_metrics()
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        connection.send(run_job(*job))
+
+
+def start_job_slots():
+    """Return this worker's job queue, starting JOB_WORKERS slots after fork if needed."""
+    global _job_queue, _job_slots, _job_slots_pid
+    with _job_slots_lock:
+        if _job_slots_pid != os.getpid():
+            _job_queue = queue.Queue()
+            _job_slots = [JobSlot() for _ in range(app.config['JOB_WORKERS'])]
+            _job_slots_pid = os.getpid()
+        return _job_queue
+
+
+def jobs_in_progress():
+    """Number of jobs queued or running in this worker."""
+    if _job_slots_pid != os.getpid():
+        return 0
+    return _job_queue.unfinished_tasks
+
+
+def abandon_jobs(error):
+    """Fail this worker's queued and running jobs, when it exits before they finish."""
+    if _job_slots_pid != os.getpid():
+        return
+    session_folders = [slot.session_folder for slot in _job_slots if slot.session_folder]
+    while True:
+        try:
+            session_folders.append(_job_queue.get_nowait()[0])
+        except queue.Empty:
+            break
+    for session_folder in session_folders:
+        fail_job(session_folder, 503, error)
+
+
+def job_timeout(task):
+    """Seconds a task may run (0 = no limit)."""
+    operation = task.__name__.replace('_task', '')
+    return app.config['JOB_TIMEOUTS'].get(operation, app.config['JOB_TIMEOUT'])
+
+
+def write_job_state(session_folder, **fields):
+    """Update the job state file atomically."""
+    state_path = os.path.join(session_folder, JOB_STATE_FILENAME)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    state.update(fields)
+    state['updated'] = time.time()
+
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+    return state
+
+
+def read_job_state(job_id):
+    """Return (session_folder, state) for a job, or (session_folder, None) if unknown."""
+    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(job_id))
+    state_path = os.path.join(session_folder, JOB_STATE_FILENAME)
+    try:
+        with open(state_path) as f:
+            return session_folder, json.load(f)
+    except (OSError, ValueError):
+        return session_folder, None
+
+
+def clear_session_folder(session_folder, keep=None):
+    """Remove inputs and outputs of a failed job, keeping only its state file (and keep)."""
+    for entry in os.listdir(session_folder):
+        if entry in (JOB_STATE_FILENAME, keep):
+            continue
+        path = os.path.join(session_folder, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def fail_job(session_folder, status_code, error):
+    """Record a job as failed and remove its files."""
+    clear_session_folder(session_folder)
+    write_job_state(
+        session_folder,
+        status='failed',
+        finished=time.time(),
+        status_code=status_code,
+        result={'success': False, 'error': error}
+    )
+
+
+def run_job(session_folder, task, args, cache_key=None):
+    """
+    Run a task in a job process and record its (payload, status) result.
+    Returns the job's peak RSS in bytes (None if unknown). Timeouts are
+    enforced by the JobSlot, which kills the process.
+    """
+    global _job_timings
+    write_job_state(session_folder, status='running', started=time.time())
+    operation = task.__name__.replace('_task', '')
+
+    input_bytes = folder_size(session_folder)
+    _job_timings = {}
+    reset_peak_rss()
+    started = time.perf_counter()
+    try:
+        payload, status_code = task(*args)
+    except Exception as e:
+        payload, status_code = {'success': False, 'error': str(e)}, 500
+
+    timings = dict(_job_timings, job=time.perf_counter() - started)
+    _job_timings = None
+    rss = peak_rss()
+    if status_code == 200:
+        record_job_metrics(operation, timings, input_bytes, payload, rss)
+        dump_metrics(force=True)
+
+    if status_code != 200:
+        clear_session_folder(session_folder)
+    elif cache_key:
+        store_cached_result(cache_key, session_folder, payload)
+    write_job_state(
+        session_folder,
+        status='done' if status_code == 200 else 'failed',
+        finished=time.time(),
+        status_code=status_code,
+        result=payload,
+        timings=timings
+    )
+    return rss
+
+
+def submit_job(session_id, session_folder, task, *args, cache_key=None):
+    """
+    Queue a task for this worker's job processes and return the 202 job response.
+    If cache_key has a cached result, the job is finished immediately and
+    its result is returned with a 200 instead.
+    """
+    if cache_key:
+        payload = load_cached_result(cache_key, session_id, session_folder)
+        if payload is not None:
+            payload['cached'] = True
+            now = time.time()
+            write_job_state(
+                session_folder, job_id=session_id, status='done', created=now,
+                started=now, finished=now, status_code=200, result=payload
+            )
+            return jsonify(dict(payload, job_id=session_id)), 200
+
+    write_job_state(session_folder, job_id=session_id, status='queued', created=time.time())
+    start_job_slots().put((session_folder, task, args, cache_key))
+
+    return jsonify({
+        'success': True,
+        'job_id': session_id,
+        'session_id': session_id,
+        'status': 'queued',
+        'status_url': f'/jobs/{session_id}',
+        'result_url': f'/jobs/{session_id}/result'
+    }), 202
+
+
 # ============== MERGE PDF ==============
 def merge_pdfs(pdf_files, output_path):
-    """Merge multiple PDF files into a single PDF."""
-    writer = PdfWriter()
-    total_pages = 0
-
+    """
+    Merge multiple PDF files into a single PDF.
+    Uses the deduplicating engine in merge_pdfs.py; see its module docstring
+    for the memory ceiling per merged page.
+    """
     try:
         for pdf_file in pdf_files:
             if not os.path.exists(pdf_file):
                 return False, f"File not found: {pdf_file}", 0
 
-            reader = PdfReader(pdf_file)
-            for page in reader.pages:
-                writer.add_page(page)
-                total_pages += 1
-
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        with timed_phase('process'):
+            total_pages = merge_documents(pdf_files, output_path)
 
         return True, "PDFs merged successfully!", total_pages
 
@@ -62,90 +1155,598 @@ def merge_pdfs(pdf_files, output_path):
         return False, f"Error merging PDFs: {str(e)}", 0
 
 
+# ============== PAGE SELECTION ==============
+# One selection item: a keyword, or a page/range with an optional step ("1-9:2", "10-", "-3--1")
+PAGE_ITEM_PATTERN = re.compile(r'^(-?\d+)(?:(-)(-?\d+)?)?(?::(\d+))?$')
+PAGE_KEYWORDS = {
+    'all': (1, None, 1),
+    'odd': (1, None, 2),
+    'even': (2, None, 2),
+}
+
+
+@functools.lru_cache(maxsize=256)
+def compile_page_selection(spec):
+    """
+    Compile a page selection into (first, last, step) items with 1-based bounds.
+
+    Items are separated by commas: single pages ("5"), ranges ("1-3"), open
+    ranges ("10-" to the end), negative pages counted from the end ("-1" is
+    the last page, "-3--1" the last three), steps ("1-20:5"), descending
+    ranges ("9-1") and the keywords all, odd and even. last is None for an
+    open end. Raises ValueError on invalid syntax.
+    """
+    items = []
+    for token in spec.replace(' ', '').lower().split(','):
+        if not token:
+            continue
+        if token in PAGE_KEYWORDS:
+            items.append(PAGE_KEYWORDS[token])
+            continue
+
+        match = PAGE_ITEM_PATTERN.match(token)
+        if not match:
+            raise ValueError(f"Invalid page selection: '{token}'")
+        first, dash, last, step = match.groups()
+        first = int(first)
+        last = int(last) if last is not None else (None if dash else first)
+        step = int(step or 1)
+        if first == 0 or last == 0 or step == 0:
+            raise ValueError(f"Invalid page selection: '{token}' (pages start at 1)")
+        items.append((first, last, step))
+
+    if not items:
+        raise ValueError("Empty page selection")
+    return tuple(items)
+
+
+class PageSelection:
+    """
+    The 0-based page indices a selection picks out of a document.
+
+    Pages are kept as range objects in selection order plus a one-byte-per-page
+    map, so membership and the page count are O(1) and building the selection
+    is linear in the page count with no per-page Python work. Iteration yields
+    each page once, in the order the selection names them.
+    """
+
+    def __init__(self, items, total_pages):
+        self.total_pages = total_pages
+        self.ranges = []
+        self._flags = bytearray(total_pages)
+
+        for first, last, step in items:
+            page_range = self._resolve(first, last, step)
+            if not page_range:
+                continue
+            self.ranges.append(page_range)
+            ascending = page_range if page_range.step > 0 else page_range[::-1]
+            self._flags[ascending.start:ascending.stop:ascending.step] = b'\x01' * len(ascending)
+
+        self._count = self._flags.count(1)
+
+    def _resolve(self, first, last, step):
+        """Turn 1-based, possibly negative or open bounds into a clamped range."""
+        total = self.total_pages
+        start = first - 1 if first > 0 else total + first
+        stop = total - 1 if last is None else (last - 1 if last > 0 else total + last)
+
+        if start <= stop:
+            start, stop = max(start, 0), min(stop, total - 1)
+            return range(start, stop + 1, step) if start <= stop else range(0)
+        if last is None:
+            # An open range starting past the end selects nothing; only explicit bounds descend
+            return range(0)
+        start, stop = min(start, total - 1), max(stop, 0)
+        return range(start, stop - 1, -step) if start >= stop else range(0)
+
+    def __contains__(self, index):
+        return 0 <= index < self.total_pages and self._flags[index] == 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        if len(self.ranges) == 1:
+            yield from self.ranges[0]
+            return
+        seen = bytearray(self.total_pages)
+        for page_range in self.ranges:
+            for index in page_range:
+                if not seen[index]:
+                    seen[index] = 1
+                    yield index
+
+
+def select_pages(spec, total_pages):
+    """Resolve a page selection string against a document with total_pages pages."""
+    return PageSelection(compile_page_selection(spec), total_pages)
+
+
 # ============== SPLIT PDF ==============
-def split_pdf(pdf_path, split_mode, split_value, output_folder):
+# Object types a page can point at that belong to the document, not the page
+SPLIT_STOP_TYPES = {'/Page', '/Pages', '/Catalog'}
+# Per-object xref entry plus the page tree, catalog and trailer of a part
+SPLIT_OBJECT_OVERHEAD = 20
+SPLIT_PART_OVERHEAD = 300
+# Serialized objects kept for reuse by later parts; larger sets are re-read from the input
+SPLIT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def without_references(obj, idnums):
+    """Return a copy of obj with its references to the objects idnums replaced by null."""
+    if isinstance(obj, IndirectObject):
+        return NullObject() if obj.idnum in idnums else obj
+    if isinstance(obj, DictionaryObject):
+        clone = copy.copy(obj)
+        for key in obj:
+            clone[key] = without_references(obj.raw_get(key), idnums)
+        return clone
+    if isinstance(obj, ArrayObject):
+        return ArrayObject(without_references(item, idnums) for item in obj)
+    return obj
+
+
+class PositionWriter:
+    """Write-only stream wrapper that counts bytes, for streams without tell() (ZIP entries)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+
+    def write(self, data):
+        self.position += len(data)
+        return self.stream.write(data)
+
+    def tell(self):
+        return self.position
+
+
+class SplitSource:
+    """
+    A parsed PDF whose pages are written out as independent documents.
+
+    The source is parsed once. Each page's resource closure (the objects it
+    reaches, minus links back into the page tree) is computed once, and each
+    object is serialized once and reused by every part that needs it. Parts
+    keep the source's object numbers, so a serialized object is valid in any
+    part as is; only the page tree and catalog are new. Parts that share a
+    font or image each embed one copy, as a standalone file must. References
+    to objects a part leaves out, such as a link to a page in another part,
+    are written as null in that part.
+
+    Stream data (images, fonts, content) is dropped once an object's
+    references are known, and serialized bytes are cached up to
+    SPLIT_CACHE_BYTES; anything else is read again from the memory-mapped
+    input when a part needs it. Memory therefore stays bounded by the
+    document's object count, not its size.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.pages = reader.pages
+        self.header = reader.pdf_header.encode('ascii', errors='replace')
+        self.page_tree_id = int(reader.trailer['/Size'])
+        self.catalog_id = self.page_tree_id + 1
+        self._objects = {}
+        self._references = {}
+        self._links = {}
+        self._closures = {}
+        self._serialized = {}
+        self._cached_bytes = 0
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def direct_references(obj, parents=False):
+        """Return the indirect references held directly by obj, ignoring /Parent links unless parents."""
+        references = []
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, IndirectObject):
+                references.append(obj)
+            elif isinstance(obj, DictionaryObject):
+                stack.extend(obj.raw_get(key) for key in obj if parents or key != '/Parent')
+            elif isinstance(obj, ArrayObject):
+                stack.extend(obj)
+        return references
+
+    def scan(self, ref):
+        """Parse an object once and record what it refers to (None for objects parts never copy)."""
+        target = ref.get_object()
+        if target is None or (isinstance(target, DictionaryObject) and target.get('/Type') in SPLIT_STOP_TYPES):
+            self._references[ref.idnum] = None
+            return
+
+        self._references[ref.idnum] = self.direct_references(target)
+        self._links[ref.idnum] = frozenset(link.idnum for link in self.direct_references(target, parents=True))
+        if isinstance(target, StreamObject):
+            # Serialization reads the data again from the input
+            self._objects[ref.idnum] = (ref.generation, None)
+            self.reader.resolved_objects.pop((ref.generation, ref.idnum), None)
+        else:
+            self._objects[ref.idnum] = (ref.generation, target)
+
+    def closure(self, index):
+        """Return the object numbers page index needs, including its own."""
+        if index in self._closures:
+            return self._closures[index]
+
+        page = self.pages[index]
+        ref = page.indirect_reference
+        self._objects[ref.idnum] = (ref.generation, page)
+        ids = {ref.idnum}
+        stack = self.direct_references(page)
+        # A page's /Parent is replaced by the part's page tree
+        self._links[ref.idnum] = frozenset(link.idnum for link in stack)
+
+        while stack:
+            obj = stack.pop()
+            if obj.idnum in ids:
+                continue
+            if obj.idnum not in self._references:
+                self.scan(obj)
+            references = self._references[obj.idnum]
+            if references is None:
+                continue
+            ids.add(obj.idnum)
+            stack.extend(references)
+
+        closure = frozenset(ids)
+        self._closures[index] = closure
+        return closure
+
+    def part_closure(self, indices):
+        """Return the union of the closures of a part's pages."""
+        return frozenset().union(*(self.closure(index) for index in indices))
+
+    def object_bytes(self, idnum, ids=None):
+        """
+        Return the serialized 'N G obj ... endobj' of an object for a part made
+        of the objects ids (or as in the source if None), cached within
+        SPLIT_CACHE_BYTES unless the part leaves out objects it refers to.
+        """
+        dangling = self._links[idnum] - ids if ids is not None else None
+        if not dangling:
+            data = self._serialized.get(idnum)
+            if data is not None:
+                return data
+
+        generation, obj = self._objects[idnum]
+        if obj is None:
+            # The reader's stream position is shared state
+            with self._lock:
+                obj = self.reader.get_object(IndirectObject(idnum, generation, self.reader))
+                self.reader.resolved_objects.pop((generation, idnum), None)
+        if isinstance(obj, DictionaryObject) and obj.get('/Type') == '/Page':
+            obj = DictionaryObject(obj)
+            obj[NameObject('/Parent')] = IndirectObject(self.page_tree_id, 0, None)
+        if dangling:
+            obj = without_references(obj, dangling)
+
+        buffer = io.BytesIO()
+        buffer.write(b'%d %d obj\n' % (idnum, generation))
+        obj.write_to_stream(buffer)
+        buffer.write(b'\nendobj\n')
+        data = buffer.getvalue()
+        if dangling:
+            return data
+
+        with self._lock:
+            if idnum not in self._serialized and self._cached_bytes + len(data) <= SPLIT_CACHE_BYTES:
+                self._serialized[idnum] = data
+                self._cached_bytes += len(data)
+        return data
+
+    def object_size(self, idnum):
+        """Return the bytes an object adds to a part."""
+        return len(self.object_bytes(idnum)) + SPLIT_OBJECT_OVERHEAD
+
+    def plan(self, parts):
+        """Register the parts about to be written, so shared bytes are kept until the last one."""
+        with self._lock:
+            for _, indices in parts:
+                for idnum in self.part_closure(indices):
+                    self._users[idnum] = self._users.get(idnum, 0) + 1
+
+    def write_part(self, f, indices):
+        """Write pages indices (in order) to the stream f as a standalone PDF starting at f.tell() == 0."""
+        ids = self.part_closure(indices)
+        offsets = {}
+
+        f.write(self.header + b'\n%\xe2\xe3\xcf\xd3\n')
+        for idnum in sorted(ids):
+            offsets[idnum] = (f.tell(), self._objects[idnum][0])
+            f.write(self.object_bytes(idnum, ids))
+
+        kids = b' '.join(b'%d %d R' % (self.pages[i].indirect_reference.idnum,
+                                       self.pages[i].indirect_reference.generation) for i in indices)
+        offsets[self.page_tree_id] = (f.tell(), 0)
+        f.write(b'%d 0 obj\n<< /Type /Pages /Kids [ %s ] /Count %d >>\nendobj\n'
+                % (self.page_tree_id, kids, len(indices)))
+        offsets[self.catalog_id] = (f.tell(), 0)
+        f.write(b'%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n'
+                % (self.catalog_id, self.page_tree_id))
+
+        write_xref_table(f, offsets, DictionaryObject({
+            NameObject('/Size'): NumberObject(self.catalog_id + 1),
+            NameObject('/Root'): IndirectObject(self.catalog_id, 0, None),
+        }))
+
+        # Drop serialized objects no later part needs
+        with self._lock:
+            for idnum in ids:
+                self._users[idnum] -= 1
+                if self._users[idnum] <= 0:
+                    data = self._serialized.pop(idnum, None)
+                    if data is not None:
+                        self._cached_bytes -= len(data)
+
+
+def plan_size_parts(source, max_bytes):
+    """Group consecutive pages into parts whose output stays under max_bytes."""
+    parts = []
+    current, current_ids, size = [], set(), SPLIT_PART_OVERHEAD
+
+    for index in range(len(source.pages)):
+        closure = source.closure(index)
+        added = sum(source.object_size(idnum) for idnum in closure - current_ids)
+        if current and size + added > max_bytes:
+            parts.append(current)
+            current, current_ids, size = [], set(), SPLIT_PART_OVERHEAD
+            added = sum(source.object_size(idnum) for idnum in closure)
+        current.append(index)
+        current_ids |= closure
+        size += added
+
+    if current:
+        parts.append(current)
+    return [(f"part_{n}.pdf", indices) for n, indices in enumerate(parts, 1)]
+
+
+def plan_bookmark_parts(reader, total_pages):
+    """Split at each top-level bookmark; pages before the first one join the first part."""
+    starts = {}
+    for item in reader.outline:
+        if isinstance(item, list):  # children of the previous entry
+            continue
+        page = reader.get_destination_page_number(item)
+        if page is not None and 0 <= page < total_pages and page not in starts:
+            starts[page] = item.title or ''
+
+    if not starts:
+        raise ValueError("PDF has no bookmarks to split by")
+
+    ordered = sorted(starts)
+    titles = [starts[page] for page in ordered]
+    ordered[0] = 0
+    ends = ordered[1:] + [total_pages]
+    width = len(str(len(ordered)))
+    return [
+        (f"{n:0{width}d}_{secure_filename(title) or 'section'}.pdf", list(range(start, end)))
+        for n, (start, end, title) in enumerate(zip(ordered, ends, titles), 1)
+    ]
+
+
+def plan_split(source, split_mode, split_value):
+    """
+    Return [(filename, page indices), ...] for a split.
+    Modes: 'all' (each page), 'range' (specific pages), 'chunks' (every N pages),
+    'size' (parts of at most split_value MB), 'bookmarks' (one part per top-level bookmark)
+    """
+    total_pages = len(source.pages)
+
+    if split_mode == 'all':
+        # Split into individual pages
+        return [(f"page_{i + 1}.pdf", [i]) for i in range(total_pages)]
+
+    elif split_mode == 'range':
+        # Extract specific page ranges (e.g., "1-3,5,7-9")
+        selection = list(select_pages(split_value, total_pages))
+        return [("extracted_pages.pdf", selection)] if selection else []
+
+    elif split_mode == 'chunks':
+        # Split into chunks of N pages
+        chunk_size = int(split_value)
+        return [
+            (f"chunk_{(i // chunk_size) + 1}.pdf", list(range(i, min(i + chunk_size, total_pages))))
+            for i in range(0, total_pages, chunk_size)
+        ]
+
+    elif split_mode == 'size':
+        return plan_size_parts(source, float(split_value) * 1024 * 1024)
+
+    elif split_mode == 'bookmarks':
+        return plan_bookmark_parts(source.reader, total_pages)
+
+    raise ValueError(f"Unknown split mode: {split_mode}")
+
+
+def split_pdf(pdf_path, split_mode, split_value, zip_path):
     """
-    Split PDF based on mode.
-    Modes: 'all' (each page), 'range' (specific pages), 'chunks' (every N pages)
+    Split PDF based on mode straight into a stored ZIP archive at zip_path.
+    Each part is serialized into its archive entry, which computes the CRC on
+    the way in: there are no per-part files and nothing is read back. A split
+    that yields one document is written next to zip_path as a plain PDF.
+    Modes: see plan_split
+    Returns (success, message, output path, number of parts, total pages).
     """
     try:
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        output_files = []
-
-        if split_mode == 'all':
-            # Split into individual pages
-            for i, page in enumerate(reader.pages):
-                writer = PdfWriter()
-                writer.add_page(page)
-                output_path = os.path.join(output_folder, f"page_{i + 1}.pdf")
-                with open(output_path, "wb") as f:
-                    writer.write(f)
-                output_files.append(output_path)
-
-        elif split_mode == 'range':
-            # Extract specific page ranges (e.g., "1-3,5,7-9")
-            ranges = split_value.split(',')
-            writer = PdfWriter()
-            extracted_pages = []
-
-            for r in ranges:
-                r = r.strip()
-                if '-' in r:
-                    start, end = map(int, r.split('-'))
-                    for p in range(start, min(end + 1, total_pages + 1)):
-                        if p > 0 and p <= total_pages and p not in extracted_pages:
-                            writer.add_page(reader.pages[p - 1])
-                            extracted_pages.append(p)
-                else:
-                    p = int(r)
-                    if p > 0 and p <= total_pages and p not in extracted_pages:
-                        writer.add_page(reader.pages[p - 1])
-                        extracted_pages.append(p)
-
-            output_path = os.path.join(output_folder, "extracted_pages.pdf")
-            with open(output_path, "wb") as f:
-                writer.write(f)
-            output_files.append(output_path)
-
-        elif split_mode == 'chunks':
-            # Split into chunks of N pages
-            chunk_size = int(split_value)
-            for i in range(0, total_pages, chunk_size):
-                writer = PdfWriter()
-                for j in range(i, min(i + chunk_size, total_pages)):
-                    writer.add_page(reader.pages[j])
-
-                chunk_num = (i // chunk_size) + 1
-                output_path = os.path.join(output_folder, f"chunk_{chunk_num}.pdf")
-                with open(output_path, "wb") as f:
-                    writer.write(f)
-                output_files.append(output_path)
-
-        return True, "PDF split successfully!", output_files, total_pages
+        with timed_phase('parse'):
+            source = SplitSource(read_pdf(pdf_path))
+            total_pages = len(source.pages)
+        with timed_phase('process'):
+            parts = plan_split(source, split_mode, split_value)
+            if not parts:
+                return False, "No pages to split", None, 0, total_pages
+            source.plan(parts)
+
+        with timed_phase('encode'):
+            if len(parts) == 1:
+                name, indices = parts[0]
+                output_path = os.path.join(os.path.dirname(zip_path), name)
+                # The part may share its name with the mapped input
+                with open(f"{output_path}.part", 'wb') as f:
+                    source.write_part(f, indices)
+                os.replace(f"{output_path}.part", output_path)
+            else:
+                output_path = zip_path
+                date_time = time.localtime()[:6]
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive:
+                    for name, indices in parts:
+                        with archive.open(zipfile.ZipInfo(name, date_time), 'w') as entry:
+                            source.write_part(PositionWriter(entry), indices)
+
+        return True, "PDF split successfully!", output_path, len(parts), total_pages
 
     except Exception as e:
-        return False, f"Error splitting PDF: {str(e)}", [], 0
+        return False, f"Error splitting PDF: {str(e)}", None, 0, 0
 
 
 # ============== COMPRESS PDF ==============
+# Target resolution and JPEG quality for embedded images at each level
+PDF_COMPRESSION_LEVELS = {
+    'low': {'dpi': 200, 'quality': 85},
+    'medium': {'dpi': 150, 'quality': 72},
+    'high': {'dpi': 96, 'quality': 55}
+}
+# Filters whose images are bilevel or otherwise worse off as JPEG
+SKIPPED_IMAGE_FILTERS = {'/JBIG2Decode', '/CCITTFaxDecode'}
+
+
+def iter_image_xobjects(resources, seen=None):
+    """Yield image XObject streams reachable from a resources dict, including forms."""
+    if seen is None:
+        seen = set()
+    if not resources or '/XObject' not in resources:
+        return
+
+    for name, ref in resources['/XObject'].items():
+        idnum = getattr(ref, 'idnum', None)
+        if idnum in seen:
+            continue
+        if idnum is not None:
+            seen.add(idnum)
+
+        xobject = ref.get_object()
+        if xobject.get('/Subtype') == '/Image':
+            yield xobject
+        elif xobject.get('/Subtype') == '/Form':
+            yield from iter_image_xobjects(xobject.get('/Resources'), seen)
+
+
+def downsample_image_xobject(xobject, page_size, dpi, quality):
+    """
+    Re-encode an image XObject as JPEG at a target DPI.
+    page_size is the page's (width, height) in inches; the effective DPI is
+    estimated as if the image filled the page, which never overestimates it.
+    Returns (jpeg_bytes, (width, height), mode) or None to keep the original.
+    """
+    filters = xobject.get('/Filter')
+    filters = filters if isinstance(filters, list) else [filters]
+    if (xobject.get('/ImageMask') or '/Decode' in xobject
+            or xobject.get('/BitsPerComponent', 8) != 8
+            or any(f in SKIPPED_IMAGE_FILTERS for f in filters)):
+        return None
+
+    width, height = int(xobject['/Width']), int(xobject['/Height'])
+    page_width, page_height = page_size
+    if (width >= height) != (page_width >= page_height):
+        page_width, page_height = page_height, page_width
+
+    current_dpi = min(width / page_width, height / page_height)
+    if current_dpi <= dpi * 1.05:
+        # Already at or below the target
+        return None
+
+    try:
+        img = xobject.decode_as_image()
+    except Exception:
+        return None
+
+    mode = 'L' if img.mode in ('L', 'LA', '1') else 'RGB'
+    if img.mode != mode:
+        img = img.convert(mode)
+
+    scale = dpi / current_dpi
+    new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    img.close()
+
+    data = buffer.getvalue()
+    if len(data) >= len(xobject._data):
+        return None
+    return data, new_size, mode
+
+
+def replace_image_data(xobject, data, size, mode):
+    """Rewrite an image XObject in place with JPEG data."""
+    components = 1 if mode == 'L' else 3
+    color_space = xobject.get('/ColorSpace')
+    resolved = color_space.get_object() if color_space is not None else None
+    keeps_icc = (
+        isinstance(resolved, list) and resolved[0] == '/ICCBased'
+        and resolved[1].get_object().get('/N') == components
+    )
+    if not keeps_icc:
+        color_space = NameObject('/DeviceGray' if mode == 'L' else '/DeviceRGB')
+
+    # pypdf only re-encodes Flate streams via set_data, so swap the raw bytes
+    xobject._data = data
+    xobject.decoded_self = None
+    xobject[NameObject('/Filter')] = NameObject('/DCTDecode')
+    xobject[NameObject('/Width')] = NumberObject(size[0])
+    xobject[NameObject('/Height')] = NumberObject(size[1])
+    xobject[NameObject('/BitsPerComponent')] = NumberObject(8)
+    xobject[NameObject('/ColorSpace')] = color_space
+    if '/DecodeParms' in xobject:
+        del xobject['/DecodeParms']
+
+
 def compress_pdf(pdf_path, output_path, compression_level='medium'):
     """
-    Compress PDF by removing duplication and compressing streams.
-    compression_level: 'low', 'medium', 'high'
+    Compress PDF by downsampling embedded images and compressing streams.
+    compression_level: 'low', 'medium', 'high' (see PDF_COMPRESSION_LEVELS)
+    Images are re-encoded in parallel on IMAGE_THREADS threads.
     """
     try:
-        reader = PdfReader(pdf_path)
-        writer = PdfWriter()
+        settings = PDF_COMPRESSION_LEVELS.get(compression_level, PDF_COMPRESSION_LEVELS['medium'])
+        with timed_phase('parse'):
+            reader = read_pdf(pdf_path)
+            writer = PdfWriter()
 
-        for page in reader.pages:
+            for page in reader.pages:
+                writer.add_page(page)
+
+        # Collect each distinct image once, with the size of the first page using it
+        images = {}
+        seen = set()
+        for page in writer.pages:
             page.compress_content_streams()
-            writer.add_page(page)
+            page_size = (float(page.mediabox.width) / 72, float(page.mediabox.height) / 72)
+            for xobject in iter_image_xobjects(page.get('/Resources'), seen):
+                images.setdefault(id(xobject), (xobject, page_size))
+
+        with timed_phase('process'), ThreadPoolExecutor(max_workers=app.config['IMAGE_THREADS']) as pool:
+            futures = {
+                pool.submit(
+                    downsample_image_xobject, xobject, page_size,
+                    settings['dpi'], settings['quality']
+                ): xobject
+                for xobject, page_size in images.values()
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    replace_image_data(futures[future], *result)
 
-        # Remove duplication
         writer.add_metadata(reader.metadata or {})
 
-        with open(output_path, "wb") as f:
+        with timed_phase('encode'), open(output_path, "wb") as f:
             writer.write(f)
 
         original_size = os.path.getsize(pdf_path)
@@ -158,36 +1759,178 @@ def compress_pdf(pdf_path, output_path, compression_level='medium'):
         return False, f"Error compressing PDF: {str(e)}", 0, 0, 0
 
 
+# ============== INCREMENTAL UPDATE ==============
+# Trailer keys carried into an update; xref stream keys (/W, /Index, ...) are rebuilt
+TRAILER_KEYS = ('/Root', '/Info', '/ID')
+STARTXREF_SEARCH_BYTES = 2048
+
+
+def find_startxref(pdf_path):
+    """
+    Return (offset, is_stream) of a PDF's last cross-reference section, or
+    None if the file does not end in a usable startxref.
+    """
+    with open(pdf_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        f.seek(max(0, file_size - STARTXREF_SEARCH_BYTES))
+        tail = f.read()
+
+        index = tail.rfind(b'startxref')
+        if index < 0:
+            return None
+        digits = tail[index + len(b'startxref'):].split(maxsplit=1)
+        if not digits or not digits[0].isdigit():
+            return None
+        offset = int(digits[0])
+        if offset >= file_size:
+            return None
+
+        f.seek(offset)
+        head = f.read(32)
+
+    if head.startswith(b'xref'):
+        return offset, False
+    if re.match(rb'\s*\d+\s+\d+\s+obj', head):
+        return offset, True
+    return None
+
+
+def xref_subsections(ids):
+    """Group sorted object numbers into (first, count) runs."""
+    runs = []
+    for idnum in ids:
+        if runs and runs[-1][0] + runs[-1][1] == idnum:
+            runs[-1][1] += 1
+        else:
+            runs.append([idnum, 1])
+    return runs
+
+
+def write_xref_table(f, offsets, trailer):
+    """
+    Write a cross-reference table, trailer and startxref at the current position.
+    offsets maps object numbers to (byte offset, generation); numbers may have gaps.
+    """
+    startxref = f.tell()
+    # Starting with the free head entry keeps readers that expect
+    # a zero-indexed first subsection happy
+    f.write(b'xref\n0 1\n0000000000 65535 f\r\n')
+    for first, count in xref_subsections(sorted(offsets)):
+        f.write(b'%d %d\n' % (first, count))
+        for idnum in range(first, first + count):
+            f.write(b'%010d %05d n\r\n' % offsets[idnum])
+    f.write(b'trailer\n')
+    trailer.write_to_stream(f)
+    f.write(b'\nstartxref\n%d\n%%%%EOF\n' % startxref)
+
+
+def write_incremental_update(pdf_path, output_path, reader, objects, trailer_updates=None):
+    """
+    Write a copy of a PDF with an incremental update appended.
+
+    objects maps (object number, generation) to the new value of that object;
+    objects numbered from reader.trailer['/Size'] up are added. Only those
+    objects and a new cross-reference section are serialized; the original
+    bytes, including every content stream, are copied untouched. The update
+    uses an xref table or an xref stream to match the original file.
+
+    Returns False, without writing, for files that cannot take an update
+    (encrypted, or a damaged startxref); callers then rewrite the document.
+    """
+    xref = find_startxref(pdf_path)
+    if xref is None or reader.is_encrypted:
+        return False
+    prev, use_stream = xref
+
+    shutil.copyfile(pdf_path, output_path)
+    with open(output_path, 'ab') as f:
+        f.write(b'\n')
+        offsets = {}
+        for (idnum, generation), obj in sorted(objects.items()):
+            offsets[idnum] = (f.tell(), generation)
+            f.write(b'%d %d obj\n' % (idnum, generation))
+            obj.write_to_stream(f)
+            f.write(b'\nendobj\n')
+
+        size = max([int(reader.trailer['/Size'])] + [idnum + 1 for idnum in offsets])
+        trailer = DictionaryObject({
+            NameObject(key): reader.trailer.raw_get(key) for key in TRAILER_KEYS if key in reader.trailer
+        })
+        trailer.update(trailer_updates or {})
+        trailer[NameObject('/Prev')] = NumberObject(prev)
+
+        startxref = f.tell()
+        if use_stream:
+            # The xref stream is an object too and lists itself
+            offsets[size] = (startxref, 0)
+            size += 1
+            ids = sorted(offsets)
+            width = max(4, (startxref.bit_length() + 7) // 8)
+            data = b''.join(
+                b'\x01' + offsets[idnum][0].to_bytes(width, 'big') + offsets[idnum][1].to_bytes(2, 'big')
+                for idnum in ids
+            )
+            trailer.update({
+                NameObject('/Type'): NameObject('/XRef'),
+                NameObject('/Size'): NumberObject(size),
+                NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(width), NumberObject(2)]),
+                NameObject('/Index'): ArrayObject([
+                    NumberObject(value) for run in xref_subsections(ids) for value in run
+                ]),
+            })
+            xref_stream = StreamObject()
+            xref_stream._data = data
+            xref_stream.update(trailer)
+            f.write(b'%d 0 obj\n' % (size - 1))
+            xref_stream.write_to_stream(f)
+            f.write(b'\nendobj\n')
+            f.write(b'startxref\n%d\n%%%%EOF\n' % startxref)
+        else:
+            trailer[NameObject('/Size')] = NumberObject(size)
+            write_xref_table(f, offsets, trailer)
+
+    return True
+
+
 # ============== ROTATE PDF ==============
-def rotate_pdf(pdf_path, output_path, rotation, pages='all'):
+def rotate_pdf(pdf_path, output_path, rotation, pages='all', incremental=False):
     """
     Rotate PDF pages.
     rotation: 90, 180, 270
-    pages: 'all' or comma-separated page numbers (e.g., '1,3,5')
+    pages: 'all' or a page selection (e.g., '1,3,5-7', see compile_page_selection)
+    incremental: append only the rotated page dictionaries to the original
+    file instead of rewriting it, when the file allows it
     """
     try:
-        reader = PdfReader(pdf_path)
-        writer = PdfWriter()
-        total_pages = len(reader.pages)
+        with timed_phase('parse'):
+            reader = read_pdf(pdf_path)
+            total_pages = len(reader.pages)
 
         # Parse pages to rotate
-        if pages == 'all':
-            pages_to_rotate = set(range(total_pages))
-        else:
-            pages_to_rotate = set()
-            for p in pages.split(','):
-                p = p.strip()
-                if p.isdigit():
-                    page_num = int(p) - 1  # Convert to 0-indexed
-                    if 0 <= page_num < total_pages:
-                        pages_to_rotate.add(page_num)
+        pages_to_rotate = select_pages(pages, total_pages)
+
+        if incremental:
+            updated = {}
+            for i in pages_to_rotate:
+                page = reader.pages[i]
+                page.rotate(int(rotation))
+                ref = page.indirect_reference
+                updated[(ref.idnum, ref.generation)] = page
+            with timed_phase('encode'):
+                written = write_incremental_update(pdf_path, output_path, reader, updated)
+            if written:
+                return True, "PDF rotated successfully!", total_pages, len(pages_to_rotate)
+            with timed_phase('parse'):
+                reader = read_pdf(pdf_path)
 
+        writer = PdfWriter()
         for i, page in enumerate(reader.pages):
             if i in pages_to_rotate:
                 page.rotate(int(rotation))
             writer.add_page(page)
 
-        with open(output_path, "wb") as f:
+        with timed_phase('encode'), open(output_path, "wb") as f:
             writer.write(f)
 
         return True, "PDF rotated successfully!", total_pages, len(pages_to_rotate)
@@ -200,98 +1943,505 @@ def rotate_pdf(pdf_path, output_path, rotation, pages='all'):
 def extract_pages(pdf_path, output_path, page_selection):
     """
     Extract specific pages from PDF.
-    page_selection: e.g., '1-3,5,7-9'
+    page_selection: e.g., '1-3,5,7-9' (see compile_page_selection)
+    The pages are streamed out by the split engine (see SplitSource), so
+    memory does not grow with the size of the document.
     """
     try:
-        reader = PdfReader(pdf_path)
-        writer = PdfWriter()
-        total_pages = len(reader.pages)
-        extracted_count = 0
-
-        # Parse page selection
-        ranges = page_selection.split(',')
-        extracted_pages = []
-
-        for r in ranges:
-            r = r.strip()
-            if '-' in r:
-                start, end = map(int, r.split('-'))
-                for p in range(start, min(end + 1, total_pages + 1)):
-                    if p > 0 and p <= total_pages and p not in extracted_pages:
-                        writer.add_page(reader.pages[p - 1])
-                        extracted_pages.append(p)
-                        extracted_count += 1
-            else:
-                p = int(r)
-                if p > 0 and p <= total_pages and p not in extracted_pages:
-                    writer.add_page(reader.pages[p - 1])
-                    extracted_pages.append(p)
-                    extracted_count += 1
+        with timed_phase('parse'):
+            source = SplitSource(read_pdf(pdf_path))
+            total_pages = len(source.pages)
 
-        if extracted_count == 0:
+        selection = select_pages(page_selection, total_pages)
+        if len(selection) == 0:
             return False, "No valid pages selected", 0, 0
 
-        with open(output_path, "wb") as f:
-            writer.write(f)
+        indices = list(selection)
+        with timed_phase('process'):
+            source.plan([(output_path, indices)])
+        with timed_phase('encode'), open(output_path, 'wb') as f:
+            source.write_part(f, indices)
 
-        return True, "Pages extracted successfully!", total_pages, extracted_count
+        return True, "Pages extracted successfully!", total_pages, len(selection)
 
     except Exception as e:
         return False, f"Error extracting pages: {str(e)}", 0, 0
 
 
-# ============== IMAGES TO PDF ==============
-def images_to_pdf(image_paths, output_path, page_size='A4'):
+# ============== INSPECT PDF ==============
+# A pre-flight index of a PDF from its trailer, xref and page tree alone.
+# XObjects are recognized from the dictionary in front of their stream, so no
+# image data is read; only Form XObjects are parsed, to follow the images in
+# their resources. Indexes are cached per request worker by the upload's
+# SHA-256, so the split or extract that follows an /inspect can reject an
+# empty page selection without parsing the document again. The job itself
+# still opens the document, since it needs the page objects, not the count.
+PDF_INDEX_CACHE_ENTRIES = 256
+XOBJECT_HEADER_LENGTH = 2048
+SUBTYPE_PATTERN = re.compile(rb'/Subtype\s*/([A-Za-z0-9]+)')
+STREAM_START_PATTERN = re.compile(rb'stream|endobj')
+pdf_index_cache = {}
+pdf_index_lock = threading.Lock()
+
+
+def xobject_subtype(reader, ref):
+    """Return the /Subtype of the XObject at ref (e.g. '/Image') without reading its stream."""
+    offset = reader.xref.get(ref.generation, {}).get(ref.idnum)
+    if offset is None:
+        return parsed_subtype(ref)
+
+    # Read until the stream keyword; large dictionaries take more than one read
+    reader.stream.seek(offset)
+    header = b''
+    while True:
+        chunk = reader.stream.read(XOBJECT_HEADER_LENGTH)
+        # Back up a little, in case the keyword was split across two reads
+        search_from = max(0, len(header) - 5)
+        header += chunk
+        match = STREAM_START_PATTERN.search(header, search_from)
+        if match or not chunk:
+            break
+    if match:
+        header = header[:match.start()]
+
+    # Only the XObject's own key counts, not one of a nested dictionary (/Measure, /OC)
+    nested = False
+    for match in SUBTYPE_PATTERN.finditer(header):
+        depth = header.count(b'<<', 0, match.start()) - header.count(b'>>', 0, match.start())
+        if depth == 1:
+            return '/' + match.group(1).decode('latin-1')
+        nested = True
+    return parsed_subtype(ref) if nested else None
+
+
+def parsed_subtype(ref):
+    """Return the /Subtype of the object at ref by parsing it, stream included."""
+    obj = ref.get_object()
+    return obj.get('/Subtype') if isinstance(obj, DictionaryObject) else None
+
+
+def collect_images(reader, resources, images, forms):
     """
-    Convert multiple images to a single PDF.
+    Add the object numbers of the image XObjects in resources to images,
+    following the resources of Form XObjects (recorded in forms).
+    """
+    pending = [resources]
+    while pending:
+        xobjects = pending.pop().get_object().get('/XObject')
+        if xobjects is None:
+            continue
+        xobjects = xobjects.get_object()
+        for name in xobjects:
+            ref = xobjects.raw_get(name)
+            if not isinstance(ref, IndirectObject) or ref.idnum in images or ref.idnum in forms:
+                continue
+            subtype = xobject_subtype(reader, ref)
+            if subtype == '/Image':
+                images.add(ref.idnum)
+            elif subtype == '/Form':
+                forms.add(ref.idnum)
+                form_resources = ref.get_object().get('/Resources')
+                if form_resources is not None:
+                    pending.append(form_resources)
+
+
+def inspect_pdf(pdf_path):
+    """
+    Return the page count, page sizes (in points) and rotations, encryption
+    flag, image count and byte size of a PDF.
+    Encrypted PDFs that do not open with an empty password report only the
+    encryption flag and byte size.
     """
+    reader = read_pdf(pdf_path)
+    index = {
+        'file_size': os.path.getsize(pdf_path),
+        'encrypted': reader.is_encrypted,
+        'page_count': None,
+        'pages': [],
+        'image_count': None,
+    }
+
     try:
-        # Page sizes in points (72 points = 1 inch)
-        page_sizes = {
-            'A4': (595, 842),
-            'Letter': (612, 792),
-            'Legal': (612, 1008),
-            'A3': (842, 1191),
-            'Fit': None  # Use image size
-        }
-
-        images = []
-        for img_path in image_paths:
-            img = Image.open(img_path)
-
-            # Convert to RGB if necessary (for PNG with transparency, etc.)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
+        pages = reader.pages
+        index['page_count'] = len(pages)
+    except FileNotDecryptedError:
+        return index
+
+    images = set()
+    forms = set()
+    for page in pages:
+        box = page.mediabox
+        index['pages'].append({
+            'width': round(float(box.width), 2),
+            'height': round(float(box.height), 2),
+            'rotation': page.rotation % 360,
+        })
 
-            images.append(img)
+        resources = page.get('/Resources')
+        if resources is not None:
+            collect_images(reader, resources, images, forms)
 
-        if not images:
-            return False, "No valid images found", 0
+    index['image_count'] = len(images)
+    return index
 
-        # Save as PDF
-        first_image = images[0]
-        if len(images) > 1:
-            first_image.save(
-                output_path,
-                'PDF',
-                save_all=True,
-                append_images=images[1:],
-                resolution=100.0
-            )
-        else:
-            first_image.save(output_path, 'PDF', resolution=100.0)
 
-        # Clean up
-        for img in images:
-            img.close()
+def pdf_index(pdf_path, digest):
+    """Return inspect_pdf(pdf_path), cached by the file's SHA-256."""
+    with pdf_index_lock:
+        index = pdf_index_cache.pop(digest, None)
+        if index is not None:
+            pdf_index_cache[digest] = index
+            return index
+
+    with timed_phase('parse'):
+        index = inspect_pdf(pdf_path)
+
+    with pdf_index_lock:
+        pdf_index_cache[digest] = index
+        while len(pdf_index_cache) > PDF_INDEX_CACHE_ENTRIES:
+            del pdf_index_cache[next(iter(pdf_index_cache))]
+    return index
+
+
+def check_page_selection(pdf_path, digest, spec):
+    """Return an error message if spec selects no page of the PDF, else None."""
+    try:
+        total_pages = pdf_index(pdf_path, digest)['page_count']
+    except Exception:
+        # Unreadable PDFs are reported by the job itself
+        return None
+
+    if total_pages is None or len(select_pages(spec, total_pages)) > 0:
+        return None
+    return f"No valid pages selected: the PDF has {total_pages} page{'s' if total_pages != 1 else ''}"
+
+
+# ============== WATERMARK PDF ==============
+# Helvetica advance widths for ASCII 32-126, in 1/1000 em (Adobe core font metrics)
+HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+HELVETICA_DEFAULT_WIDTH = 556
+HELVETICA_CAP_HEIGHT = 718
+HELVETICA_DESCENT = -207
+# The stamp is drawn once at 1000 pt, so its units are glyph units, and scaled per page
+STAMP_FONT_SIZE = 1000
+STAMP_GRAY = 0.5
+
+
+def helvetica_width(text):
+    """Return the advance width of text in Helvetica, in 1/1000 em."""
+    width = 0
+    for char in text:
+        code = ord(char)
+        width += HELVETICA_WIDTHS[code - 32] if 32 <= code <= 126 else HELVETICA_DEFAULT_WIDTH
+    return width
+
+
+def pdf_literal(text):
+    """Encode text as a PDF literal string for a WinAnsi font."""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def build_stamp_xobject(writer, text, opacity):
+    """
+    Add a form XObject drawing text in Helvetica to writer and return its reference.
+
+    Text is mid-gray rather than the white used on images, which would vanish
+    on white paper; opacity (0-255) is applied through an ExtGState.
+    """
+    alpha = FloatObject(round(opacity / 255, 4))
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+    })
+    resources = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/F1'): writer._add_object(font)}),
+        NameObject('/ExtGState'): DictionaryObject({
+            NameObject('/GS1'): DictionaryObject({NameObject('/ca'): alpha, NameObject('/CA'): alpha})
+        }),
+    })
+
+    stamp = StreamObject()
+    stamp._data = (
+        b'q /GS1 gs %.2f g BT /F1 %d Tf 0 0 Td ' % (STAMP_GRAY, STAMP_FONT_SIZE)
+        + pdf_literal(text) + b' Tj ET Q'
+    )
+    stamp.update({
+        NameObject('/Type'): NameObject('/XObject'),
+        NameObject('/Subtype'): NameObject('/Form'),
+        NameObject('/BBox'): ArrayObject([
+            NumberObject(0), NumberObject(HELVETICA_DESCENT),
+            NumberObject(helvetica_width(text)), NumberObject(STAMP_FONT_SIZE)
+        ]),
+        NameObject('/Resources'): resources,
+    })
+    return writer._add_object(stamp)
+
+
+def stamp_matrix(page, text, position):
+    """
+    Return the cm matrix placing the stamp on a page.
+
+    Placement mirrors watermark_image: the font size scales with the shorter
+    side of the page as displayed, and the position is taken in the displayed
+    orientation so the text stays upright on pages with /Rotate.
+    """
+    box = page.cropbox
+    left, bottom = float(box.left), float(box.bottom)
+    width, height = float(box.width), float(box.height)
+    rotate = page.get('/Rotate', 0) % 360
+    shown_width, shown_height = (height, width) if rotate in (90, 270) else (width, height)
+
+    font_size = max(20, min(shown_width, shown_height) // 20)
+    scale = font_size / STAMP_FONT_SIZE
+    text_width = helvetica_width(text) * scale
+    text_height = HELVETICA_CAP_HEIGHT * scale
+
+    # Top-left corner in the displayed page (y down), then the baseline origin (y up)
+    x, y = watermark_origin((shown_width, shown_height), (text_width, text_height), position)
+    y = shown_height - y - text_height
+
+    if rotate == 90:
+        matrix = (0, scale, -scale, 0, width - y, x)
+    elif rotate == 180:
+        matrix = (-scale, 0, 0, -scale, width - x, height - y)
+    elif rotate == 270:
+        matrix = (0, -scale, scale, 0, y, height - x)
+    else:
+        matrix = (scale, 0, 0, scale, x, y)
+    return matrix[:4] + (matrix[4] + left, matrix[5] + bottom)
+
+
+def stamp_page(writer, page, stamp, matrix, save_state):
+    """Reference the stamp from a page's resources and draw it over the page content."""
+    resources = page.get('/Resources')
+    if resources is None:
+        resources = DictionaryObject()
+        page[NameObject('/Resources')] = resources
+    resources = resources.get_object()
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        xobjects = DictionaryObject()
+        resources[NameObject('/XObject')] = xobjects
+    xobjects = xobjects.get_object()
+
+    # Pages can share a resources dictionary; reuse the name if the stamp is already there
+    names = (f'/Stamp{i}' for i in itertools.count())
+    name = next(n for n in names if n not in xobjects or xobjects.raw_get(n) == stamp)
+    xobjects[NameObject(name)] = stamp
+
+    overlay = StreamObject()
+    overlay._data = b'Q q %s cm %s Do Q' % (
+        ' '.join(f'{value:.4f}' for value in matrix).encode('ascii'), name.encode('ascii')
+    )
+
+    # Wrap the existing content in q/Q so its graphics state cannot leak into the stamp
+    contents = page.get('/Contents')
+    if contents is None:
+        existing = []
+    elif isinstance(contents.get_object(), ArrayObject):
+        existing = list(contents.get_object())
+    else:
+        existing = [contents]
+    page[NameObject('/Contents')] = ArrayObject([save_state, *existing, writer._add_object(overlay)])
+
+
+def watermark_pdf(pdf_path, output_path, text, position='bottom-right', opacity=128):
+    """
+    Stamp text on every page of a PDF.
+    position: 'top-left', 'top-right', 'bottom-left', 'bottom-right', 'center'
+    The stamp is stored once as a form XObject that every page references.
+    """
+    try:
+        with timed_phase('parse'):
+            reader = read_pdf(pdf_path)
+            total_pages = len(reader.pages)
+        writer = PdfWriter()
+
+        with timed_phase('process'):
+            stamp = build_stamp_xobject(writer, text, opacity)
+            save_state = StreamObject()
+            save_state._data = b'q'
+            save_state = writer._add_object(save_state)
+
+            for page in reader.pages:
+                page = writer.add_page(page)
+                stamp_page(writer, page, stamp, stamp_matrix(page, text, position), save_state)
+
+        with timed_phase('encode'), open(output_path, "wb") as f:
+            writer.write(f)
+
+        return True, "Watermark added successfully!", total_pages
+
+    except Exception as e:
+        return False, f"Error adding watermark: {str(e)}", 0
+
+
+# ============== IMAGES TO PDF ==============
+# Page sizes in points (72 points = 1 inch); 'Fit' sizes each page to its image
+PDF_PAGE_SIZES = {
+    'A4': (595, 842),
+    'Letter': (612, 792),
+    'Legal': (612, 1008),
+    'A3': (842, 1191),
+    'Fit': None
+}
+IMAGE_PDF_RESOLUTION = 100.0  # natural size of an image on the page, in DPI
+IMAGE_PDF_MARGIN = 36  # half an inch around images on fixed-size pages
+
+
+class IncrementalPdfWriter:
+    """
+    Minimal PDF writer that emits each object to disk as soon as it is added,
+    so memory use does not grow with the number of pages.
+    Object 1 is the catalog and object 2 the page tree; both are written last.
+    """
+
+    def __init__(self, output_file):
+        self.out = output_file
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3
+        self.out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def reserve(self):
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def write_object(self, object_id, body):
+        self.offsets[object_id] = self.out.tell()
+        self.out.write(b'%d 0 obj\n' % object_id + body + b'\nendobj\n')
+
+    def write_stream(self, object_id, dictionary, source, length):
+        """Write a stream object whose data is copied from a file-like source."""
+        self.offsets[object_id] = self.out.tell()
+        self.out.write(b'%d 0 obj\n<< %s /Length %d >>\nstream\n' % (object_id, dictionary, length))
+        shutil.copyfileobj(source, self.out, 1024 * 1024)
+        self.out.write(b'\nendstream\nendobj\n')
+
+    def add_page(self, page_size, image_id, placement):
+        """Add a page that draws image_id at placement (width, height, x, y)."""
+        content_id, page_id = self.reserve(), self.reserve()
+        content = b'q %.2f 0 0 %.2f %.2f %.2f cm /Im0 Do Q' % placement
+        self.write_stream(content_id, b'', io.BytesIO(content), len(content))
+        self.write_object(page_id, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+            b'/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+        ) % (page_size[0], page_size[1], image_id, content_id))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        self.write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        self.write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self.out.tell()
+        self.out.write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_id)
+        for object_id in range(1, self.next_id):
+            self.out.write(b'%010d 00000 n \n' % self.offsets[object_id])
+        self.out.write(
+            b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, xref_offset)
+        )
+
+
+def image_page_layout(image_size, page_size):
+    """
+    Return (page_size, placement) for an image, placement being (width, height, x, y).
+    Fixed page sizes are turned to match the image's orientation, and the
+    image is centered and scaled down (never up) to fit inside the margins.
+    """
+    natural_width = image_size[0] * 72 / IMAGE_PDF_RESOLUTION
+    natural_height = image_size[1] * 72 / IMAGE_PDF_RESOLUTION
+
+    if page_size is None:
+        return (natural_width, natural_height), (natural_width, natural_height, 0, 0)
+
+    page_width, page_height = page_size
+    if (natural_width > natural_height) != (page_width > page_height):
+        page_width, page_height = page_height, page_width
+
+    scale = min(
+        1.0,
+        (page_width - 2 * IMAGE_PDF_MARGIN) / natural_width,
+        (page_height - 2 * IMAGE_PDF_MARGIN) / natural_height
+    )
+    width, height = natural_width * scale, natural_height * scale
+    return (page_width, page_height), (width, height, (page_width - width) / 2, (page_height - height) / 2)
 
-        return True, "Images converted to PDF successfully!", len(images)
+
+def images_to_pdf(image_paths, output_path, page_size='A4'):
+    """
+    Convert multiple images to a single PDF.
+    Pages are written one image at a time, so peak memory is one decoded image
+    regardless of page count. RGB and grayscale JPEGs are embedded as-is
+    (DCTDecode) without being decoded at all.
+    page_size: 'A4', 'Letter', 'Legal', 'A3' or 'Fit' (page sized to the image)
+    """
+    try:
+        page_dimensions = PDF_PAGE_SIZES.get(page_size, PDF_PAGE_SIZES['A4'])
+        image_count = 0
+
+        with open(output_path, 'wb') as output_file:
+            writer = IncrementalPdfWriter(output_file)
+
+            for img_path in image_paths:
+                with Image.open(img_path) as img:
+                    image_size = img.size
+
+                    if img.format == 'JPEG' and img.mode in ('RGB', 'L'):
+                        # Embed the original JPEG bytes directly
+                        mode = img.mode
+                        length = os.path.getsize(img_path)
+                        source = open(img_path, 'rb')
+                    else:
+                        # Convert to RGB if necessary (for PNG with transparency, etc.)
+                        if img.mode in ('RGBA', 'LA', 'P'):
+                            background = Image.new('RGB', img.size, (255, 255, 255))
+                            if img.mode == 'P':
+                                img = img.convert('RGBA')
+                            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+                            img = background
+                        elif img.mode not in ('RGB', 'L'):
+                            img = img.convert('RGB')
+
+                        # Same DCT encoding Pillow's PDF writer applies to RGB images
+                        mode = img.mode
+                        buffer = io.BytesIO()
+                        with timed_phase('encode'):
+                            img.save(buffer, 'JPEG')
+                        img.close()
+                        length = buffer.tell()
+                        buffer.seek(0)
+                        source = buffer
+
+                color_space = b'/DeviceGray' if mode == 'L' else b'/DeviceRGB'
+                image_id = writer.reserve()
+                with source:
+                    writer.write_stream(image_id, (
+                        b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+                        b'/ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode'
+                    ) % (image_size[0], image_size[1], color_space), source, length)
+
+                page, placement = image_page_layout(image_size, page_dimensions)
+                writer.add_page(page, image_id, placement)
+                image_count += 1
+
+            if image_count == 0:
+                return False, "No valid images found", 0
+
+            writer.close()
+
+        return True, "Images converted to PDF successfully!", image_count
 
     except Exception as e:
         return False, f"Error converting images: {str(e)}", 0
@@ -345,6 +2495,211 @@ def compress_image(image_path, output_path, quality=75):
         return False, f"Error compressing image: {str(e)}", 0, 0, 0
 
 
+# ============== IMAGE HELPERS ==============
+# In-memory building blocks shared by the single-step image tools and /pipeline
+# Downscales decode/reduce to no less than this multiple of the target size
+# before the final LANCZOS pass (see resize_quality_check.py)
+RESIZE_REDUCING_GAP = 2.0
+
+def flatten_to_rgb(img):
+    """Composite an image with transparency or a palette onto white."""
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    if img.mode == 'RGBA':
+        background.paste(img, mask=img.split()[-1])
+    else:
+        background.paste(img)
+    return background
+
+
+def save_image_as(img, output_path, img_format, quality=None, optimize=False):
+    """
+    Encode an image, converting modes the target format cannot hold.
+    quality defaults to 90 for JPEG and to the encoder's default otherwise.
+    """
+    with timed_phase('encode'):
+        img_format = img_format.upper()
+        if img_format in ('JPG', 'JPEG'):
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = flatten_to_rgb(img)
+            elif img.mode not in ('RGB', 'L', 'CMYK'):
+                img = img.convert('RGB')
+            img.save(output_path, 'JPEG', quality=quality or 90, optimize=optimize)
+        elif img_format == 'PNG':
+            img.save(output_path, 'PNG', optimize=optimize)
+        elif img_format == 'WEBP':
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            options = {'quality': quality} if quality else {}
+            img.save(output_path, 'WEBP', **options)
+        else:
+            img.save(output_path, img_format)
+
+
+def resize_dimensions(original_size, width=None, height=None, maintain_aspect=True):
+    """Calculate the target size of a resize."""
+    original_width, original_height = original_size
+
+    if maintain_aspect:
+        if width and height:
+            # Fit within both dimensions
+            ratio = min(width / original_width, height / original_height)
+            return int(original_width * ratio), int(original_height * ratio)
+        elif width:
+            ratio = width / original_width
+            return width, int(original_height * ratio)
+        elif height:
+            ratio = height / original_height
+            return int(original_width * ratio), height
+        return original_width, original_height
+
+    return width or original_width, height or original_height
+
+
+def decode_for_resize(img, target_size):
+    """
+    Ask the decoder for a reduced-resolution image ahead of a downscale.
+
+    JPEG decoders can scale by 1/2, 1/4 or 1/8 in the DCT domain (draft mode),
+    which skips most of the decode work. The draft is kept at least
+    RESIZE_REDUCING_GAP times the target size so the final LANCZOS pass still
+    has enough pixels to produce the same result as a full decode. Must be
+    called before the image is loaded; other formats are left untouched.
+    """
+    if img.format == 'JPEG':
+        width, height = target_size
+        img.draft(img.mode, (int(width * RESIZE_REDUCING_GAP), int(height * RESIZE_REDUCING_GAP)))
+    return img
+
+
+def resample(img, size):
+    """LANCZOS resize that first shrinks by an integer factor (reduce()) on large downscales."""
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def crop_box(size, x, y, width, height):
+    """Clamp a crop area to the image and return it as (left, top, right, bottom)."""
+    original_width, original_height = size
+    x = max(0, min(x, original_width))
+    y = max(0, min(y, original_height))
+    right = min(x + width, original_width)
+    bottom = min(y + height, original_height)
+    return x, y, right, bottom
+
+
+def rotate_and_flip(img, rotation=90, flip_horizontal=False, flip_vertical=False):
+    """Rotate an image clockwise by 90/180/270 degrees and/or flip it."""
+    if rotation == 90:
+        img = img.transpose(Image.Transpose.ROTATE_270)
+    elif rotation == 180:
+        img = img.transpose(Image.Transpose.ROTATE_180)
+    elif rotation == 270:
+        img = img.transpose(Image.Transpose.ROTATE_90)
+
+    if flip_horizontal:
+        img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if flip_vertical:
+        img = img.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+    return img
+
+
+WATERMARK_FONTS = ("arial.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+WATERMARK_PADDING = 20
+
+
+@functools.lru_cache(maxsize=64)
+def load_font(path, size):
+    """Load a TrueType font once per (path, size); raises OSError if it is missing."""
+    from PIL import ImageFont
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=64)
+def watermark_font(size):
+    """Return the first available watermark font at a size, falling back to Pillow's default."""
+    from PIL import ImageFont
+
+    for path in WATERMARK_FONTS:
+        try:
+            return load_font(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=256)
+def render_text_sprite(text, font, opacity):
+    """
+    Render text in white onto a transparent RGBA image cropped to its ink.
+    Returns (sprite, offset), offset being the ink's position relative to the text origin.
+    """
+    from PIL import ImageDraw
+
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    sprite = Image.new('RGBA', (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), (255, 255, 255, 0))
+    ImageDraw.Draw(sprite).text((-bbox[0], -bbox[1]), text, font=font, fill=(255, 255, 255, opacity))
+    return sprite, (bbox[0], bbox[1])
+
+
+def watermark_origin(image_size, text_size, position):
+    """Return where the text origin goes for a watermark position."""
+    width, height = image_size
+    text_width, text_height = text_size
+    padding = WATERMARK_PADDING
+    if position == 'top-left':
+        return padding, padding
+    elif position == 'top-right':
+        return width - text_width - padding, padding
+    elif position == 'bottom-left':
+        return padding, height - text_height - padding
+    elif position == 'center':
+        return (width - text_width) // 2, (height - text_height) // 2
+    # bottom-right and anything unrecognized
+    return width - text_width - padding, height - text_height - padding
+
+
+def composite_sprite(img, sprite, dest):
+    """
+    Blend a white RGBA sprite onto img at dest, touching only the pixels under it.
+    RGB, L and RGBA images are modified in place; other modes are converted to RGBA.
+    Returns the watermarked image.
+    """
+    # Clip the sprite to the image
+    left, top = max(0, dest[0]), max(0, dest[1])
+    right = min(img.size[0], dest[0] + sprite.size[0])
+    bottom = min(img.size[1], dest[1] + sprite.size[1])
+    if right <= left or bottom <= top:
+        return img
+    source = (left - dest[0], top - dest[1], right - dest[0], bottom - dest[1])
+
+    if img.mode not in ('RGB', 'L', 'RGBA'):
+        img = img.convert('RGBA')
+
+    if img.mode == 'RGBA':
+        img.alpha_composite(sprite, (left, top), source)
+    else:
+        # Over an opaque image, compositing white reduces to pasting white through the sprite's alpha
+        mask = sprite.getchannel('A').crop(source)
+        img.paste(255 if img.mode == 'L' else (255, 255, 255), (left, top, right, bottom), mask)
+    return img
+
+
+def draw_watermark(img, text, position='bottom-right', opacity=128):
+    """
+    Draw a text watermark onto an image and return it.
+
+    The font and the rendered text are cached, and only the region under the
+    text is composited, so no full-size layer is allocated. The image may be
+    modified in place.
+    """
+    font_size = max(20, min(img.size) // 20)
+    sprite, offset = render_text_sprite(text, watermark_font(font_size), opacity)
+
+    origin = watermark_origin(img.size, sprite.size, position)
+    return composite_sprite(img, sprite, (origin[0] + offset[0], origin[1] + offset[1]))
+
+
 # ============== RESIZE IMAGE ==============
 def resize_image(image_path, output_path, width=None, height=None, maintain_aspect=True):
     """
@@ -355,44 +2710,14 @@ def resize_image(image_path, output_path, width=None, height=None, maintain_aspe
         original_width, original_height = img.size
         img_format = img.format or 'JPEG'
 
-        # Calculate new dimensions
-        if maintain_aspect:
-            if width and height:
-                # Fit within both dimensions
-                ratio = min(width / original_width, height / original_height)
-                new_width = int(original_width * ratio)
-                new_height = int(original_height * ratio)
-            elif width:
-                ratio = width / original_width
-                new_width = width
-                new_height = int(original_height * ratio)
-            elif height:
-                ratio = height / original_height
-                new_width = int(original_width * ratio)
-                new_height = height
-            else:
-                new_width, new_height = original_width, original_height
-        else:
-            new_width = width or original_width
-            new_height = height or original_height
+        new_width, new_height = resize_dimensions(img.size, width, height, maintain_aspect)
 
-        # Resize using high-quality resampling
-        resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        # Decode near the target size, then resize using high-quality resampling
+        decode_for_resize(img, (new_width, new_height))
+        resized_img = resample(img, (new_width, new_height))
 
         # Save in original format
-        if img_format.upper() in ('JPG', 'JPEG'):
-            if resized_img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', resized_img.size, (255, 255, 255))
-                if resized_img.mode == 'P':
-                    resized_img = resized_img.convert('RGBA')
-                if resized_img.mode == 'RGBA':
-                    background.paste(resized_img, mask=resized_img.split()[-1])
-                else:
-                    background.paste(resized_img)
-                resized_img = background
-            resized_img.save(output_path, 'JPEG', quality=90)
-        else:
-            resized_img.save(output_path, img_format)
+        save_image_as(resized_img, output_path, img_format)
 
         img.close()
         resized_img.close()
@@ -445,6 +2770,220 @@ def convert_image(image_path, output_path, output_format='jpg'):
         return False, f"Error converting image: {str(e)}", "", "", 0
 
 
+# ============== LOSSLESS JPEG ==============
+# Rotations and flips as 2x2 matrices acting on (x, y) with y pointing down
+IMAGE_TRANSFORMS = {
+    None: ((1, 0), (0, 1)),
+    Image.Transpose.FLIP_LEFT_RIGHT: ((-1, 0), (0, 1)),
+    Image.Transpose.FLIP_TOP_BOTTOM: ((1, 0), (0, -1)),
+    Image.Transpose.ROTATE_90: ((0, 1), (-1, 0)),
+    Image.Transpose.ROTATE_180: ((-1, 0), (0, -1)),
+    Image.Transpose.ROTATE_270: ((0, -1), (1, 0)),
+    Image.Transpose.TRANSPOSE: ((0, 1), (1, 0)),
+    Image.Transpose.TRANSVERSE: ((0, -1), (-1, 0)),
+}
+TRANSFORM_BY_MATRIX = {matrix: transform for transform, matrix in IMAGE_TRANSFORMS.items()}
+
+JPEGTRAN_ARGS = {
+    None: [],
+    Image.Transpose.FLIP_LEFT_RIGHT: ['-flip', 'horizontal'],
+    Image.Transpose.FLIP_TOP_BOTTOM: ['-flip', 'vertical'],
+    Image.Transpose.ROTATE_90: ['-rotate', '270'],
+    Image.Transpose.ROTATE_180: ['-rotate', '180'],
+    Image.Transpose.ROTATE_270: ['-rotate', '90'],
+    Image.Transpose.TRANSPOSE: ['-transpose'],
+    Image.Transpose.TRANSVERSE: ['-transverse'],
+}
+
+# EXIF Orientation value -> transform a viewer applies to the stored pixels
+EXIF_ORIENTATIONS = {
+    1: None,
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+EXIF_ORIENTATION_TAG = 0x0112
+JPEGTRAN_TIMEOUT = 60
+
+
+def compose_transforms(first, then):
+    """Return the single transform equal to applying first, then then."""
+    a = IMAGE_TRANSFORMS[then]
+    b = IMAGE_TRANSFORMS[first]
+    product = tuple(
+        tuple(sum(a[row][k] * b[k][col] for k in range(2)) for col in range(2))
+        for row in range(2)
+    )
+    return TRANSFORM_BY_MATRIX[product]
+
+
+def rotation_transform(rotation=90, flip_horizontal=False, flip_vertical=False):
+    """Return the single transform equivalent to rotate_and_flip's arguments."""
+    transform = {
+        90: Image.Transpose.ROTATE_270,
+        180: Image.Transpose.ROTATE_180,
+        270: Image.Transpose.ROTATE_90,
+    }.get(rotation)
+    if flip_horizontal:
+        transform = compose_transforms(transform, Image.Transpose.FLIP_LEFT_RIGHT)
+    if flip_vertical:
+        transform = compose_transforms(transform, Image.Transpose.FLIP_TOP_BOTTOM)
+    return transform
+
+
+def swaps_axes(transform):
+    """Check whether a transform exchanges width and height."""
+    return IMAGE_TRANSFORMS[transform][0][0] == 0
+
+
+def jpeg_mcu_size(img):
+    """Return the (width, height) in pixels of a JPEG's minimum coded unit."""
+    layers = getattr(img, 'layer', None)
+    if not layers or len(layers) == 1:
+        return 8, 8
+    return 8 * max(layer[1] for layer in layers), 8 * max(layer[2] for layer in layers)
+
+
+def run_jpegtran(args, image_path, output_path):
+    """
+    Transform a JPEG on its DCT coefficients with jpegtran.
+    Returns False when jpegtran is not installed or refuses the transform.
+    """
+    jpegtran = shutil.which(app.config['JPEGTRAN'])
+    if not jpegtran:
+        return False
+
+    # Metadata is dropped, like the pixel path that this replaces
+    command = [jpegtran, '-copy', 'none', '-optimize', *args, '-outfile', output_path, image_path]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=JPEGTRAN_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+    if result.returncode != 0 or not os.path.exists(output_path):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+    return True
+
+
+def lossless_transform_jpeg(image_path, output_path, transform):
+    """Rotate/flip a JPEG without re-encoding, if its size is a whole number of MCUs."""
+    # -perfect fails instead of dropping the partial MCUs at the right/bottom edge
+    return run_jpegtran(['-perfect', *JPEGTRAN_ARGS[transform]], image_path, output_path)
+
+
+def lossless_crop_jpeg(image_path, output_path, box, mcu_size):
+    """Crop a JPEG without re-encoding, if the crop starts on an MCU boundary."""
+    left, top, right, bottom = box
+    if left % mcu_size[0] or top % mcu_size[1] or right <= left or bottom <= top:
+        return False
+    geometry = f"{right - left}x{bottom - top}+{left}+{top}"
+    return run_jpegtran(['-crop', geometry], image_path, output_path)
+
+
+def iter_jpeg_segments(data):
+    """Yield (marker, start, end) for the header segments of a JPEG, up to the scan."""
+    if data[:2] != b'\xff\xd8':
+        raise ValueError('Not a JPEG file')
+
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError('Corrupt JPEG header')
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        yield marker, pos, pos + 2 + length
+        if marker == 0xDA:  # start of scan: entropy-coded data follows
+            return
+        pos += 2 + length
+
+
+def patch_exif_orientation(exif, orientation):
+    """
+    Overwrite the Orientation entry of a TIFF/EXIF block in place; False if it has none.
+    Raises ValueError if the block is truncated or malformed.
+    """
+    tiff = 6
+    byte_order = {b'II': '<', b'MM': '>'}.get(bytes(exif[tiff:tiff + 2]))
+    if not byte_order or len(exif) < tiff + 8:
+        raise ValueError('Malformed EXIF block')
+
+    ifd = tiff + struct.unpack(byte_order + 'I', exif[tiff + 4:tiff + 8])[0]
+    if ifd + 2 > len(exif):
+        raise ValueError('Malformed EXIF block')
+    count = struct.unpack(byte_order + 'H', exif[ifd:ifd + 2])[0]
+    if ifd + 2 + count * 12 > len(exif):
+        raise ValueError('Malformed EXIF block')
+    for entry in range(ifd + 2, ifd + 2 + count * 12, 12):
+        tag, field_type = struct.unpack(byte_order + 'HH', exif[entry:entry + 4])
+        if tag == EXIF_ORIENTATION_TAG and field_type == 3:  # SHORT
+            exif[entry + 8:entry + 12] = struct.pack(byte_order + 'HH', orientation, 0)
+            return True
+    return False
+
+
+def set_jpeg_orientation(image_path, output_path, transform):
+    """
+    Apply a rotation/flip to a JPEG by rewriting its EXIF Orientation tag.
+
+    The image data is copied byte for byte; only the tag changes (an EXIF
+    segment is added if the file has none). Viewers that honor EXIF display
+    the rotated image. Returns the new orientation value; raises ValueError
+    if the existing EXIF block is malformed.
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+
+    exif_segment = None
+    insert_at = 2
+    for marker, start, end in iter_jpeg_segments(data):
+        if marker == 0xE1 and data[start + 4:start + 10] == b'Exif\x00\x00':
+            exif_segment = (start, end)
+            break
+        if marker in (0xE0, 0xE1):  # keep JFIF/XMP ahead of a new EXIF segment
+            insert_at = end
+
+    if exif_segment:
+        start, end = exif_segment
+        exif = bytearray(data[start + 4:end])
+        current = Image.Exif()
+        try:
+            current.load(bytes(exif))
+        except SyntaxError as e:
+            raise ValueError(f'Malformed EXIF block: {e}')
+        orientation = current.get(EXIF_ORIENTATION_TAG, 1)
+    else:
+        start = end = insert_at
+        exif = None
+        orientation = 1
+
+    new_transform = compose_transforms(EXIF_ORIENTATIONS.get(orientation), transform)
+    new_orientation = next(value for value, t in EXIF_ORIENTATIONS.items() if t == new_transform)
+
+    if exif is None or not patch_exif_orientation(exif, new_orientation):
+        rebuilt = Image.Exif()
+        if exif is not None:
+            rebuilt.load(bytes(exif))
+        rebuilt[EXIF_ORIENTATION_TAG] = new_orientation
+        exif = rebuilt.tobytes()
+
+    segment = b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + bytes(exif)
+    with open(output_path, 'wb') as f:
+        f.write(data[:start])
+        f.write(segment)
+        f.write(data[end:])
+
+    return new_orientation
+
+
 # ============== CROP IMAGE ==============
 def crop_image(image_path, output_path, x, y, width, height):
     """
@@ -456,31 +2995,19 @@ def crop_image(image_path, output_path, x, y, width, height):
         img = Image.open(image_path)
         img_format = img.format or 'JPEG'
         original_width, original_height = img.size
+        box = crop_box(img.size, x, y, width, height)
 
-        # Validate crop coordinates
-        x = max(0, min(x, original_width))
-        y = max(0, min(y, original_height))
-        right = min(x + width, original_width)
-        bottom = min(y + height, original_height)
+        # JPEG crops that start on an MCU boundary skip the decode and re-encode
+        if img_format == 'JPEG' and lossless_crop_jpeg(image_path, output_path, box, jpeg_mcu_size(img)):
+            img.close()
+            return True, "Image cropped successfully!", (original_width, original_height), (box[2] - box[0], box[3] - box[1])
 
         # Crop the image
-        cropped_img = img.crop((x, y, right, bottom))
+        cropped_img = img.crop(box)
         crop_width, crop_height = cropped_img.size
 
         # Save in original format
-        if img_format.upper() in ('JPG', 'JPEG'):
-            if cropped_img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', cropped_img.size, (255, 255, 255))
-                if cropped_img.mode == 'P':
-                    cropped_img = cropped_img.convert('RGBA')
-                if cropped_img.mode == 'RGBA':
-                    background.paste(cropped_img, mask=cropped_img.split()[-1])
-                else:
-                    background.paste(cropped_img)
-                cropped_img = background
-            cropped_img.save(output_path, 'JPEG', quality=90)
-        else:
-            cropped_img.save(output_path, img_format)
+        save_image_as(cropped_img, output_path, img_format)
 
         img.close()
         cropped_img.close()
@@ -498,66 +3025,31 @@ def watermark_image(image_path, output_path, text, position='bottom-right', opac
     position: 'top-left', 'top-right', 'bottom-left', 'bottom-right', 'center'
     """
     try:
-        from PIL import ImageDraw, ImageFont
-
-        img = Image.open(image_path)
-        img_format = img.format or 'JPEG'
-
-        # Convert to RGBA for watermark
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-
-        # Create watermark layer
-        watermark_layer = Image.new('RGBA', img.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(watermark_layer)
+        with Image.open(image_path) as img:
+            return watermark_open_image(img, output_path, text, position, opacity)
+    except Exception as e:
+        return False, f"Error adding watermark: {str(e)}", "", ""
 
-        # Try to use a better font, fall back to default
-        try:
-            font_size = max(20, min(img.size) // 20)
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-
-        # Get text bounding box
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-
-        # Calculate position
-        padding = 20
-        if position == 'top-left':
-            pos = (padding, padding)
-        elif position == 'top-right':
-            pos = (img.size[0] - text_width - padding, padding)
-        elif position == 'bottom-left':
-            pos = (padding, img.size[1] - text_height - padding)
-        elif position == 'bottom-right':
-            pos = (img.size[0] - text_width - padding, img.size[1] - text_height - padding)
-        elif position == 'center':
-            pos = ((img.size[0] - text_width) // 2, (img.size[1] - text_height) // 2)
-        else:
-            pos = (img.size[0] - text_width - padding, img.size[1] - text_height - padding)
 
-        # Draw watermark
-        draw.text(pos, text, font=font, fill=(255, 255, 255, opacity))
+def watermark_open_image(img, output_path, text, position='bottom-right', opacity=128):
+    """Add text watermark to an image opened by the caller, who also closes it."""
+    try:
+        img_format = img.format or 'JPEG'
 
-        # Composite the watermark
-        watermarked = Image.alpha_composite(img, watermark_layer)
+        watermarked = draw_watermark(img, text, position, opacity)
 
         # Convert back to RGB for JPEG
         if img_format.upper() in ('JPG', 'JPEG'):
-            watermarked = watermarked.convert('RGB')
+            if watermarked.mode not in ('RGB', 'L'):
+                watermarked = watermarked.convert('RGB')
             watermarked.save(output_path, 'JPEG', quality=90)
         elif img_format.upper() == 'PNG':
             watermarked.save(output_path, 'PNG')
         else:
-            watermarked = watermarked.convert('RGB')
+            if watermarked.mode not in ('RGB', 'L'):
+                watermarked = watermarked.convert('RGB')
             watermarked.save(output_path, img_format)
 
-        img.close()
         watermarked.close()
 
         return True, "Watermark added successfully!", text, position
@@ -567,53 +3059,865 @@ def watermark_image(image_path, output_path, text, position='bottom-right', opac
 
 
 # ============== ROTATE IMAGE ==============
-def rotate_image_file(image_path, output_path, rotation=90, flip_horizontal=False, flip_vertical=False):
+def rotate_image_file(image_path, output_path, rotation=90, flip_horizontal=False, flip_vertical=False,
+                      use_exif_orientation=False):
     """
     Rotate and/or flip an image.
     rotation: 90, 180, 270
+    JPEGs are transformed losslessly when possible; with use_exif_orientation
+    only their EXIF Orientation tag is rewritten.
     """
     try:
         img = Image.open(image_path)
         img_format = img.format or 'JPEG'
         original_size = img.size
 
-        # Apply rotation
-        if rotation == 90:
-            img = img.transpose(Image.Transpose.ROTATE_270)
-        elif rotation == 180:
-            img = img.transpose(Image.Transpose.ROTATE_180)
-        elif rotation == 270:
-            img = img.transpose(Image.Transpose.ROTATE_90)
+        if img_format == 'JPEG':
+            transform = rotation_transform(rotation, flip_horizontal, flip_vertical)
+            new_size = original_size[::-1] if swaps_axes(transform) else original_size
+            img.close()
+
+            if use_exif_orientation:
+                try:
+                    set_jpeg_orientation(image_path, output_path, transform)
+                    return True, "Image rotated successfully!", original_size, new_size, rotation
+                except ValueError:
+                    pass  # Malformed EXIF: transform the image itself instead
+            if lossless_transform_jpeg(image_path, output_path, transform):
+                return True, "Image rotated successfully!", original_size, new_size, rotation
 
-        # Apply flips
-        if flip_horizontal:
-            img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
-        if flip_vertical:
-            img = img.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+            img = Image.open(image_path)
 
+        img = rotate_and_flip(img, rotation, flip_horizontal, flip_vertical)
         new_size = img.size
 
         # Save in original format
-        if img_format.upper() in ('JPG', 'JPEG'):
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[-1])
-                else:
-                    background.paste(img)
-                img = background
-            img.save(output_path, 'JPEG', quality=90)
-        else:
-            img.save(output_path, img_format)
+        save_image_as(img, output_path, img_format)
+
+        img.close()
+
+        return True, "Image rotated successfully!", original_size, new_size, rotation
+
+    except Exception as e:
+        return False, f"Error rotating image: {str(e)}", (0, 0), (0, 0), 0
+
+
+# ============== IMAGE PIPELINE ==============
+PIPELINE_OPERATIONS = ('crop', 'resize', 'rotate', 'watermark', 'convert', 'compress')
+PIPELINE_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+WATERMARK_POSITIONS = ('top-left', 'top-right', 'bottom-left', 'bottom-right', 'center')
+
+
+def json_flag(operation, name, default):
+    """Return a boolean field of a pipeline operation; only JSON true/false are accepted."""
+    value = operation.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError
+    return value
+
+
+def parse_pipeline_operations(raw):
+    """
+    Parse and normalize the JSON operations list of a pipeline request.
+    Raises ValueError with a user-facing message if it is invalid.
+    """
+    try:
+        operations = json.loads(raw)
+    except (TypeError, ValueError):
+        raise ValueError('Operations must be a JSON list')
+
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Operations must be a non-empty JSON list')
+
+    normalized = []
+    for index, operation in enumerate(operations, 1):
+        if not isinstance(operation, dict):
+            raise ValueError(f'Operation {index} must be an object')
+        op = operation.get('op')
+        if op not in PIPELINE_OPERATIONS:
+            raise ValueError(f'Operation {index}: unknown op {op!r}')
+
+        try:
+            if op == 'crop':
+                step = {
+                    'op': op,
+                    'x': int(operation.get('x', 0)),
+                    'y': int(operation.get('y', 0)),
+                    'width': int(operation['width']),
+                    'height': int(operation['height'])
+                }
+                if step['width'] <= 0 or step['height'] <= 0:
+                    raise ValueError
+            elif op == 'resize':
+                width = operation.get('width')
+                height = operation.get('height')
+                step = {
+                    'op': op,
+                    'width': int(width) if width else None,
+                    'height': int(height) if height else None,
+                    'maintainAspect': json_flag(operation, 'maintainAspect', True)
+                }
+                if not step['width'] and not step['height']:
+                    raise ValueError
+            elif op == 'rotate':
+                step = {
+                    'op': op,
+                    'rotation': int(operation.get('rotation', 0)),
+                    'flipHorizontal': json_flag(operation, 'flipHorizontal', False),
+                    'flipVertical': json_flag(operation, 'flipVertical', False)
+                }
+                if step['rotation'] not in (0, 90, 180, 270):
+                    raise ValueError
+            elif op == 'watermark':
+                step = {
+                    'op': op,
+                    'text': str(operation.get('text', '')),
+                    'position': operation.get('position', 'bottom-right'),
+                    'opacity': int(operation.get('opacity', 128))
+                }
+                if not step['text'] or step['position'] not in WATERMARK_POSITIONS:
+                    raise ValueError
+                if not 0 <= step['opacity'] <= 255:
+                    raise ValueError
+            elif op == 'convert':
+                step = {'op': op, 'format': str(operation.get('format', '')).lower()}
+                if step['format'] not in PIPELINE_FORMATS:
+                    raise ValueError
+            else:
+                step = {'op': op, 'quality': int(operation.get('quality', 75))}
+                if not 1 <= step['quality'] <= 100:
+                    raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Operation {index}: invalid parameters for {op}')
+
+        normalized.append(step)
+
+    return normalized
+
+
+def pipeline_output_extension(operations, input_ext):
+    """Return the extension of a pipeline's output: the last convert, else the input's."""
+    for operation in reversed(operations):
+        if operation['op'] == 'convert':
+            return 'jpg' if operation['format'] == 'jpeg' else operation['format']
+    return input_ext
+
+
+def run_image_pipeline(image_path, output_path, operations):
+    """
+    Apply a list of operations to an image in one pass.
+
+    The image is decoded once, every geometric and drawing step runs on the
+    in-memory image, and the result is encoded once, so a crop + resize +
+    watermark chain pays for a single decode and a single lossy encode.
+    convert and compress only choose the output format and quality.
+    """
+    try:
+        img = Image.open(image_path)
+        img_format = img.format or 'JPEG'
+        original_size = img.size
+        quality = None
+        optimize = False
+
+        # A leading resize can be served by a reduced-resolution decode
+        geometry = [operation for operation in operations if operation['op'] not in ('convert', 'compress')]
+        if geometry and geometry[0]['op'] == 'resize':
+            first = geometry[0]
+            target = resize_dimensions(img.size, first['width'], first['height'], first['maintainAspect'])
+            decode_for_resize(img, target)
+            # The draft changes img.size, so pin the resize to the size planned from the original
+            pinned = {'op': 'resize', 'width': target[0], 'height': target[1], 'maintainAspect': False}
+            operations = [pinned if operation is first else operation for operation in operations]
+
+        img.load()
+        for operation in operations:
+            op = operation['op']
+            if op == 'crop':
+                img = img.crop(crop_box(
+                    img.size, operation['x'], operation['y'], operation['width'], operation['height']
+                ))
+            elif op == 'resize':
+                new_size = resize_dimensions(
+                    img.size, operation['width'], operation['height'], operation['maintainAspect']
+                )
+                if new_size != img.size:
+                    img = resample(img, new_size)
+            elif op == 'rotate':
+                img = rotate_and_flip(
+                    img, operation['rotation'], operation['flipHorizontal'], operation['flipVertical']
+                )
+            elif op == 'watermark':
+                img = draw_watermark(img, operation['text'], operation['position'], operation['opacity'])
+            elif op == 'convert':
+                img_format = PIPELINE_FORMATS[operation['format']]
+            elif op == 'compress':
+                quality = operation['quality']
+                optimize = True
+
+        final_size = img.size
+        save_image_as(img, output_path, img_format, quality=quality, optimize=optimize)
+        img.close()
+
+        return True, "Image processed successfully!", original_size, final_size
+
+    except Exception as e:
+        return False, f"Error processing image: {str(e)}", (0, 0), (0, 0)
+
+
+# ============== BATCH IMAGE PROCESSING ==============
+def map_images(func, items):
+    """
+    Run func over items on a pool of IMAGE_THREADS threads.
+    Returns [(result, seconds), ...] in the order of items.
+    """
+    def timed(item):
+        started = time.perf_counter()
+        result = func(item)
+        return result, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=app.config['IMAGE_THREADS']) as pool:
+        return list(pool.map(timed, items))
+
+
+def unique_outputs(jobs):
+    """
+    Keep one (input_path, output_path) job per output path, in order.
+    Serially, a later input with the same output name overwrote the earlier
+    one; in parallel they would race, so only the last one is kept.
+    """
+    by_output = {}
+    for input_path, output_path in jobs:
+        by_output.pop(output_path, None)
+        by_output[output_path] = input_path
+    return [(input_path, output_path) for output_path, input_path in by_output.items()]
+
+
+def file_timing(input_path, output_path, success, seconds):
+    """Describe how one file of a batch went, for the JSON response."""
+    return {
+        'filename': os.path.basename(input_path),
+        'output': os.path.basename(output_path),
+        'success': success,
+        'seconds': round(seconds, 3)
+    }
+
+
+# ============== STREAMING ZIP ==============
+# Archives of many outputs are generated on the fly at download time instead of
+# being materialized next to the outputs. Entries are stored (the outputs are
+# already compressed images/PDFs), so the archive size is known before the
+# first byte is sent. Zip64 records are emitted only where sizes require them.
+ZIP_STREAM_CHUNK_SIZE = 256 * 1024
+ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def zip_dos_time(path):
+    """Return (dos_time, dos_date) for a file's modification time."""
+    t = time.localtime(os.path.getmtime(path))
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def plan_zip_stream(files):
+    """
+    Lay out a stored ZIP archive for [(arcname, path), ...].
+    Returns (entries, total_size) where each entry carries its offset.
+    """
+    entries = []
+    offset = 0
+    for arcname, path in files:
+        name = arcname.encode('utf-8')
+        size = os.path.getsize(path)
+        zip64 = size >= ZIP32_LIMIT
+        header_size = 30 + len(name) + (20 if zip64 else 0)
+        entries.append({
+            'name': name,
+            'path': path,
+            'size': size,
+            'offset': offset,
+            'zip64': zip64
+        })
+        offset += header_size + size
+
+    cd_offset = offset
+    cd_size = 0
+    for entry in entries:
+        fields = central_zip64_fields(entry)
+        cd_size += 46 + len(entry['name']) + (4 + 8 * len(fields) if fields else 0)
+
+    total_size = cd_offset + cd_size + 22
+    if needs_zip64_end(len(entries), cd_offset, cd_size):
+        total_size += 56 + 20
+
+    return entries, total_size
+
+
+def central_zip64_fields(entry):
+    """Return the values that overflow into the central directory zip64 extra."""
+    fields = []
+    if entry['size'] >= ZIP32_LIMIT:
+        fields += [entry['size'], entry['size']]
+    if entry['offset'] >= ZIP32_LIMIT:
+        fields.append(entry['offset'])
+    return fields
+
+
+def needs_zip64_end(count, cd_offset, cd_size):
+    """Check whether the archive needs zip64 end-of-central-directory records."""
+    return count >= 0xFFFF or cd_offset >= ZIP32_LIMIT or cd_size >= ZIP32_LIMIT
+
+
+def iter_zip_stream(entries):
+    """Yield the bytes of a stored ZIP archive laid out by plan_zip_stream."""
+    central_directory = []
+    cd_offset = 0
+
+    for entry in entries:
+        # CRC must precede the data, so each file is read twice; the second
+        # read is served from the page cache.
+        crc = 0
+        with open(entry['path'], 'rb') as f:
+            for chunk in iter(lambda: f.read(ZIP_STREAM_CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+
+        dos_time, dos_date = zip_dos_time(entry['path'])
+        version = 45 if entry['zip64'] else 20
+        # Bit 11 marks the name as UTF-8; without it readers assume CP437
+        flags = 0 if entry['name'].isascii() else 0x800
+        size32 = ZIP32_LIMIT if entry['zip64'] else entry['size']
+        extra = struct.pack('<HHQQ', 0x0001, 16, entry['size'], entry['size']) if entry['zip64'] else b''
+
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, version, flags, 0, dos_time, dos_date,
+            crc, size32, size32, len(entry['name']), len(extra)
+        ) + entry['name'] + extra
+        cd_offset += len(header) + entry['size']
+        yield header
+
+        with open(entry['path'], 'rb') as f:
+            for chunk in iter(lambda: f.read(ZIP_STREAM_CHUNK_SIZE), b''):
+                yield chunk
+
+        fields = central_zip64_fields(entry)
+        cd_extra = struct.pack(f'<HH{len(fields)}Q', 0x0001, len(fields) * 8, *fields) if fields else b''
+        central_directory.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, version, flags, 0, dos_time, dos_date,
+            crc, size32, size32, len(entry['name']), len(cd_extra), 0, 0, 0,
+            0o100644 << 16, min(entry['offset'], ZIP32_LIMIT)
+        ) + entry['name'] + cd_extra)
+
+    cd_bytes = b''.join(central_directory)
+    yield cd_bytes
+
+    count = len(entries)
+    if needs_zip64_end(count, cd_offset, len(cd_bytes)):
+        zip64_end_offset = cd_offset + len(cd_bytes)
+        yield struct.pack(
+            '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+            count, count, len(cd_bytes), cd_offset
+        )
+        yield struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+
+    yield struct.pack(
+        '<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(len(cd_bytes), ZIP32_LIMIT), min(cd_offset, ZIP32_LIMIT), 0
+    )
+
+
+def list_zip_stream_files(output_folder):
+    """Return [(arcname, path), ...] for the outputs that make up a streamed zip."""
+    return [
+        (name, os.path.join(output_folder, name))
+        for name in sorted(os.listdir(output_folder))
+        if os.path.isfile(os.path.join(output_folder, name))
+    ]
+
+
+# ============== JOB TASKS ==============
+# Each task runs inside a job process and returns (response_dict, status_code),
+# exactly what the corresponding route used to return synchronously.
+
+def merge_task(session_id, session_folder, saved_files):
+    """Merge the saved PDFs of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"merged_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, total_pages = merge_pdfs(saved_files, output_path)
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'total_pages': total_pages,
+        'file_size': file_size,
+        'files_merged': len(saved_files)
+    }, 200
+
+
+def split_task(session_id, session_folder, filepath, split_mode, split_value):
+    """Split the saved PDF of a session into a stored zip (or one PDF)."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_path = os.path.join(session_folder, f"split_{timestamp}.zip")
+
+    success, message, output_path, files_created, total_pages = split_pdf(
+        filepath, split_mode, split_value, zip_path
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': os.path.basename(output_path),
+        'total_pages': total_pages,
+        'files_created': files_created,
+        'file_size': os.path.getsize(output_path),
+        'is_zip': files_created > 1
+    }, 200
+
+
+def compress_task(session_id, session_folder, filepath, compression_level):
+    """Compress the saved PDF of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"compressed_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, original_size, compressed_size, reduction = compress_pdf(
+        filepath, output_path, compression_level
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'reduction': round(reduction, 1),
+        'file_size': compressed_size
+    }, 200
+
+
+def rotate_task(session_id, session_folder, filepath, rotation, pages, incremental=False):
+    """Rotate pages of the saved PDF of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"rotated_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, total_pages, rotated_pages = rotate_pdf(
+        filepath, output_path, rotation, pages, incremental
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'total_pages': total_pages,
+        'rotated_pages': rotated_pages,
+        'file_size': file_size
+    }, 200
+
+
+def extract_task(session_id, session_folder, filepath, page_selection):
+    """Extract pages from the saved PDF of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"extracted_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, total_pages, extracted_count = extract_pages(
+        filepath, output_path, page_selection
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'total_pages': total_pages,
+        'extracted_pages': extracted_count,
+        'file_size': file_size
+    }, 200
+
+
+def watermark_pdf_task(session_id, session_folder, filepath, text, position, opacity):
+    """Stamp every page of the saved PDF of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"watermarked_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, total_pages = watermark_pdf(filepath, output_path, text, position, opacity)
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'total_pages': total_pages,
+        'watermark_text': text,
+        'watermark_position': position,
+        'file_size': file_size
+    }, 200
+
+
+def images_to_pdf_task(session_id, session_folder, saved_files, page_size):
+    """Convert the saved images of a session into one PDF."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"images_to_pdf_{timestamp}.pdf"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, image_count = images_to_pdf(saved_files, output_path, page_size)
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'images_converted': image_count,
+        'file_size': file_size
+    }, 200
+
+
+def compress_image_task(session_id, session_folder, saved_files, quality):
+    """Compress the saved images of a session in parallel, zipping multiple outputs."""
+    output_folder = os.path.join(session_folder, 'output')
+    results = []
+    file_timings = []
+    total_original = 0
+    total_compressed = 0
+
+    outputs = unique_outputs(
+        (filepath, os.path.join(output_folder, f"compressed_{os.path.basename(filepath)}"))
+        for filepath in saved_files
+    )
+    timed_results = map_images(
+        lambda job: compress_image(job[0], job[1], quality), outputs
+    )
+
+    for (filepath, output_path), (result, seconds) in zip(outputs, timed_results):
+        success, message, orig_size, comp_size, reduction = result
+        file_timings.append(file_timing(filepath, output_path, success, seconds))
+
+        if success:
+            total_original += orig_size
+            total_compressed += comp_size
+            results.append(output_path)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+
+    if len(results) == 0:
+        return {'success': False, 'error': 'No images could be compressed'}, 500
+
+    # If multiple files, the zip is streamed from the output folder on download
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if len(results) > 1:
+        zip_filename = f"compressed_images_{timestamp}.zip"
+        _, file_size = plan_zip_stream(list_zip_stream_files(output_folder))
+        output_filename = zip_filename
+    else:
+        output_filename = os.path.basename(results[0])
+        final_path = os.path.join(session_folder, output_filename)
+        shutil.move(results[0], final_path)
+        file_size = os.path.getsize(final_path)
+
+    reduction = ((total_original - total_compressed) / total_original * 100) if total_original > 0 else 0
+
+    return {
+        'success': True,
+        'message': 'Images compressed successfully!',
+        'session_id': session_id,
+        'filename': output_filename,
+        'original_size': total_original,
+        'compressed_size': total_compressed,
+        'reduction': round(max(0, reduction), 1),
+        'file_size': file_size,
+        'images_processed': len(results),
+        'files': file_timings
+    }, 200
+
+
+def resize_image_task(session_id, session_folder, filepath, width, height, maintain_aspect):
+    """Resize the saved image of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = filepath.rsplit('.', 1)[1].lower()
+    output_filename = f"resized_{timestamp}.{ext}"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, original_size, new_size = resize_image(
+        filepath, output_path, width, height, maintain_aspect
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'original_dimensions': f"{original_size[0]}x{original_size[1]}",
+        'new_dimensions': f"{new_size[0]}x{new_size[1]}",
+        'file_size': file_size
+    }, 200
+
+
+def convert_image_task(session_id, session_folder, saved_files, output_format):
+    """Convert the saved images of a session in parallel, zipping multiple outputs."""
+    output_folder = os.path.join(session_folder, 'output')
+    results = []
+    file_timings = []
+
+    # Create output filenames with the new extension
+    outputs = unique_outputs(
+        (filepath, os.path.join(output_folder, f"{os.path.basename(filepath).rsplit('.', 1)[0]}.{output_format}"))
+        for filepath in saved_files
+    )
+    timed_results = map_images(
+        lambda job: convert_image(job[0], job[1], output_format), outputs
+    )
+
+    for (filepath, output_path), (result, seconds) in zip(outputs, timed_results):
+        success, message, orig_fmt, new_fmt, size = result
+        file_timings.append(file_timing(filepath, output_path, success, seconds))
+
+        if success:
+            results.append(output_path)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+
+    if len(results) == 0:
+        return {'success': False, 'error': 'No images could be converted'}, 500
+
+    # If multiple files, the zip is streamed from the output folder on download
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if len(results) > 1:
+        zip_filename = f"converted_images_{timestamp}.zip"
+        _, file_size = plan_zip_stream(list_zip_stream_files(output_folder))
+        final_filename = zip_filename
+    else:
+        final_filename = os.path.basename(results[0])
+        final_path = os.path.join(session_folder, final_filename)
+        shutil.move(results[0], final_path)
+        file_size = os.path.getsize(final_path)
+
+    return {
+        'success': True,
+        'message': 'Images converted successfully!',
+        'session_id': session_id,
+        'filename': final_filename,
+        'output_format': output_format.upper(),
+        'file_size': file_size,
+        'images_converted': len(results),
+        'files': file_timings
+    }, 200
+
+
+def crop_image_task(session_id, session_folder, filepath, x, y, width, height):
+    """Crop the saved image of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = filepath.rsplit('.', 1)[1].lower()
+    output_filename = f"cropped_{timestamp}.{ext}"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, original_size, crop_size = crop_image(
+        filepath, output_path, x, y, width, height
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'original_dimensions': f"{original_size[0]}x{original_size[1]}",
+        'crop_dimensions': f"{crop_size[0]}x{crop_size[1]}",
+        'file_size': file_size
+    }, 200
+
+
+def watermark_image_task(session_id, session_folder, filepath, text, position):
+    """Watermark the saved image of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = filepath.rsplit('.', 1)[1].lower()
+    output_filename = f"watermarked_{timestamp}.{ext}"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, wm_text, wm_pos = watermark_image(
+        filepath, output_path, text, position
+    )
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'watermark_text': wm_text,
+        'watermark_position': wm_pos,
+        'file_size': file_size
+    }, 200
+
+
+def watermark_images_task(session_id, session_folder, saved_files, text, position, opacity):
+    """Watermark the saved images of a session in parallel, zipping multiple outputs."""
+    output_folder = os.path.join(session_folder, 'output')
+    results = []
+    file_timings = []
+    total_pixels = 0
+
+    def watermark_one(job):
+        input_path, output_path = job
+        # Images of the same size share one cached font and text sprite
+        with Image.open(input_path) as img:
+            pixels = img.size[0] * img.size[1]
+            return watermark_open_image(img, output_path, text, position, opacity), pixels
+
+    outputs = unique_outputs(
+        (filepath, os.path.join(output_folder, f"watermarked_{os.path.basename(filepath)}"))
+        for filepath in saved_files
+    )
+    started = time.perf_counter()
+    timed_results = map_images(watermark_one, outputs)
+    elapsed = time.perf_counter() - started
+
+    for (filepath, output_path), ((result, pixels), seconds) in zip(outputs, timed_results):
+        success = result[0]
+        file_timings.append(file_timing(filepath, output_path, success, seconds))
+
+        if success:
+            total_pixels += pixels
+            results.append(output_path)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+
+    if len(results) == 0:
+        return {'success': False, 'error': 'No images could be watermarked'}, 500
+
+    # If multiple files, the zip is streamed from the output folder on download
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if len(results) > 1:
+        output_filename = f"watermarked_images_{timestamp}.zip"
+        _, file_size = plan_zip_stream(list_zip_stream_files(output_folder))
+    else:
+        output_filename = os.path.basename(results[0])
+        final_path = os.path.join(session_folder, output_filename)
+        shutil.move(results[0], final_path)
+        file_size = os.path.getsize(final_path)
+
+    return {
+        'success': True,
+        'message': 'Watermark added successfully!',
+        'session_id': session_id,
+        'filename': output_filename,
+        'watermark_text': text,
+        'watermark_position': position,
+        'file_size': file_size,
+        'images_processed': len(results),
+        'threads': app.config['IMAGE_THREADS'],
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        'megapixels_per_second': round(total_pixels / 1e6 / elapsed, 2) if elapsed > 0 else None,
+        'files': file_timings
+    }, 200
+
+
+def rotate_image_task(session_id, session_folder, filepath, rotation, flip_horizontal, flip_vertical,
+                      use_exif_orientation=False):
+    """Rotate and/or flip the saved image of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = filepath.rsplit('.', 1)[1].lower()
+    output_filename = f"rotated_{timestamp}.{ext}"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, original_size, new_size, rot = rotate_image_file(
+        filepath, output_path, rotation, flip_horizontal, flip_vertical, use_exif_orientation
+    )
 
-        img.close()
+    if not success:
+        return {'success': False, 'error': message}, 500
 
-        return True, "Image rotated successfully!", original_size, new_size, rotation
+    file_size = os.path.getsize(output_path)
 
-    except Exception as e:
-        return False, f"Error rotating image: {str(e)}", (0, 0), (0, 0), 0
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'rotation': rot,
+        'flipped_horizontal': flip_horizontal,
+        'flipped_vertical': flip_vertical,
+        'file_size': file_size
+    }, 200
+
+
+def pipeline_task(session_id, session_folder, filepath, operations):
+    """Run an operations pipeline on the saved image of a session."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = pipeline_output_extension(operations, filepath.rsplit('.', 1)[1].lower())
+    output_filename = f"processed_{timestamp}.{ext}"
+    output_path = os.path.join(session_folder, output_filename)
+
+    success, message, original_size, final_size = run_image_pipeline(filepath, output_path, operations)
+
+    if not success:
+        return {'success': False, 'error': message}, 500
+
+    file_size = os.path.getsize(output_path)
+
+    return {
+        'success': True,
+        'message': message,
+        'session_id': session_id,
+        'filename': output_filename,
+        'operations': [operation['op'] for operation in operations],
+        'original_dimensions': f"{original_size[0]}x{original_size[1]}",
+        'new_dimensions': f"{final_size[0]}x{final_size[1]}",
+        'file_size': file_size
+    }, 200
 
 
 # ============== ROUTES ==============
@@ -637,6 +3941,7 @@ def merge():
 
     session_id, session_folder = get_session_folder()
     saved_files = []
+    digests = []
 
     try:
         for file in files:
@@ -644,7 +3949,7 @@ def merge():
                 filename = secure_filename(file.filename)
                 indexed_filename = f"{len(saved_files):03d}_{filename}"
                 filepath = os.path.join(session_folder, indexed_filename)
-                file.save(filepath)
+                digests.append(save_upload(file, filepath))
                 saved_files.append(filepath)
             else:
                 shutil.rmtree(session_folder, ignore_errors=True)
@@ -658,27 +3963,11 @@ def merge():
             return jsonify({'success': False, 'error': 'Please upload at least 2 valid PDF files'}), 400
 
         saved_files.sort()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"merged_{timestamp}.pdf"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, total_pages = merge_pdfs(saved_files, output_path)
-
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        file_size = os.path.getsize(output_path)
-
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'total_pages': total_pages,
-            'file_size': file_size,
-            'files_merged': len(saved_files)
-        })
+        cache_key = result_cache_key('merge', digests)
+        return submit_job(
+            session_id, session_folder, merge_task,
+            session_id, session_folder, saved_files, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -695,6 +3984,18 @@ def split():
     split_mode = request.form.get('mode', 'all')
     split_value = request.form.get('value', '')
 
+    if split_mode == 'range':
+        try:
+            compile_page_selection(split_value)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    elif split_mode == 'size':
+        try:
+            if float(split_value) <= 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Please specify the maximum part size in MB'}), 400
+
     if not file or not file.filename:
         return jsonify({'success': False, 'error': 'No file selected'}), 400
 
@@ -702,60 +4003,23 @@ def split():
         return jsonify({'success': False, 'error': 'Only PDF files are allowed'}), 400
 
     session_id, session_folder = get_session_folder()
-    output_folder = os.path.join(session_folder, 'output')
-    os.makedirs(output_folder, exist_ok=True)
 
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        success, message, output_files, total_pages = split_pdf(
-            filepath, split_mode, split_value, output_folder
-        )
+        if split_mode == 'range':
+            error = check_page_selection(filepath, digest, split_value)
+            if error:
+                shutil.rmtree(session_folder, ignore_errors=True)
+                return jsonify({'success': False, 'error': error}), 400
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        # If multiple files, create a zip
-        if len(output_files) > 1:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            zip_filename = f"split_{timestamp}.zip"
-            zip_path = os.path.join(session_folder, zip_filename)
-
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for f in output_files:
-                    zf.write(f, os.path.basename(f))
-
-            file_size = os.path.getsize(zip_path)
-            return jsonify({
-                'success': True,
-                'message': message,
-                'session_id': session_id,
-                'filename': zip_filename,
-                'total_pages': total_pages,
-                'files_created': len(output_files),
-                'file_size': file_size,
-                'is_zip': True
-            })
-        else:
-            output_filename = os.path.basename(output_files[0])
-            # Move file to session folder root
-            final_path = os.path.join(session_folder, output_filename)
-            shutil.move(output_files[0], final_path)
-
-            file_size = os.path.getsize(final_path)
-            return jsonify({
-                'success': True,
-                'message': message,
-                'session_id': session_id,
-                'filename': output_filename,
-                'total_pages': total_pages,
-                'files_created': 1,
-                'file_size': file_size,
-                'is_zip': False
-            })
+        cache_key = result_cache_key('split', [digest], mode=split_mode, value=split_value.strip())
+        return submit_job(
+            session_id, session_folder, split_task,
+            session_id, session_folder, filepath, split_mode, split_value, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -782,31 +4046,14 @@ def compress():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"compressed_{timestamp}.pdf"
-        output_path = os.path.join(session_folder, output_filename)
+        digest = save_upload(file, filepath)
 
-        success, message, original_size, compressed_size, reduction = compress_pdf(
-            filepath, output_path, compression_level
+        cache_key = result_cache_key('compress', [digest], level=compression_level)
+        return submit_job(
+            session_id, session_folder, compress_task,
+            session_id, session_folder, filepath, compression_level, cache_key=cache_key
         )
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'original_size': original_size,
-            'compressed_size': compressed_size,
-            'reduction': round(reduction, 1),
-            'file_size': compressed_size
-        })
-
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -821,6 +4068,12 @@ def rotate():
     file = request.files['file']
     rotation = request.form.get('rotation', '90')
     pages = request.form.get('pages', 'all')
+    incremental = request.form.get('incremental', 'false').lower() == 'true'
+
+    try:
+        compile_page_selection(pages)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
     if not file or not file.filename:
         return jsonify({'success': False, 'error': 'No file selected'}), 400
@@ -833,31 +4086,59 @@ def rotate():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"rotated_{timestamp}.pdf"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, total_pages, rotated_pages = rotate_pdf(
-            filepath, output_path, rotation, pages
+        cache_key = result_cache_key(
+            'rotate', [digest], rotation=rotation.strip(), pages=pages.replace(' ', ''), incremental=incremental
+        )
+        return submit_job(
+            session_id, session_folder, rotate_task,
+            session_id, session_folder, filepath, rotation, pages, incremental, cache_key=cache_key
         )
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
+    except Exception as e:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        file_size = os.path.getsize(output_path)
 
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'total_pages': total_pages,
-            'rotated_pages': rotated_pages,
-            'file_size': file_size
-        })
+@app.route('/watermark-pdf', methods=['POST'])
+def watermark_pdf_route():
+    """Handle PDF watermark request."""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+    file = request.files['file']
+    text = request.form.get('text', 'Watermark')
+    position = request.form.get('position', 'bottom-right')
+
+    try:
+        opacity = int(request.form.get('opacity', 128))
+        if not 0 <= opacity <= 255:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Opacity must be between 0 and 255'}), 400
+
+    if not text:
+        return jsonify({'success': False, 'error': 'Please provide watermark text'}), 400
+
+    if not file or not file.filename:
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+
+    if not allowed_file(file.filename, ALLOWED_PDF_EXTENSIONS):
+        return jsonify({'success': False, 'error': 'Only PDF files are allowed'}), 400
+
+    session_id, session_folder = get_session_folder()
+
+    try:
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(session_folder, filename)
+        digest = save_upload(file, filepath)
+
+        cache_key = result_cache_key('watermark-pdf', [digest], text=text, position=position, opacity=opacity)
+        return submit_job(
+            session_id, session_folder, watermark_pdf_task,
+            session_id, session_folder, filepath, text, position, opacity, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -873,6 +4154,11 @@ def extract():
     file = request.files['file']
     page_selection = request.form.get('pages', '1')
 
+    try:
+        compile_page_selection(page_selection)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
     if not file or not file.filename:
         return jsonify({'success': False, 'error': 'No file selected'}), 400
 
@@ -884,35 +4170,53 @@ def extract():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"extracted_{timestamp}.pdf"
-        output_path = os.path.join(session_folder, output_filename)
+        error = check_page_selection(filepath, digest, page_selection)
+        if error:
+            shutil.rmtree(session_folder, ignore_errors=True)
+            return jsonify({'success': False, 'error': error}), 400
 
-        success, message, total_pages, extracted_count = extract_pages(
-            filepath, output_path, page_selection
+        cache_key = result_cache_key('extract', [digest], pages=page_selection.replace(' ', ''))
+        return submit_job(
+            session_id, session_folder, extract_task,
+            session_id, session_folder, filepath, page_selection, cache_key=cache_key
         )
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
+    except Exception as e:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        file_size = os.path.getsize(output_path)
 
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'total_pages': total_pages,
-            'extracted_pages': extracted_count,
-            'file_size': file_size
-        })
+@app.route('/inspect', methods=['POST'])
+def inspect_route():
+    """Report a PDF's page count, page sizes and other metadata without processing it."""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+    file = request.files['file']
+
+    if not file or not file.filename:
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+
+    if not allowed_file(file.filename, ALLOWED_PDF_EXTENSIONS):
+        return jsonify({'success': False, 'error': 'Only PDF files are allowed'}), 400
 
+    # Nothing is kept but the index, so the upload needs no session folder
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{INCOMING_PREFIX}{uuid.uuid4()}")
+
+    try:
+        digest = save_upload(file, filepath)
+        index = pdf_index(filepath, digest)
     except Exception as e:
-        shutil.rmtree(session_folder, ignore_errors=True)
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify({'success': False, 'error': f"Could not read PDF: {str(e)}"}), 400
+    finally:
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+    return jsonify(dict(index, success=True))
 
 
 @app.route('/images-to-pdf', methods=['POST'])
@@ -929,6 +4233,7 @@ def images_to_pdf_route():
 
     session_id, session_folder = get_session_folder()
     saved_files = []
+    digests = []
 
     try:
         for file in files:
@@ -936,7 +4241,7 @@ def images_to_pdf_route():
                 filename = secure_filename(file.filename)
                 indexed_filename = f"{len(saved_files):03d}_{filename}"
                 filepath = os.path.join(session_folder, indexed_filename)
-                file.save(filepath)
+                digests.append(save_upload(file, filepath))
                 saved_files.append(filepath)
             else:
                 shutil.rmtree(session_folder, ignore_errors=True)
@@ -950,26 +4255,11 @@ def images_to_pdf_route():
             return jsonify({'success': False, 'error': 'Please upload at least 1 valid image'}), 400
 
         saved_files.sort()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"images_to_pdf_{timestamp}.pdf"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, image_count = images_to_pdf(saved_files, output_path, page_size)
-
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        file_size = os.path.getsize(output_path)
-
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'images_converted': image_count,
-            'file_size': file_size
-        })
+        cache_key = result_cache_key('images-to-pdf', digests, page_size=page_size)
+        return submit_job(
+            session_id, session_folder, images_to_pdf_task,
+            session_id, session_folder, saved_files, page_size, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -995,65 +4285,28 @@ def compress_image_route():
     os.makedirs(output_folder, exist_ok=True)
 
     try:
-        results = []
-        total_original = 0
-        total_compressed = 0
+        saved_files = []
+        digests = []
 
         for file in files:
             if file and file.filename and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(session_folder, filename)
-                file.save(filepath)
-
-                # Get file extension
-                ext = filename.rsplit('.', 1)[1].lower()
-                output_filename = f"compressed_{filename}"
-                output_path = os.path.join(output_folder, output_filename)
-
-                success, message, orig_size, comp_size, reduction = compress_image(
-                    filepath, output_path, quality
-                )
-
-                if success:
-                    total_original += orig_size
-                    total_compressed += comp_size
-                    results.append(output_path)
+                digests.append(save_upload(file, filepath))
+                saved_files.append(filepath)
 
-        if len(results) == 0:
+        if len(saved_files) == 0:
             shutil.rmtree(session_folder, ignore_errors=True)
             return jsonify({'success': False, 'error': 'No images could be compressed'}), 500
 
-        # If multiple files, create a zip
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        if len(results) > 1:
-            zip_filename = f"compressed_images_{timestamp}.zip"
-            zip_path = os.path.join(session_folder, zip_filename)
-
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for f in results:
-                    zf.write(f, os.path.basename(f))
-
-            file_size = os.path.getsize(zip_path)
-            output_filename = zip_filename
-        else:
-            output_filename = os.path.basename(results[0])
-            final_path = os.path.join(session_folder, output_filename)
-            shutil.move(results[0], final_path)
-            file_size = os.path.getsize(final_path)
-
-        reduction = ((total_original - total_compressed) / total_original * 100) if total_original > 0 else 0
-
-        return jsonify({
-            'success': True,
-            'message': 'Images compressed successfully!',
-            'session_id': session_id,
-            'filename': output_filename,
-            'original_size': total_original,
-            'compressed_size': total_compressed,
-            'reduction': round(max(0, reduction), 1),
-            'file_size': file_size,
-            'images_processed': len(results)
-        })
+        cache_key = result_cache_key(
+            'compress-image', digests, quality=quality,
+            names=[os.path.basename(f) for f in saved_files]
+        )
+        return submit_job(
+            session_id, session_folder, compress_image_task,
+            session_id, session_folder, saved_files, quality, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -1088,32 +4341,16 @@ def resize_image_route():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = filename.rsplit('.', 1)[1].lower()
-        output_filename = f"resized_{timestamp}.{ext}"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, original_size, new_size = resize_image(
-            filepath, output_path, width, height, maintain_aspect
+        cache_key = result_cache_key(
+            'resize-image', [digest], width=width, height=height,
+            maintain_aspect=maintain_aspect, ext=filename.rsplit('.', 1)[1].lower()
+        )
+        return submit_job(
+            session_id, session_folder, resize_image_task,
+            session_id, session_folder, filepath, width, height, maintain_aspect, cache_key=cache_key
         )
-
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        file_size = os.path.getsize(output_path)
-
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'original_dimensions': f"{original_size[0]}x{original_size[1]}",
-            'new_dimensions': f"{new_size[0]}x{new_size[1]}",
-            'file_size': file_size
-        })
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -1137,57 +4374,28 @@ def convert_image_route():
     os.makedirs(output_folder, exist_ok=True)
 
     try:
-        results = []
+        saved_files = []
+        digests = []
 
         for file in files:
             if file and file.filename and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(session_folder, filename)
-                file.save(filepath)
-
-                # Create output filename with new extension
-                base_name = filename.rsplit('.', 1)[0]
-                output_filename = f"{base_name}.{output_format}"
-                output_path = os.path.join(output_folder, output_filename)
-
-                success, message, orig_fmt, new_fmt, size = convert_image(
-                    filepath, output_path, output_format
-                )
-
-                if success:
-                    results.append(output_path)
+                digests.append(save_upload(file, filepath))
+                saved_files.append(filepath)
 
-        if len(results) == 0:
+        if len(saved_files) == 0:
             shutil.rmtree(session_folder, ignore_errors=True)
             return jsonify({'success': False, 'error': 'No images could be converted'}), 500
 
-        # If multiple files, create a zip
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        if len(results) > 1:
-            zip_filename = f"converted_images_{timestamp}.zip"
-            zip_path = os.path.join(session_folder, zip_filename)
-
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for f in results:
-                    zf.write(f, os.path.basename(f))
-
-            file_size = os.path.getsize(zip_path)
-            final_filename = zip_filename
-        else:
-            final_filename = os.path.basename(results[0])
-            final_path = os.path.join(session_folder, final_filename)
-            shutil.move(results[0], final_path)
-            file_size = os.path.getsize(final_path)
-
-        return jsonify({
-            'success': True,
-            'message': 'Images converted successfully!',
-            'session_id': session_id,
-            'filename': final_filename,
-            'output_format': output_format.upper(),
-            'file_size': file_size,
-            'images_converted': len(results)
-        })
+        cache_key = result_cache_key(
+            'convert-image', digests, format=output_format,
+            names=[os.path.basename(f) for f in saved_files]
+        )
+        return submit_job(
+            session_id, session_folder, convert_image_task,
+            session_id, session_folder, saved_files, output_format, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -1222,32 +4430,15 @@ def crop_image_route():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = filename.rsplit('.', 1)[1].lower()
-        output_filename = f"cropped_{timestamp}.{ext}"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, original_size, crop_size = crop_image(
-            filepath, output_path, x, y, width, height
+        cache_key = result_cache_key(
+            'crop-image', [digest], area=[x, y, width, height], ext=filename.rsplit('.', 1)[1].lower()
+        )
+        return submit_job(
+            session_id, session_folder, crop_image_task,
+            session_id, session_folder, filepath, x, y, width, height, cache_key=cache_key
         )
-
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
-
-        file_size = os.path.getsize(output_path)
-
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'original_dimensions': f"{original_size[0]}x{original_size[1]}",
-            'crop_dimensions': f"{crop_size[0]}x{crop_size[1]}",
-            'file_size': file_size
-        })
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -1278,32 +4469,72 @@ def watermark_image_route():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
+        digest = save_upload(file, filepath)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = filename.rsplit('.', 1)[1].lower()
-        output_filename = f"watermarked_{timestamp}.{ext}"
-        output_path = os.path.join(session_folder, output_filename)
-
-        success, message, wm_text, wm_pos = watermark_image(
-            filepath, output_path, text, position
+        cache_key = result_cache_key(
+            'watermark-image', [digest], text=text, position=position,
+            ext=filename.rsplit('.', 1)[1].lower()
+        )
+        return submit_job(
+            session_id, session_folder, watermark_image_task,
+            session_id, session_folder, filepath, text, position, cache_key=cache_key
         )
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
+    except Exception as e:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        file_size = os.path.getsize(output_path)
 
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'watermark_text': wm_text,
-            'watermark_position': wm_pos,
-            'file_size': file_size
-        })
+@app.route('/watermark-images', methods=['POST'])
+def watermark_images_route():
+    """Handle batch image watermark request."""
+    if 'files[]' not in request.files:
+        return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+
+    files = request.files.getlist('files[]')
+    text = request.form.get('text', 'Watermark')
+    position = request.form.get('position', 'bottom-right')
+
+    try:
+        opacity = int(request.form.get('opacity', 128))
+        if not 0 <= opacity <= 255:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Opacity must be between 0 and 255'}), 400
+
+    if not text:
+        return jsonify({'success': False, 'error': 'Please provide watermark text'}), 400
+
+    if len(files) < 1:
+        return jsonify({'success': False, 'error': 'Please upload at least 1 image'}), 400
+
+    session_id, session_folder = get_session_folder()
+    output_folder = os.path.join(session_folder, 'output')
+    os.makedirs(output_folder, exist_ok=True)
+
+    try:
+        saved_files = []
+        digests = []
+
+        for file in files:
+            if file and file.filename and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+                filename = secure_filename(file.filename)
+                filepath = os.path.join(session_folder, filename)
+                digests.append(save_upload(file, filepath))
+                saved_files.append(filepath)
+
+        if len(saved_files) == 0:
+            shutil.rmtree(session_folder, ignore_errors=True)
+            return jsonify({'success': False, 'error': 'No images could be watermarked'}), 500
+
+        cache_key = result_cache_key(
+            'watermark-images', digests, text=text, position=position, opacity=opacity,
+            names=[os.path.basename(f) for f in saved_files]
+        )
+        return submit_job(
+            session_id, session_folder, watermark_images_task,
+            session_id, session_folder, saved_files, text, position, opacity, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
@@ -1320,6 +4551,7 @@ def rotate_image_route():
     rotation = int(request.form.get('rotation', 90))
     flip_horizontal = request.form.get('flipHorizontal', 'false').lower() == 'true'
     flip_vertical = request.form.get('flipVertical', 'false').lower() == 'true'
+    use_exif_orientation = request.form.get('exifOrientation', 'false').lower() == 'true'
 
     if not file or not file.filename:
         return jsonify({'success': False, 'error': 'No file selected'}), 400
@@ -1332,39 +4564,138 @@ def rotate_image_route():
     try:
         filename = secure_filename(file.filename)
         filepath = os.path.join(session_folder, filename)
-        file.save(filepath)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = filename.rsplit('.', 1)[1].lower()
-        output_filename = f"rotated_{timestamp}.{ext}"
-        output_path = os.path.join(session_folder, output_filename)
+        digest = save_upload(file, filepath)
 
-        success, message, original_size, new_size, rot = rotate_image_file(
-            filepath, output_path, rotation, flip_horizontal, flip_vertical
+        cache_key = result_cache_key(
+            'rotate-image', [digest], rotation=rotation, flip_horizontal=flip_horizontal,
+            flip_vertical=flip_vertical, exif_orientation=use_exif_orientation,
+            ext=filename.rsplit('.', 1)[1].lower()
+        )
+        return submit_job(
+            session_id, session_folder, rotate_image_task,
+            session_id, session_folder, filepath, rotation, flip_horizontal, flip_vertical,
+            use_exif_orientation, cache_key=cache_key
         )
 
-        if not success:
-            shutil.rmtree(session_folder, ignore_errors=True)
-            return jsonify({'success': False, 'error': message}), 500
+    except Exception as e:
+        shutil.rmtree(session_folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        file_size = os.path.getsize(output_path)
 
-        return jsonify({
-            'success': True,
-            'message': message,
-            'session_id': session_id,
-            'filename': output_filename,
-            'rotation': rot,
-            'flipped_horizontal': flip_horizontal,
-            'flipped_vertical': flip_vertical,
-            'file_size': file_size
-        })
+@app.route('/pipeline', methods=['POST'])
+def pipeline_route():
+    """Handle a multi-step image pipeline request."""
+    if 'file' not in request.files:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+
+    file = request.files['file']
+
+    try:
+        operations = parse_pipeline_operations(request.form.get('operations'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if not file or not file.filename:
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+
+    if not allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+        return jsonify({'success': False, 'error': 'Only image files are allowed'}), 400
+
+    session_id, session_folder = get_session_folder()
+
+    try:
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(session_folder, filename)
+        digest = save_upload(file, filepath)
+
+        cache_key = result_cache_key(
+            'pipeline', [digest], operations=operations, ext=filename.rsplit('.', 1)[1].lower()
+        )
+        return submit_job(
+            session_id, session_folder, pipeline_task,
+            session_id, session_folder, filepath, operations, cache_key=cache_key
+        )
 
     except Exception as e:
         shutil.rmtree(session_folder, ignore_errors=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Report result cache hits and misses of all workers and the cache's disk usage."""
+    lookups = {
+        dict(labels).get('result'): series['sum']
+        for (name, labels), series in collect_metrics().items()
+        if name == 'pdftools_result_cache_total'
+    }
+    entries = list_cached_results()
+    return jsonify(dict(
+        success=True,
+        hits=int(lookups.get('hit', 0)),
+        misses=int(lookups.get('miss', 0)),
+        entries=len(entries),
+        bytes=sum(size for _, size, _ in entries),
+        max_bytes=app.config['RESULT_CACHE_MAX_BYTES']
+    ))
+
+
+@app.route('/metrics')
+def metrics():
+    """Export request, phase, size and memory histograms of all workers for Prometheus."""
+    return Response(render_prometheus(collect_metrics()), mimetype='text/plain; version=0.0.4')
+
+
+# ============== JOB ROUTES ==============
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status of a queued job."""
+    session_folder, state = read_job_state(job_id)
+
+    if state is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    response = {
+        'success': True,
+        'job_id': state['job_id'],
+        'status': state['status'],
+        'created': state.get('created'),
+        'started': state.get('started'),
+        'finished': state.get('finished')
+    }
+    if state['status'] in ('done', 'failed'):
+        response['result_url'] = f"/jobs/{state['job_id']}/result"
+
+    return jsonify(response)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Return the JSON response of a finished job, or 202 while it is pending."""
+    session_folder, state = read_job_state(job_id)
+
+    if state is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    if state['status'] not in ('done', 'failed'):
+        return jsonify({
+            'success': True,
+            'job_id': state['job_id'],
+            'status': state['status']
+        }), 202
+
+    g.job_timings = state.get('timings')
+    if state['status'] == 'failed':
+        # Nothing left to download; the result has been delivered
+        @after_this_request
+        def cleanup(response):
+            shutil.rmtree(session_folder, ignore_errors=True)
+            return response
+
+    return jsonify(state['result']), state['status_code']
+
+
 @app.route('/download/<session_id>/<filename>')
 def download(session_id, filename):
     """Download the processed file."""
@@ -1375,6 +4706,12 @@ def download(session_id, filename):
     filepath = os.path.join(session_folder, filename)
 
     if not os.path.exists(filepath):
+        # Only the archive named in the finished job's result is generated on the fly
+        _, state = read_job_state(session_id)
+        result = (state or {}).get('result') or {}
+        output_folder = os.path.join(session_folder, 'output')
+        if result.get('filename') == filename and filename.endswith('.zip') and os.path.isdir(output_folder):
+            return stream_zip_download(session_folder, output_folder, filename)
         return jsonify({'error': 'File not found'}), 404
 
     @after_this_request
@@ -1391,12 +4728,63 @@ def download(session_id, filename):
     else:
         mimetype = 'application/pdf'
 
-    return send_file(
-        filepath,
+    file_size = os.path.getsize(filepath)
+    started = time.perf_counter()
+
+    def finish():
+        observe('pdftools_phase_seconds', time.perf_counter() - started, operation='download', phase='download')
+        observe('pdftools_output_bytes', file_size, operation='download')
+        dump_metrics()
+
+    # File responses skip call_on_close, so the transfer is timed until the file is closed
+    response = send_file(
+        ClosingFile(filepath, finish),
         as_attachment=True,
         download_name=filename,
         mimetype=mimetype
     )
+    response.content_length = file_size
+    return response
+
+
+class ClosingFile(io.FileIO):
+    """A file opened for reading that calls on_close once it is closed."""
+
+    def __init__(self, path, on_close):
+        super().__init__(path, 'rb')
+        self._on_close = on_close
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        super().close()
+        if on_close is not None:
+            on_close()
+
+
+def stream_zip_download(session_folder, output_folder, filename):
+    """Stream a session's outputs as a ZIP archive generated on the fly."""
+    entries, total_size = plan_zip_stream(list_zip_stream_files(output_folder))
+
+    response = Response(iter_zip_stream(entries), mimetype='application/zip')
+    response.headers['Content-Length'] = str(total_size)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    started = time.perf_counter()
+
+    # The generator reads the outputs lazily, so clean up only once it is closed
+    def finish():
+        shutil.rmtree(session_folder, ignore_errors=True)
+        observe('pdftools_phase_seconds', time.perf_counter() - started, operation='download', phase='zip')
+        observe('pdftools_output_bytes', total_size, operation='download')
+        dump_metrics()
+
+    response.call_on_close(finish)
+    return response
+
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    """Handle an upload whose content does not match its file type."""
+    return jsonify({'success': False, 'error': str(e)}), 400
 
 
 @app.errorhandler(413)
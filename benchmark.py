@@ -0,0 +1,484 @@
+"""
+Benchmark Suite
+Measures every PDF and image operation in app.py on a generated corpus.
+
+The corpus is built once per preset and reused by later runs (it is seeded,
+so every machine builds the same files):
+
+- PDFs at 1/100/1,000/10,000 pages in three kinds: text (Helvetica pages,
+  shared font), scan (one 200 dpi grayscale JPEG per page) and mixed (text
+  pages, every other one with a 300 dpi photo);
+- images from 1 to 50 MP in every format of ALLOWED_IMAGE_EXTENSIONS.
+
+Each case runs in a forked child so its peak RSS is its own. The report has
+the median wall and CPU time over --repeat runs, the peak RSS and the output
+size; --output stores it as JSON. --compare checks two stored runs (or
+--baseline checks this run against one) and exits with status 1 when a case
+got slower or hungrier than --threshold percent.
+
+    python benchmark.py --preset quick --output before.json
+    python benchmark.py --preset quick --output after.json --baseline before.json
+    python benchmark.py --compare before.json after.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import PIL
+import pypdf
+from PIL import Image, ImageDraw
+
+from app import (
+    ALLOWED_IMAGE_EXTENSIONS, IncrementalPdfWriter, compress_image, compress_pdf, convert_image, crop_image,
+    extract_pages, images_to_pdf, merge_pdfs, parse_pipeline_operations, peak_rss, reset_peak_rss,
+    resize_image, rotate_image_file, rotate_pdf, run_image_pipeline, split_pdf, watermark_image,
+    watermark_pdf
+)
+from resize_quality_check import synthetic_photo
+
+
+PRESETS = {
+    'quick': {'pages': [1, 100], 'megapixels': [1]},
+    'standard': {'pages': [1, 100, 1000], 'megapixels': [1, 12]},
+    'full': {'pages': [1, 100, 1000, 10000], 'megapixels': [1, 12, 24, 50]},
+}
+PDF_KINDS = ('text', 'scan', 'mixed')
+A4 = (595.28, 841.89)
+SCAN_DPI = 200
+PHOTO_SIZE = (1200, 800)
+SEED = 1234
+
+# Cases faster than this are too noisy to flag
+MIN_FLAGGED_SECONDS = 0.05
+
+
+# ============== CORPUS ==============
+
+def text_page_content(rng, page_number, lines=58, top=790):
+    """Content stream of a page of body text."""
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+             'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+    content = [b'BT /F1 10 Tf 12 TL 56 %d Td' % top]
+    for _ in range(lines):
+        line = ' '.join(rng.choice(words) for _ in range(14))
+        content.append(b'(%s) Tj T*' % line.encode('latin-1'))
+    content.append(b'(Page %d) Tj ET' % page_number)
+    return b'\n'.join(content)
+
+
+def scan_page_jpeg(rng, page_number):
+    """A grayscale A4 'scan': paper noise and dark text-like strokes."""
+    size = (int(A4[0] / 72 * SCAN_DPI), int(A4[1] / 72 * SCAN_DPI))
+    img = Image.new('L', size, 235)
+    draw = ImageDraw.Draw(img)
+    for row in range(150, size[1] - 150, 40):
+        x = 150
+        while x < size[0] - 200:
+            word = rng.randint(30, 160)
+            draw.rectangle([x, row, x + word, row + 18], fill=rng.randint(20, 70))
+            x += word + rng.randint(15, 30)
+    draw.text((size[0] // 2, size[1] - 100), str(page_number), fill=0)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=50)
+    return buffer.getvalue()
+
+
+def photo_jpeg(rng):
+    """A small color photo-like JPEG with a random tint."""
+    img = Image.linear_gradient('L').resize(PHOTO_SIZE).convert('RGB')
+    tint = Image.new('RGB', PHOTO_SIZE, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    img = Image.blend(img, tint, 0.5)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def write_image_xobject(writer, data, size, color_space):
+    image_id = writer.reserve()
+    writer.write_stream(image_id, (
+        b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+        b'/ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode'
+    ) % (size[0], size[1], color_space), io.BytesIO(data), len(data))
+    return image_id
+
+
+def write_page(writer, content, font_id=None, image_id=None):
+    """Add an A4 page with a Flate-compressed content stream."""
+    content_id, page_id = writer.reserve(), writer.reserve()
+    data = zlib.compress(content)
+    writer.write_stream(content_id, b'/Filter /FlateDecode', io.BytesIO(data), len(data))
+
+    resources = b''
+    if font_id:
+        resources += b'/Font << /F1 %d 0 R >> ' % font_id
+    if image_id:
+        resources += b'/XObject << /Im0 %d 0 R >> ' % image_id
+    writer.write_object(page_id, (
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << %s>> /Contents %d 0 R >>'
+    ) % (A4[0], A4[1], resources, content_id))
+    writer.page_ids.append(page_id)
+
+
+def generate_pdf(path, kind, pages):
+    """Write a corpus PDF of the given kind and page count."""
+    rng = random.Random(f'{SEED}-{kind}-{pages}')
+    with open(path, 'wb') as f:
+        writer = IncrementalPdfWriter(f)
+        font_id = writer.reserve()
+        writer.write_object(font_id, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+
+        for number in range(1, pages + 1):
+            if kind == 'scan':
+                size = (int(A4[0] / 72 * SCAN_DPI), int(A4[1] / 72 * SCAN_DPI))
+                image_id = write_image_xobject(writer, scan_page_jpeg(rng, number), size, b'/DeviceGray')
+                write_page(writer, b'q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q' % A4, image_id=image_id)
+            elif kind == 'mixed' and number % 2:
+                image_id = write_image_xobject(writer, photo_jpeg(rng), PHOTO_SIZE, b'/DeviceRGB')
+                # 4 x 2.67 in, so the photo is stored at 300 dpi
+                content = b'q 288 0 0 192 153 600 cm /Im0 Do Q\n' + text_page_content(rng, number, 40, 570)
+                write_page(writer, content, font_id=font_id, image_id=image_id)
+            else:
+                write_page(writer, text_page_content(rng, number), font_id=font_id)
+
+        writer.close()
+
+
+def generate_image(path, megapixels):
+    """Write a photo-like image of about the given size, in the format of its extension."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(megapixels * 1e6 / width)
+    img = Image.open(io.BytesIO(synthetic_photo((width, height))))
+    ext = path.rsplit('.', 1)[1]
+    if ext == 'gif':
+        img = img.convert('P', palette=Image.Palette.ADAPTIVE)
+    elif ext in ('jpg', 'jpeg'):
+        img.save(path, 'JPEG', quality=90)
+        return
+    img.save(path)
+
+
+def build_corpus(folder, pages_list, megapixels_list):
+    """Generate the missing corpus files and return {'pdf': [...], 'image': [...]} entries."""
+    os.makedirs(folder, exist_ok=True)
+    corpus = {'pdf': [], 'image': []}
+
+    for pages in pages_list:
+        for kind in PDF_KINDS:
+            path = os.path.join(folder, f'{kind}-{pages}p.pdf')
+            if not os.path.exists(path):
+                print(f"Generating {os.path.basename(path)}", file=sys.stderr)
+                generate_pdf(path + '.tmp', kind, pages)
+                os.replace(path + '.tmp', path)
+            corpus['pdf'].append({'name': os.path.basename(path), 'path': path, 'pages': pages})
+
+    for megapixels in megapixels_list:
+        for ext in sorted(ALLOWED_IMAGE_EXTENSIONS):
+            path = os.path.join(folder, f'photo-{megapixels}mp.{ext}')
+            if not os.path.exists(path):
+                print(f"Generating {os.path.basename(path)}", file=sys.stderr)
+                tmp_path = os.path.join(folder, f'.tmp-photo-{megapixels}mp.{ext}')
+                generate_image(tmp_path, megapixels)
+                os.replace(tmp_path, path)
+            corpus['image'].append({'name': os.path.basename(path), 'path': path, 'megapixels': megapixels})
+
+    return corpus
+
+
+# ============== OPERATIONS ==============
+# Each takes (input path, work folder) and returns the output paths.
+
+def bench_merge(path, work):
+    output = os.path.join(work, 'merged.pdf')
+    return merge_pdfs([path, path], output), [output]
+
+
+def bench_split(path, work):
+    result = split_pdf(path, 'chunks', '10', os.path.join(work, 'split.zip'))
+    return result, [result[2]]
+
+
+def bench_compress(path, work):
+    output = os.path.join(work, 'compressed.pdf')
+    return compress_pdf(path, output, 'medium'), [output]
+
+
+def bench_rotate(path, work):
+    output = os.path.join(work, 'rotated.pdf')
+    return rotate_pdf(path, output, 90, 'all'), [output]
+
+
+def bench_extract(path, work):
+    output = os.path.join(work, 'extracted.pdf')
+    return extract_pages(path, output, 'odd'), [output]
+
+
+def bench_watermark_pdf(path, work):
+    output = os.path.join(work, 'watermarked.pdf')
+    return watermark_pdf(path, output, 'CONFIDENTIAL', 'center', 96), [output]
+
+
+def bench_images_to_pdf(path, work):
+    output = os.path.join(work, 'images.pdf')
+    return images_to_pdf([path], output, 'A4'), [output]
+
+
+def image_output(path, work, ext=None):
+    return os.path.join(work, 'output.' + (ext or path.rsplit('.', 1)[1]))
+
+
+def bench_compress_image(path, work):
+    output = image_output(path, work)
+    return compress_image(path, output, 75), [output]
+
+
+def bench_resize_image(path, work):
+    output = image_output(path, work)
+    return resize_image(path, output, width=1024), [output]
+
+
+def bench_convert_image(path, work):
+    output = image_output(path, work, 'png' if path.endswith('.webp') else 'webp')
+    return convert_image(path, output, output.rsplit('.', 1)[1]), [output]
+
+
+def bench_crop_image(path, work):
+    with Image.open(path) as img:
+        width, height = img.size
+    output = image_output(path, work)
+    return crop_image(path, output, width // 4, height // 4, width // 2, height // 2), [output]
+
+
+def bench_watermark_image(path, work):
+    output = image_output(path, work)
+    return watermark_image(path, output, 'CONFIDENTIAL', 'bottom-right', 128), [output]
+
+
+def bench_rotate_image(path, work):
+    output = image_output(path, work)
+    return rotate_image_file(path, output, 90), [output]
+
+
+def bench_pipeline(path, work):
+    operations = parse_pipeline_operations(json.dumps([
+        {'op': 'resize', 'width': 2048},
+        {'op': 'watermark', 'text': 'CONFIDENTIAL'},
+        {'op': 'compress', 'quality': 80},
+    ]))
+    output = image_output(path, work)
+    return run_image_pipeline(path, output, operations), [output]
+
+
+PDF_OPERATIONS = {
+    'merge': bench_merge,
+    'split': bench_split,
+    'compress': bench_compress,
+    'rotate': bench_rotate,
+    'extract': bench_extract,
+    'watermark_pdf': bench_watermark_pdf,
+}
+IMAGE_OPERATIONS = {
+    'images_to_pdf': bench_images_to_pdf,
+    'compress_image': bench_compress_image,
+    'resize_image': bench_resize_image,
+    'convert_image': bench_convert_image,
+    'crop_image': bench_crop_image,
+    'watermark_image': bench_watermark_image,
+    'rotate_image': bench_rotate_image,
+    'pipeline': bench_pipeline,
+}
+
+
+# ============== MEASUREMENT ==============
+
+def measure_child(conn, operation, path, work):
+    """Run one case in a forked child and send back its measurements."""
+    try:
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result, outputs = operation(path, work)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if not result[0]:
+            raise RuntimeError(result[1])
+        conn.send({
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'peak_rss_bytes': peak_rss(),
+            'output_bytes': sum(os.path.getsize(output) for output in outputs),
+        })
+    except Exception as e:
+        conn.send({'error': str(e)})
+    finally:
+        conn.close()
+
+
+def measure(operation, path, repeat):
+    """Run a case repeat times and return the median times, peak RSS and output size."""
+    context = multiprocessing.get_context('fork')
+    runs = []
+    for _ in range(repeat):
+        work = tempfile.mkdtemp(prefix='pdf-tools-bench-')
+        try:
+            receiver, sender = context.Pipe(duplex=False)
+            child = context.Process(target=measure_child, args=(sender, operation, path, work))
+            child.start()
+            sender.close()
+            try:
+                run = receiver.recv()
+            except EOFError:
+                run = None
+            child.join()
+            if run is None:
+                run = {'error': f'benchmark process died (exit code {child.exitcode})'}
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        if 'error' in run:
+            return run
+        runs.append(run)
+
+    return {
+        'wall_seconds': statistics.median(run['wall_seconds'] for run in runs),
+        'cpu_seconds': statistics.median(run['cpu_seconds'] for run in runs),
+        'peak_rss_bytes': max((run['peak_rss_bytes'] or 0) for run in runs) or None,
+        'output_bytes': runs[-1]['output_bytes'],
+        'runs': repeat,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pypdf': pypdf.__version__,
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_benchmarks(corpus, operations, repeat):
+    results = {}
+    cases = [(name, func, entry) for name, func in PDF_OPERATIONS.items() for entry in corpus['pdf']]
+    cases += [(name, func, entry) for name, func in IMAGE_OPERATIONS.items() for entry in corpus['image']]
+
+    for name, func, entry in cases:
+        if operations and name not in operations:
+            continue
+        case = f"{name}/{entry['name']}"
+        result = measure(func, entry['path'], repeat)
+        result['input_bytes'] = os.path.getsize(entry['path'])
+        results[case] = result
+
+        if 'error' in result:
+            print(f"{case:45} ERROR {result['error']}")
+        else:
+            print(f"{case:45} {result['wall_seconds']:9.3f}s wall {result['cpu_seconds']:9.3f}s cpu "
+                  f"{(result['peak_rss_bytes'] or 0) / 2**20:8.1f} MB rss {result['output_bytes']:>12} B out")
+    return results
+
+
+# ============== COMPARISON ==============
+
+def compare(baseline, current, threshold):
+    """Print the change of every case and return the list of regressions."""
+    regressions = []
+    for case, new in current['results'].items():
+        old = baseline['results'].get(case)
+        if old is None or 'error' in old or 'error' in new:
+            continue
+
+        flags = []
+        wall_change = (new['wall_seconds'] - old['wall_seconds']) / old['wall_seconds'] * 100
+        if wall_change > threshold and new['wall_seconds'] - old['wall_seconds'] > MIN_FLAGGED_SECONDS:
+            flags.append('time')
+        rss_change = 0.0
+        if old.get('peak_rss_bytes') and new.get('peak_rss_bytes'):
+            rss_change = (new['peak_rss_bytes'] - old['peak_rss_bytes']) / old['peak_rss_bytes'] * 100
+            if rss_change > threshold:
+                flags.append('memory')
+        size_change = 0.0
+        if old['output_bytes']:
+            size_change = (new['output_bytes'] - old['output_bytes']) / old['output_bytes'] * 100
+            if size_change > threshold:
+                flags.append('size')
+
+        print(f"{case:45} {old['wall_seconds']:9.3f}s -> {new['wall_seconds']:9.3f}s ({wall_change:+6.1f}%)  "
+              f"rss {rss_change:+6.1f}%  size {size_change:+6.1f}%  {'REGRESSION ' + ','.join(flags) if flags else ''}")
+        if flags:
+            regressions.append(case)
+
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"{len(missing)} baseline cases were not run")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF and image operations.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default='standard',
+                        help="Corpus size: quick, standard or full (10,000 pages, 50 MP; several GB)")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), 'pdf-tools-bench-corpus'),
+                        help="Folder for the generated corpus, reused between runs")
+    parser.add_argument("--operations", nargs="*", choices=sorted({**PDF_OPERATIONS, **IMAGE_OPERATIONS}),
+                        help="Only run these operations (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; times are medians (default: 3)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results against this earlier JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Only compare two result files")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Flag cases more than this many percent slower, larger or hungrier (default: 10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(load_results(args.compare[0]), load_results(args.compare[1]), args.threshold)
+        print(f"\n{len(regressions)} regressions")
+        sys.exit(1 if regressions else 0)
+
+    preset = PRESETS[args.preset]
+    corpus = build_corpus(args.corpus, preset['pages'], preset['megapixels'])
+    report = {
+        'environment': environment(),
+        'preset': args.preset,
+        'results': run_benchmarks(corpus, args.operations, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.output}")
+
+    failed = any('error' in result for result in report['results'].values())
+    if args.baseline:
+        print()
+        regressions = compare(load_results(args.baseline), report, args.threshold)
+        print(f"\n{len(regressions)} regressions")
+        failed = failed or bool(regressions)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+gunicorn configuration, loaded automatically from the working directory.
+
+Every PDF/image operation runs in the job process pool of the web worker
+that received the upload, so the web workers only stream uploads to disk,
+answer job polls and send downloads. That makes them I/O-bound: gthread
+workers with a handful of threads each, sized by server_sizing.py together
+with the job processes (JOB_WORKERS) that do the CPU-bound work. Explicit
+environment variables always win over the computed defaults.
+
+Route timeouts are enforced per operation on the jobs (JOB_TIMEOUT,
+JOB_TIMEOUTS in app.py); gunicorn's own timeout only catches hung workers.
+"""
+
+import os
+import random
+
+from server_sizing import JOB_MEMORY_BYTES, current_rss, plan
+
+
+sizing = plan(web_workers=int(os.environ.get('WEB_CONCURRENCY', 0)) or None)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = sizing['web_workers']
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', sizing['threads']))
+
+# Import the app once in the master: workers start faster, share its pages and
+# its default UPLOAD_FOLDER. Job pools are created lazily in each worker.
+preload_app = True
+
+# Heartbeat timeout of a worker; long uploads and jobs do not count against it
+timeout = 120
+# Time for in-flight requests to finish when a worker is recycled or stopped
+graceful_timeout = 120
+keepalive = 5
+
+# Recycle web workers every ~1000 requests, or when they grow past WEB_MAX_RSS_BYTES.
+# A worker's job queue lives and dies with it, so gunicorn's own max_requests
+# (which also counts job polls) is off: post_request recycles idle workers only.
+max_requests = 0
+recycle_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+web_max_rss = int(os.environ.get('WEB_MAX_RSS_BYTES', 384 * 1024 * 1024))
+
+# Keep the heartbeat file off disks that can stall under upload load
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Job processes: the machine's job slots split between the workers. Each is
+# replaced after 50 jobs or after a job peaked above the per-job memory budget.
+os.environ.setdefault('JOB_WORKERS', str(sizing['job_workers']))
+os.environ.setdefault('IMAGE_THREADS', str(sizing['image_threads']))
+os.environ.setdefault('JOB_MAX_TASKS', '50')
+os.environ.setdefault('JOB_MAX_RSS_BYTES', str(JOB_MEMORY_BYTES))
+
+
+def when_ready(server):
+    server.log.info(
+        "%d CPUs, %.1f GB: %d workers x %d threads, %s job processes per worker, %s image threads per job",
+        sizing['cpus'], sizing['memory'] / 2**30, workers, threads,
+        os.environ['JOB_WORKERS'], os.environ['IMAGE_THREADS']
+    )
+
+
+def post_fork(server, worker):
+    # Jitter, so the workers do not all restart at once
+    worker.recycle_after = recycle_requests + random.randint(0, recycle_requests // 10) if recycle_requests else 0
+
+
+def post_request(worker, req, environ, resp):
+    from app import jobs_in_progress
+
+    rss = current_rss()
+    over_requests = worker.recycle_after and worker.nr >= worker.recycle_after
+    over_memory = web_max_rss and rss and rss > web_max_rss
+    if worker.alive and (over_requests or over_memory) and jobs_in_progress() == 0:
+        worker.log.info("Worker %s idle after %d requests at %d MB RSS, recycling",
+                        worker.pid, worker.nr, (rss or 0) // 2**20)
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    # Jobs still queued or running in a stopped worker would never finish
+    from app import abandon_jobs
+
+    abandon_jobs('The server restarted before the job finished. Please try again.')
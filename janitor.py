@@ -0,0 +1,48 @@
+"""
+Session Janitor
+Removes abandoned session folders from the upload folder.
+
+Runs the same sweep as the janitor thread inside the web workers, for
+deployments that prefer a cron job or a separate process. Point it at the
+folder the workers share via UPLOAD_FOLDER.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from app import app, sweep_session_folders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove abandoned session folders.")
+    parser.add_argument("--upload-folder", default=os.environ.get("UPLOAD_FOLDER"),
+                        help="Folder holding the session folders (default: $UPLOAD_FOLDER)")
+    parser.add_argument("--ttl", type=int, default=app.config['SESSION_TTL'],
+                        help="Remove sessions idle for longer than this many seconds")
+    parser.add_argument("--quota", type=int, default=app.config['UPLOAD_QUOTA_BYTES'],
+                        help="Evict oldest sessions while the folder exceeds this many bytes (0 = no quota)")
+    parser.add_argument("--interval", type=int, default=0,
+                        help="Keep running, sweeping every this many seconds (default: sweep once)")
+    args = parser.parse_args()
+
+    if not args.upload_folder or not os.path.isdir(args.upload_folder):
+        print("Error: set --upload-folder or UPLOAD_FOLDER to an existing folder")
+        sys.exit(1)
+
+    while True:
+        report = sweep_session_folders(args.upload_folder, args.ttl, args.quota)
+        if report is None:
+            print("Another sweeper is running, skipped")
+        else:
+            print(f"Removed {report['expired']} expired and {report['evicted']} evicted sessions, "
+                  f"reclaimed {report['reclaimed_bytes']} bytes, {report['remaining_bytes']} bytes remain")
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
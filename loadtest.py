@@ -0,0 +1,446 @@
+"""
+Load Test
+Replays a mix of uploads against a locally started server and reports
+latency percentiles, queueing, error rate and disk growth.
+
+For every worker count the script starts the app under gunicorn (or the
+Flask development server with --server flask) on a fresh UPLOAD_FOLDER with
+the result cache off, then runs each concurrency level. A request counts
+from the upload to the end of the download: upload, 202, polling
+/jobs/<id>/result, then GET /download. Payloads come from the benchmark
+corpus (see benchmark.py), so they are real multi-page PDFs and photos.
+
+The `near-limit` scenario uploads a PDF of about 90 MB and `oversize` one
+just over MAX_CONTENT_LENGTH; the expected 413s of the latter are reported
+as rejections, not errors.
+
+    python loadtest.py --workers 1 2 4 --concurrency 1 4 16 --requests 100
+    python loadtest.py --mix resize-image=3,compress=1 --output run.json
+    python loadtest.py --url http://127.0.0.1:8000 --upload-folder /var/lib/pdf-tools
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from app import app, folder_size
+from benchmark import generate_image, generate_pdf
+
+
+# Scenario: (route, form fields, [(field, corpus file)], expected upload status)
+SCENARIOS = {
+    'merge': ('/merge', {}, [('files[]', 'mixed-100p.pdf'), ('files[]', 'text-100p.pdf')], 202),
+    'split': ('/split', {'mode': 'chunks', 'value': '10'}, [('file', 'text-1000p.pdf')], 202),
+    'compress': ('/compress', {'level': 'medium'}, [('file', 'mixed-100p.pdf')], 202),
+    'rotate': ('/rotate', {'rotation': '90', 'pages': 'all'}, [('file', 'text-1000p.pdf')], 202),
+    'extract': ('/extract', {'pages': 'odd'}, [('file', 'scan-100p.pdf')], 202),
+    'watermark-pdf': ('/watermark-pdf', {'text': 'DRAFT'}, [('file', 'text-100p.pdf')], 202),
+    'images-to-pdf': ('/images-to-pdf', {'pageSize': 'A4'},
+                      [('files[]', 'photo-12mp.jpg'), ('files[]', 'photo-1mp.png')], 202),
+    'compress-image': ('/compress-image', {'quality': '75'}, [('files[]', 'photo-12mp.jpg')], 202),
+    'resize-image': ('/resize-image', {'width': '1024'}, [('file', 'photo-12mp.jpg')], 202),
+    'convert-image': ('/convert-image', {'format': 'webp'}, [('files[]', 'photo-1mp.png')], 202),
+    'rotate-image': ('/rotate-image', {'rotation': '90'}, [('file', 'photo-12mp.jpg')], 202),
+    'watermark-image': ('/watermark-image', {'text': 'DRAFT'}, [('file', 'photo-12mp.jpg')], 202),
+    'near-limit': ('/rotate', {'rotation': '90', 'pages': 'all'}, [('file', 'scan-330p.pdf')], 202),
+    'oversize': ('/rotate', {'rotation': '90', 'pages': 'all'}, [('file', 'oversize.pdf')], 413),
+}
+DEFAULT_MIX = ('merge=2,split=1,compress=2,rotate=2,extract=1,images-to-pdf=1,'
+               'compress-image=3,resize-image=3,convert-image=2')
+POLL_INTERVAL = 0.05
+DEFAULT_JOB_TIMEOUT = 15 * 60
+DISK_SAMPLE_INTERVAL = 0.5
+
+
+# ============== PAYLOADS ==============
+
+def corpus_file(folder, name):
+    """Return the path of a payload, generating it on first use."""
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        return path
+
+    print(f"Generating {name}", file=sys.stderr)
+    os.makedirs(folder, exist_ok=True)
+    stem, ext = name.rsplit('.', 1)
+    tmp_path = os.path.join(folder, f'.tmp-{name}')
+    if name == 'oversize.pdf':
+        # Valid PDF padded past the limit; the server must reject it from Content-Length
+        with open(corpus_file(folder, 'text-100p.pdf'), 'rb') as src, open(tmp_path, 'wb') as f:
+            f.write(src.read())
+            f.truncate(app.config['MAX_CONTENT_LENGTH'] + 1024 * 1024)
+    elif ext == 'pdf':
+        kind, pages = stem.split('-')
+        generate_pdf(tmp_path, kind, int(pages.rstrip('p')))
+    else:
+        generate_image(tmp_path, int(stem.split('-')[1].rstrip('mp')))
+    os.replace(tmp_path, path)
+    return path
+
+
+def parse_mix(spec):
+    """Parse 'scenario=weight,...' into a {scenario: weight} dict."""
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+# ============== HTTP CLIENT ==============
+
+def multipart_body(fields, files, upload_rate=0):
+    """
+    Return (content type, length, chunk generator) of a streamed multipart body.
+    upload_rate caps the upload at that many bytes per second (0 = unlimited).
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        head = f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        parts.append((head.encode(), None))
+    for name, path in files:
+        filename = os.path.basename(path)
+        head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n')
+        parts.append((head.encode(), path))
+    closing = f'--{boundary}--\r\n'.encode()
+
+    length = len(closing) + sum(len(head) + (os.path.getsize(path) + 2 if path else 0) for head, path in parts)
+
+    def chunks():
+        started, sent = time.perf_counter(), 0
+        for head, path in parts:
+            yield head
+            if path:
+                with open(path, 'rb') as f:
+                    while True:
+                        chunk = f.read(64 * 1024 if upload_rate else 1024 * 1024)
+                        if not chunk:
+                            break
+                        yield chunk
+                        sent += len(chunk)
+                        if upload_rate:
+                            # Sleep until the average rate is back under the cap
+                            time.sleep(max(0.0, sent / upload_rate - (time.perf_counter() - started)))
+                yield b'\r\n'
+        yield closing
+
+    return f'multipart/form-data; boundary={boundary}', length, chunks()
+
+
+def http_request(base_url, method, path, body=None, headers=None, timeout=600):
+    """Send a request and return (status, body bytes); the body of a 413 may be cut short."""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+    try:
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+        except (BrokenPipeError, ConnectionResetError):
+            # The server may answer and close before the whole upload is sent
+            pass
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def run_scenario(base_url, name, payloads, upload_rate=0, job_timeout=DEFAULT_JOB_TIMEOUT):
+    """
+    Upload, wait for the job and download its result; return a sample dict.
+    A job still pending job_timeout seconds after the upload is an error.
+    """
+    route, fields, files, expected_status = SCENARIOS[name]
+    sample = {'scenario': name, 'error': None, 'rejected': False, 'timed_out': False, 'queue_seconds': None}
+    started = time.perf_counter()
+
+    try:
+        content_type, length, body = multipart_body(
+            fields, [(field, payloads[file]) for field, file in files], upload_rate
+        )
+        status, data = http_request(base_url, 'POST', route, body,
+                                    {'Content-Type': content_type, 'Content-Length': str(length)})
+        sample['submit_seconds'] = time.perf_counter() - started
+
+        if status != expected_status:
+            sample['error'] = f'{route} returned {status}'
+        elif status == 413:
+            sample['rejected'] = True
+        else:
+            job = json.loads(data)
+            deadline = time.perf_counter() + job_timeout
+            while status == 202 and time.perf_counter() < deadline:
+                time.sleep(POLL_INTERVAL)
+                status, data = http_request(base_url, 'GET', f"/jobs/{job['job_id']}/result")
+            result = json.loads(data)
+            if status == 202:
+                sample['timed_out'] = True
+                sample['error'] = f'job not finished after {job_timeout:g} s'
+            elif status != 200 or not result.get('success'):
+                sample['error'] = result.get('error') or f'job returned {status}'
+            else:
+                _, state = http_request(base_url, 'GET', f"/jobs/{job['job_id']}")
+                state = json.loads(state)
+                if state.get('started') and state.get('created'):
+                    sample['queue_seconds'] = state['started'] - state['created']
+                status, _ = http_request(base_url, 'GET', f"/download/{result['session_id']}/{result['filename']}")
+                if status != 200:
+                    sample['error'] = f'download returned {status}'
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        sample['error'] = f'{type(e).__name__}: {e}'
+
+    sample['total_seconds'] = time.perf_counter() - started
+    return sample
+
+
+# ============== SERVER ==============
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, workers, upload_folder, extra_args, cache):
+    """Start the app on a free port and return (process, base URL) once it answers."""
+    port = free_port()
+    env = dict(os.environ, UPLOAD_FOLDER=upload_folder)
+    if not cache:
+        env['RESULT_CACHE_MAX_BYTES'] = '0'
+
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), '--timeout', '600'] + extra_args
+    else:
+        command = [sys.executable, '-c',
+                   f'from app import app; app.run(host="127.0.0.1", port={port}, threaded=True)']
+
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{server} exited with status {process.returncode}')
+        try:
+            http_request(base_url, 'GET', '/cache/stats', timeout=2)
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{server} did not start within 30 seconds')
+
+
+def stop_server(process):
+    if process is None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ============== REPORT ==============
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed, disk):
+    latencies = [s['total_seconds'] for s in samples if not s['error'] and not s['rejected']]
+    queue = [s['queue_seconds'] for s in samples if s['queue_seconds'] is not None]
+    errors = [s for s in samples if s['error']]
+    summary = {
+        'requests': len(samples),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'submit_p95': percentile([s['submit_seconds'] for s in samples if 'submit_seconds' in s], 95),
+        'queue_p95': percentile(queue, 95),
+        'error_rate': len(errors) / len(samples) if samples else 0,
+        'rejected': sum(s['rejected'] for s in samples),
+        'timeouts': sum(s['timed_out'] for s in samples),
+        'errors': sorted({s['error'] for s in errors})[:10],
+        'disk': disk,
+        'scenarios': {},
+    }
+    for name in sorted({s['scenario'] for s in samples}):
+        times = [s['total_seconds'] for s in samples if s['scenario'] == name and not s['error']]
+        summary['scenarios'][name] = {
+            'requests': sum(s['scenario'] == name for s in samples),
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+        }
+    return summary
+
+
+def fmt(seconds):
+    return '-' if seconds is None else f'{seconds:.3f}'
+
+
+def print_summary(label, summary):
+    disk = summary['disk']
+    print(f"{label:22} {summary['requests']:5} req {summary['throughput']:7.2f}/s  "
+          f"p50 {fmt(summary['p50'])} p95 {fmt(summary['p95'])} p99 {fmt(summary['p99'])}  "
+          f"queue p95 {fmt(summary['queue_p95'])}  errors {summary['error_rate'] * 100:5.1f}%  "
+          f"rejected {summary['rejected']}  timeouts {summary['timeouts']}  "
+          f"disk +{(disk['peak'] - disk['start']) / 2**20:.1f} MB peak, "
+          f"+{(disk['end'] - disk['start']) / 2**20:.1f} MB after")
+    for name, scenario in summary['scenarios'].items():
+        print(f"    {name:18} {scenario['requests']:5} req  p50 {fmt(scenario['p50'])} p95 {fmt(scenario['p95'])}")
+    for error in summary['errors']:
+        print(f"    error: {error}")
+
+
+def compare(baseline, current, threshold):
+    """Print p95, throughput and error rate changes; return the regressed run labels."""
+    regressions = []
+    for label, new in current['runs'].items():
+        old = baseline['runs'].get(label)
+        if not old or old['p95'] is None or new['p95'] is None:
+            continue
+        p95_change = (new['p95'] - old['p95']) / old['p95'] * 100
+        throughput_change = ((new['throughput'] - old['throughput']) / old['throughput'] * 100
+                             if old['throughput'] else 0.0)
+        regressed = p95_change > threshold or new['error_rate'] > old['error_rate']
+        print(f"{label:22} p95 {fmt(old['p95'])} -> {fmt(new['p95'])} ({p95_change:+6.1f}%)  "
+              f"throughput {throughput_change:+6.1f}%  errors {old['error_rate'] * 100:.1f}% -> "
+              f"{new['error_rate'] * 100:.1f}%  {'REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(label)
+    return regressions
+
+
+def run_level(base_url, upload_folder, mix, payloads, concurrency, requests, seed, upload_rate=0,
+              job_timeout=DEFAULT_JOB_TIMEOUT):
+    """Run one concurrency level and return its summary."""
+    rng = random.Random(seed)
+    names = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+
+    # Without a folder to watch (--url alone) disk growth reads as zero
+    measure_disk = folder_size if upload_folder else (lambda folder: 0)
+    disk = {'start': measure_disk(upload_folder)}
+    disk['peak'] = disk['start']
+    done = threading.Event()
+
+    def sample_disk():
+        while not done.wait(DISK_SAMPLE_INTERVAL):
+            disk['peak'] = max(disk['peak'], measure_disk(upload_folder))
+
+    sampler = threading.Thread(target=sample_disk, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(
+            lambda name: run_scenario(base_url, name, payloads, upload_rate, job_timeout), names
+        ))
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    disk['end'] = measure_disk(upload_folder)
+    disk['peak'] = max(disk['peak'], disk['end'])
+
+    return summarize(samples, elapsed, disk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web app.")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Weighted scenarios, e.g. merge=2,resize-image=3 (choose from {', '.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent clients per level (default: 1 4 16)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="gunicorn worker counts to test, restarting the server for each (default: 1)")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per level (default: 50)")
+    parser.add_argument("--upload-rate", type=float, default=0,
+                        help="Cap each client's upload at this many MB/s, like a real uplink (default: no cap)")
+    parser.add_argument("--job-timeout", type=float, default=DEFAULT_JOB_TIMEOUT,
+                        help="Count a job still pending after this many seconds as an error "
+                             f"(default: {DEFAULT_JOB_TIMEOUT})")
+    parser.add_argument("--server", choices=("gunicorn", "flask"), default="gunicorn",
+                        help="Server to start (flask: threaded development server, ignores --workers)")
+    parser.add_argument("--gunicorn-args", default="", help="Extra gunicorn arguments, e.g. '-c gunicorn.conf.py'")
+    parser.add_argument("--job-workers", type=int, help="JOB_WORKERS for the started server")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache on (default: off)")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--upload-folder", help="UPLOAD_FOLDER of the server given by --url, to watch disk growth")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), 'pdf-tools-bench-corpus'),
+                        help="Folder of the generated payloads (shared with benchmark.py)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the scenario sequence")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against an earlier JSON report")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Flag runs whose p95 grew by more than this many percent (default: 10)")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.job_workers:
+        os.environ['JOB_WORKERS'] = str(args.job_workers)
+
+    payloads = {}
+    for name in mix:
+        for _, file in SCENARIOS[name][2]:
+            payloads[file] = corpus_file(args.corpus, file)
+
+    report = {'mix': mix, 'server': args.url or args.server, 'runs': {}}
+    worker_counts = [None] if args.url or args.server == 'flask' else args.workers
+    for workers in worker_counts:
+        process = None
+        upload_folder = args.upload_folder
+        try:
+            if args.url:
+                base_url = args.url.rstrip('/')
+            else:
+                upload_folder = tempfile.mkdtemp(prefix='pdf-tools-load-')
+                process, base_url = start_server(args.server, workers, upload_folder,
+                                                 args.gunicorn_args.split(), args.cache)
+
+            for concurrency in args.concurrency:
+                label = f'w{workers}-c{concurrency}' if workers else f'c{concurrency}'
+                summary = run_level(base_url, upload_folder, mix, payloads, concurrency, args.requests,
+                                    args.seed, int(args.upload_rate * 1024 * 1024), args.job_timeout)
+                report['runs'][label] = summary
+                print_summary(label, summary)
+        finally:
+            stop_server(process)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, report, args.threshold)
+        print(f"\n{len(regressions)} regressions")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,181 @@
 """
 PDF Merger Script
 Merges two or more PDF files into a single PDF.
+
+The merge engine appends whole documents and deduplicates shared resources
+(fonts, images, ICC profiles, form XObjects) across inputs by content hash, so
+the output stores each distinct resource once. Each source is closed and
+released as soon as its objects have been copied into the writer.
+
+Memory ceiling: peak memory is the deduplicated output. Sources are read
+through a memory map (see read_pdf), so an input costs page cache, not heap.
+Each merged page costs its page dictionary and content stream (typically a
+few KB) plus only the resources no earlier page used; a logo, font or
+scanner ICC profile repeated on every page is held once.
 """
 
 from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+import hashlib
+import mmap
 import sys
 import os
 
 
+def read_pdf(path):
+    """
+    Return a PdfReader that reads path through a read-only memory map.
+
+    Given a path, pypdf reads the whole file into a bytes buffer before
+    parsing. A mapping lets it seek straight into the page cache instead, so
+    only the objects it actually parses are copied onto the heap. The mapping
+    lives as long as the reader.
+    """
+    with open(path, "rb") as f:
+        try:
+            stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files cannot be mapped; let pypdf report them
+            return PdfReader(path)
+    return PdfReader(stream)
+
+
+# Dictionary types that are safe to share between pages and documents
+SHARED_RESOURCE_TYPES = {'/Font', '/FontDescriptor', '/ExtGState', '/Encoding'}
+
+
+def feed_digest(digest, obj, replaced):
+    """Feed a canonical serialization of obj into a hashlib digest."""
+    if isinstance(obj, IndirectObject):
+        target = replaced.get(obj.idnum, obj)
+        digest.update(b'R%d ' % target.idnum)
+    elif isinstance(obj, DictionaryObject):
+        digest.update(b'<<')
+        for key in sorted(obj.keys()):
+            # /Length may be an indirect object that differs between copies
+            if key == '/Length' and isinstance(obj, StreamObject):
+                continue
+            digest.update(key.encode('utf-8'))
+            feed_digest(digest, obj.raw_get(key), replaced)
+        digest.update(b'>>')
+        if isinstance(obj, StreamObject):
+            # Hash the encoded bytes; decoding every image just to hash it is wasteful
+            digest.update(b'stream')
+            digest.update(obj._data)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b'[')
+        for item in obj:
+            feed_digest(digest, item, replaced)
+        digest.update(b']')
+    else:
+        digest.update(type(obj).__name__.encode('utf-8'))
+        digest.update(repr(obj).encode('utf-8'))
+        digest.update(b' ')
+
+
+def replace_references(obj, replaced):
+    """Point references to deduplicated objects at their canonical copy."""
+    if isinstance(obj, DictionaryObject):
+        for key in list(obj.keys()):
+            value = obj.raw_get(key)
+            if isinstance(value, IndirectObject):
+                if value.idnum in replaced:
+                    obj[key] = replaced[value.idnum]
+            else:
+                replace_references(value, replaced)
+    elif isinstance(obj, ArrayObject):
+        for i, value in enumerate(obj):
+            if isinstance(value, IndirectObject):
+                if value.idnum in replaced:
+                    obj[i] = replaced[value.idnum]
+            else:
+                replace_references(value, replaced)
+
+
+def is_shared_resource(obj):
+    """Check whether an object may be shared by content hash."""
+    if isinstance(obj, StreamObject):
+        return True
+    return isinstance(obj, DictionaryObject) and obj.get('/Type') in SHARED_RESOURCE_TYPES
+
+
+def dedupe_new_objects(writer, start, digests, replaced):
+    """
+    Deduplicate the objects added to writer since index start.
+
+    digests maps a content hash to the canonical IndirectObject, and replaced
+    maps dropped object numbers to it; both are carried across documents.
+    Objects are visited newest first so that children (font files, soft
+    masks) are canonicalized before the dictionaries that reference them are
+    hashed. References are rewritten afterwards by rewrite_references.
+    Returns the number of objects dropped.
+    """
+    objects = writer._objects
+    dropped = 0
+
+    for index in range(len(objects) - 1, start - 1, -1):
+        obj = objects[index]
+        if obj is None or not is_shared_resource(obj):
+            continue
+
+        digest = hashlib.sha256()
+        feed_digest(digest, obj, replaced)
+        key = digest.digest()
+
+        if key in digests:
+            replaced[index + 1] = digests[key]
+            objects[index] = None
+            dropped += 1
+        else:
+            digests[key] = obj.indirect_reference
+
+    return dropped
+
+
+def rewrite_references(writer, replaced):
+    """
+    Point every reference in writer at the canonical copies, including those
+    in objects created before a document was appended (the catalog's
+    /AcroForm, /Names, outlines, the page tree) that append extends.
+    """
+    if not replaced:
+        return
+    for obj in writer._objects:
+        if obj is not None:
+            replace_references(obj, replaced)
+
+
+def merge_documents(pdf_files: list, output_path: str) -> int:
+    """
+    Merge PDF files with the deduplicating engine and return the page count.
+
+    Raises FileNotFoundError if an input is missing.
+    """
+    writer = PdfWriter()
+    digests = {}
+    replaced = {}
+    total_pages = 0
+
+    for pdf_file in pdf_files:
+        if not os.path.exists(pdf_file):
+            raise FileNotFoundError(f"File not found: {pdf_file}")
+
+        start = len(writer._objects)
+        reader = read_pdf(pdf_file)
+        total_pages += len(reader.pages)
+        writer.append(reader)
+        # Cloning copies every object, so the source (and its mapping) can go right away
+        del reader
+
+        dedupe_new_objects(writer, start, digests, replaced)
+
+    rewrite_references(writer, replaced)
+    with open(output_path, "wb") as output_file:
+        writer.write(output_file)
+
+    return total_pages
+
+
 def merge_pdfs(pdf_files: list, output_path: str) -> None:
     """
     Merge multiple PDF files into a single PDF.
@@ -16,20 +184,11 @@ def merge_pdfs(pdf_files: list, output_path: str) -> None:
         pdf_files: List of paths to PDF files to merge (in order)
         output_path: Path for the output merged PDF
     """
-    writer = PdfWriter()
-
     try:
         for pdf_file in pdf_files:
-            if not os.path.exists(pdf_file):
-                raise FileNotFoundError(f"File not found: {pdf_file}")
-
             print(f"Adding: {pdf_file}")
-            reader = PdfReader(pdf_file)
-            for page in reader.pages:
-                writer.add_page(page)
 
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        merge_documents(pdf_files, output_path)
 
         print(f"\nSuccessfully merged {len(pdf_files)} PDFs into: {output_path}")
 
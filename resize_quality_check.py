@@ -0,0 +1,111 @@
+"""
+Resize Quality Check
+Compares the fast resize path (JPEG draft mode / reduce()) against a full
+decode followed by a plain LANCZOS resize.
+
+For each image it reports the time of both paths, the PSNR of the fast
+output against the reference and the largest per-channel difference. The
+check fails when any image falls below the PSNR threshold; at 40 dB and
+above the two outputs are visually indistinguishable.
+
+Without input files it generates a synthetic 48 MP photo-like JPEG.
+"""
+
+import argparse
+import io
+import math
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+from app import decode_for_resize, resample, resize_dimensions
+
+
+def synthetic_photo(size=(8000, 6000)):
+    """Build a JPEG with gradients, hard edges and fine noise, like a real photo."""
+    width, height = size
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    img = Image.merge('RGB', (
+        img.getchannel(0),
+        img.getchannel(0).transpose(Image.Transpose.ROTATE_90).resize(size),
+        Image.effect_noise(size, 60).filter(ImageFilter.GaussianBlur(2)),
+    ))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, width, width // 40):
+        draw.line([(i, 0), (width - i, height)], fill=(255, 255, 255), width=3)
+        draw.rectangle([i, i // 2, i + width // 80, i // 2 + height // 60], fill=(200, 30, 30))
+
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=92)
+    return buf.getvalue()
+
+
+def reference_resize(data, width, height):
+    """Full decode and a single LANCZOS pass, as resize_image did before draft mode."""
+    img = Image.open(io.BytesIO(data))
+    size = resize_dimensions(img.size, width, height)
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+
+def fast_resize(data, width, height):
+    """The resize_image path: reduced decode, reduce(), then LANCZOS."""
+    img = Image.open(io.BytesIO(data))
+    size = resize_dimensions(img.size, width, height)
+    decode_for_resize(img, size)
+    return resample(img, size)
+
+
+def psnr(a, b):
+    """Peak signal-to-noise ratio of two same-sized images in dB."""
+    diff = ImageChops.difference(a.convert('RGB'), b.convert('RGB'))
+    mse = sum(value ** 2 for value in ImageStat.Stat(diff).rms) / 3
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fast and reference resize output.")
+    parser.add_argument("images", nargs="*", help="Images to check (default: a synthetic 48 MP JPEG)")
+    parser.add_argument("--width", type=int, default=800, help="Target width (default: 800)")
+    parser.add_argument("--height", type=int, default=None, help="Target height")
+    parser.add_argument("--min-psnr", type=float, default=40.0,
+                        help="Fail when the fast path scores below this many dB (default: 40)")
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = []
+        for path in args.images:
+            with open(path, "rb") as f:
+                inputs.append((path, f.read()))
+    else:
+        inputs = [("synthetic 48 MP JPEG", synthetic_photo())]
+
+    failed = False
+    for name, data in inputs:
+        reference, reference_time = timed(reference_resize, data, args.width, args.height)
+        fast, fast_time = timed(fast_resize, data, args.width, args.height)
+
+        score = psnr(reference, fast)
+        max_diff = max(high for _, high in ImageChops.difference(
+            reference.convert('RGB'), fast.convert('RGB')).getextrema())
+        ok = score >= args.min_psnr
+        failed = failed or not ok
+
+        print(f"{name}: {reference.size[0]}x{reference.size[1]}  "
+              f"reference {reference_time:.3f}s  fast {fast_time:.3f}s  "
+              f"({reference_time / fast_time:.1f}x)  PSNR {score:.1f} dB  "
+              f"max diff {max_diff}  {'OK' if ok else 'FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Waitress Server
+Runs the app under waitress (for Windows, where gunicorn is not available)
+with the same sizing as gunicorn.conf.py.
+
+waitress is a single process, so it gets all of the machine's job slots as
+JOB_WORKERS and one web worker's worth of threads per slot. It buffers each
+request body (spilling to a temporary file past inbuf_overflow) before the
+app sees it, so the body limit is set just above MAX_CONTENT_LENGTH to let
+the app answer oversize uploads with its own 413.
+"""
+
+import argparse
+import os
+
+from server_sizing import JOB_MEMORY_BYTES, plan
+
+
+def main():
+    sizing = plan()
+    parser = argparse.ArgumentParser(description="Serve the app with waitress.")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', 8000)),
+                        help="Port to listen on (default: $PORT or 8000)")
+    parser.add_argument("--threads", type=int, default=sizing['threads'] * sizing['web_workers'],
+                        help="Request threads (default: sized from CPUs and memory)")
+    args = parser.parse_args()
+
+    # Must be set before the app is imported
+    os.environ.setdefault('JOB_WORKERS', str(sizing['job_workers'] * sizing['web_workers']))
+    os.environ.setdefault('IMAGE_THREADS', str(sizing['image_threads']))
+    os.environ.setdefault('JOB_MAX_TASKS', '50')
+    os.environ.setdefault('JOB_MAX_RSS_BYTES', str(JOB_MEMORY_BYTES))
+
+    from waitress import serve
+    from app import app
+
+    print(f"Serving on {args.host}:{args.port} with {args.threads} threads and "
+          f"{os.environ['JOB_WORKERS']} job processes")
+    serve(
+        app,
+        host=args.host,
+        port=args.port,
+        threads=args.threads,
+        connection_limit=max(100, args.threads * 4),
+        channel_timeout=120,
+        cleanup_interval=30,
+        max_request_body_size=app.config['MAX_CONTENT_LENGTH'] + 1024 * 1024,
+    )
+
+
+if __name__ == "__main__":
+    main()
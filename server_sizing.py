@@ -0,0 +1,100 @@
+"""
+Server Sizing
+Derives worker, thread and job process counts from the machine, shared by
+gunicorn.conf.py and serve_waitress.py.
+
+Uploads are streamed to disk and all PDF/image work runs in each web
+worker's job process pool (JOB_WORKERS), so web workers are I/O-bound and
+the number of job processes is what has to fit the CPUs and memory:
+
+- job slots: one per core, capped by memory at JOB_MEMORY_BYTES each (the
+  heaviest benchmark case, watermarking a 50 MP WebP, peaks at 1.03 GB);
+- web workers: one per job slot, at most MAX_WEB_WORKERS (or WEB_CONCURRENCY),
+  each with WEB_THREADS threads for uploads, polling and downloads;
+- JOB_WORKERS: the job slots split between the web workers;
+- IMAGE_THREADS: the cores left per job slot, so threads never outnumber cores.
+"""
+
+import os
+
+
+JOB_MEMORY_BYTES = 1280 * 1024 * 1024
+WEB_WORKER_BYTES = 96 * 1024 * 1024
+MAX_WEB_WORKERS = 4
+WEB_THREADS = 8
+
+
+def usable_cpus():
+    """CPUs this process may run on (honours affinity and cgroup CPU quotas)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def usable_memory():
+    """Memory available to this process in bytes: the cgroup limit or the machine's RAM."""
+    memory = None
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        pass
+
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit() and (memory is None or int(limit) < memory):
+            memory = int(limit)
+    return memory or 2 * JOB_MEMORY_BYTES
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def plan(cpus=None, memory=None, web_workers=None):
+    """
+    Return the worker, thread and job process counts for a machine, with
+    web_workers web workers if given.
+    """
+    cpus = cpus or usable_cpus()
+    memory = memory or usable_memory()
+
+    job_slots = max(1, min(cpus, (memory - WEB_WORKER_BYTES) // JOB_MEMORY_BYTES))
+    web_workers = web_workers or min(MAX_WEB_WORKERS, job_slots)
+    # Leave room for the web workers themselves
+    job_slots = max(1, min(job_slots, (memory - web_workers * WEB_WORKER_BYTES) // JOB_MEMORY_BYTES))
+    # Every web worker gets at least one job process
+    job_workers = max(1, job_slots // web_workers)
+    return {
+        'cpus': cpus,
+        'memory': memory,
+        'web_workers': web_workers,
+        'threads': WEB_THREADS,
+        'job_workers': job_workers,
+        'image_threads': max(1, cpus // (job_workers * web_workers)),
+    }
+
+
+if __name__ == "__main__":
+    sizing = plan()
+    print(f"{sizing['cpus']} CPUs, {sizing['memory'] / 2**30:.1f} GB: "
+          f"{sizing['web_workers']} web workers x {sizing['threads']} threads, "
+          f"{sizing['job_workers']} job processes per worker, {sizing['image_threads']} image threads per job")
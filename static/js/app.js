@@ -33,6 +33,7 @@ const TOOLS = {
         endpoint: '/split',
         fileKey: 'file',
         showReorder: false,
+        inspect: true,
         options: `
             <div class="option-group">
                 <label>Split Mode</label>
@@ -49,6 +50,14 @@ const TOOLS = {
                         <input type="radio" name="splitMode" value="range">
                         <span>Page Range</span>
                     </label>
+                    <label class="radio-option">
+                        <input type="radio" name="splitMode" value="size">
+                        <span>Max Size</span>
+                    </label>
+                    <label class="radio-option">
+                        <input type="radio" name="splitMode" value="bookmarks">
+                        <span>By Bookmarks</span>
+                    </label>
                 </div>
             </div>
             <div class="option-group" id="splitValueGroup" style="display: none;">
@@ -95,6 +104,7 @@ const TOOLS = {
         endpoint: '/rotate',
         fileKey: 'file',
         showReorder: false,
+        inspect: true,
         options: `
             <div class="option-group">
                 <label>Rotation Angle</label>
@@ -116,7 +126,7 @@ const TOOLS = {
             <div class="option-group">
                 <label>Pages to Rotate</label>
                 <input type="text" id="rotatePages" placeholder="all" value="all">
-                <p class="option-description">Enter "all" or specific pages (e.g., 1,3,5-7)</p>
+                <p class="option-description">Enter "all", "odd", "even" or specific pages (e.g., 1,3,5-7, 10- or -1 for the last page)</p>
             </div>
         `
     },
@@ -133,11 +143,12 @@ const TOOLS = {
         endpoint: '/extract',
         fileKey: 'file',
         showReorder: false,
+        inspect: true,
         options: `
             <div class="option-group">
                 <label>Pages to Extract</label>
                 <input type="text" id="extractPages" placeholder="1-3,5,7-9" required>
-                <p class="option-description">Enter page numbers or ranges (e.g., 1-3,5,7-9)</p>
+                <p class="option-description">Enter page numbers or ranges (e.g., 1-3,5,7-9, 10- to the end, -1 for the last page, odd, even)</p>
             </div>
         `
     },
@@ -163,6 +174,7 @@ const TOOLS = {
                     <option value="Letter">Letter</option>
                     <option value="Legal">Legal</option>
                     <option value="A3">A3</option>
+                    <option value="Fit">Fit to Image</option>
                 </select>
             </div>
         `
@@ -402,6 +414,7 @@ let currentTool = null;
 let files = [];
 let downloadUrl = '';
 let draggedItem = null;
+let pdfInfo = null;
 
 // Initialize
 function init() {
@@ -527,7 +540,7 @@ function setupToolOptions(toolName) {
         modeRadios.forEach(radio => {
             radio.addEventListener('change', () => {
                 const mode = radio.value;
-                if (mode === 'all') {
+                if (mode === 'all' || mode === 'bookmarks') {
                     valueGroup.style.display = 'none';
                 } else if (mode === 'chunks') {
                     valueGroup.style.display = 'block';
@@ -538,7 +551,12 @@ function setupToolOptions(toolName) {
                     valueGroup.style.display = 'block';
                     valueLabel.textContent = 'Page range';
                     valueInput.placeholder = '1-3,5,7-9';
-                    valueDesc.textContent = 'Pages to extract (e.g., 1-3,5,7-9)';
+                    valueDesc.textContent = 'Pages to extract (e.g., 1-3,5,7-9, 10-, -1, odd)';
+                } else if (mode === 'size') {
+                    valueGroup.style.display = 'block';
+                    valueLabel.textContent = 'Max size per part (MB)';
+                    valueInput.placeholder = '10';
+                    valueDesc.textContent = 'Consecutive pages are grouped into parts no larger than this';
                 }
             });
         });
@@ -614,6 +632,31 @@ function addFiles(newFiles) {
 
     updateFileList();
     showFilesSection();
+
+    if (currentTool.inspect) {
+        inspectPdf(files[0]);
+    }
+}
+
+// Fetch the page count of a PDF so page ranges can be typed knowing it
+async function inspectPdf(file) {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    try {
+        const response = await fetch('/inspect', {
+            method: 'POST',
+            body: formData
+        });
+        const result = await response.json();
+
+        if (result.success && files[0] === file) {
+            pdfInfo = { ...result, file };
+            updateFileList();
+        }
+    } catch (error) {
+        // The operation itself reports unreadable files
+    }
 }
 
 // Update file list UI
@@ -663,6 +706,10 @@ function createFileItem(file, index) {
         </div>
     ` : '';
 
+    const pageCount = pdfInfo && pdfInfo.file === file && pdfInfo.page_count !== null
+        ? ` • ${pdfInfo.page_count} page${pdfInfo.page_count !== 1 ? 's' : ''}`
+        : '';
+
     li.innerHTML = `
         ${dragHandle}
         <div class="${iconClass}">
@@ -670,7 +717,7 @@ function createFileItem(file, index) {
         </div>
         <div class="file-info">
             <div class="file-name" title="${escapeHtml(file.name)}">${escapeHtml(file.name)}</div>
-            <div class="file-size">${formatFileSize(file.size)}</div>
+            <div class="file-size">${formatFileSize(file.size)}${pageCount}</div>
         </div>
         <button class="file-remove" data-index="${index}" title="Remove file">
             <svg viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
@@ -800,7 +847,12 @@ async function processFiles() {
             body: formData
         });
 
-        const result = await response.json();
+        let result = await response.json();
+
+        // Work runs as a background job; poll until its result is ready
+        if (response.status === 202 && result.job_id) {
+            result = await waitForJob(result.result_url);
+        }
 
         if (result.success) {
             showSuccess(result);
@@ -812,6 +864,22 @@ async function processFiles() {
     }
 }
 
+// Poll a job's result endpoint until it stops returning 202. A queued job may
+// wait behind long ones; the server fails jobs it loses (worker exit, janitor),
+// and answers 404 once the session is gone, so only the job state ends the wait.
+async function waitForJob(resultUrl) {
+    let delay = 300;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        const response = await fetch(resultUrl);
+        const result = await response.json();
+        if (response.status !== 202) {
+            return result;
+        }
+        delay = Math.min(delay * 1.5, 2000);
+    }
+}
+
 // Add tool-specific options to form data
 function addToolOptions(formData) {
     const toolName = Object.keys(TOOLS).find(key => TOOLS[key] === currentTool);
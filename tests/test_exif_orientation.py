@@ -0,0 +1,63 @@
+"""
+Tests for JPEG rotation through the EXIF Orientation tag.
+"""
+
+import io
+import os
+import struct
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import EXIF_ORIENTATION_TAG, rotate_image_file  # noqa: E402
+
+
+def exif_block(ifd_offset=8, count=1, length=None):
+    """An APP1 EXIF payload with one Orientation entry, optionally cut or corrupted."""
+    block = (b'Exif\x00\x00II' + struct.pack('<HI', 42, ifd_offset) + struct.pack('<H', count)
+             + struct.pack('<HHII', EXIF_ORIENTATION_TAG, 3, 1, 1) + b'\x00' * 4)
+    return block[:length]
+
+
+def jpeg_with_exif(path, block):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(buffer, 'JPEG')
+    data = buffer.getvalue()
+    with open(path, 'wb') as f:
+        f.write(data[:2] + b'\xff\xe1' + struct.pack('>H', len(block) + 2) + block + data[2:])
+    return path
+
+
+def test_orientation_tag_is_rewritten(tmp_path):
+    source = jpeg_with_exif(tmp_path / 'in.jpg', exif_block())
+    output = tmp_path / 'out.jpg'
+
+    success, _, original_size, new_size, _ = rotate_image_file(source, output, 90, use_exif_orientation=True)
+
+    assert success
+    assert (original_size, new_size) == ((40, 20), (20, 40))
+    with Image.open(output) as img:
+        # Pixels untouched, viewers rotate by the tag
+        assert img.size == (40, 20)
+        assert img.getexif()[EXIF_ORIENTATION_TAG] == 6
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+@pytest.mark.parametrize('block', [
+    exif_block(ifd_offset=5000),
+    exif_block(count=50),
+    exif_block(length=15),
+    exif_block(length=9),
+])
+def test_malformed_exif_falls_back_to_rotating_pixels(tmp_path, block):
+    source = jpeg_with_exif(tmp_path / 'in.jpg', block)
+    output = tmp_path / 'out.jpg'
+
+    success, message, _, _, _ = rotate_image_file(source, output, 90, use_exif_orientation=True)
+
+    assert success, message
+    with Image.open(output) as img:
+        assert img.size == (20, 40)
@@ -0,0 +1,60 @@
+"""
+Tests for checking uploads against their file type while they are parsed.
+"""
+
+import io
+import os
+import queue
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import PDF_SNIFF_LENGTH, app  # noqa: E402
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app.config, 'RESULT_CACHE_MAX_BYTES', 0)
+    monkeypatch.setattr('app.start_job_slots', queue.Queue)
+    return tmp_path
+
+
+def post(route, data, filename, **form):
+    return app.test_client().post(route, data=dict(form, file=(io.BytesIO(data), filename)))
+
+
+@pytest.mark.parametrize('data', [
+    PNG_HEADER + b'\x00' * (4 * PDF_SNIFF_LENGTH),
+    b'%PDF-'.rjust(PDF_SNIFF_LENGTH + 5, b' ') + b'\x00' * 100,
+    b'short',
+])
+def test_pdf_route_rejects_other_content(upload_folder, data):
+    response = post('/rotate', data, 'scan.pdf', rotation='90')
+
+    assert response.status_code == 400
+    assert 'does not match' in response.get_json()['error']
+    # Neither a session folder nor a partial upload is left behind
+    assert os.listdir(upload_folder) == []
+
+
+def test_image_route_rejects_a_pdf(upload_folder):
+    response = post('/rotate-image', b'%PDF-1.4\n' + b'\x00' * 100, 'photo.png', rotation='90')
+
+    assert response.status_code == 400
+    assert os.listdir(upload_folder) == []
+
+
+def test_pdf_with_leading_junk_is_accepted(upload_folder):
+    data = b'\x00' * (PDF_SNIFF_LENGTH - 100) + b'%PDF-1.4\n' + b'\x00' * 100
+
+    response = post('/rotate', data, 'scan.pdf', rotation='90')
+
+    assert response.status_code == 202
+    session_folder = upload_folder / response.get_json()['session_id']
+    assert (session_folder / 'scan.pdf').read_bytes() == data
+    assert [name for name in os.listdir(upload_folder) if name.startswith('.')] == []
@@ -0,0 +1,79 @@
+"""
+Tests for the pre-flight PDF index behind /inspect.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import XOBJECT_HEADER_LENGTH, inspect_pdf  # noqa: E402
+
+
+def stream(dictionary, data):
+    return dictionary[:-2] + b'/Length %d >>\nstream\n' % len(data) + data + b'\nendstream'
+
+
+def gray_image(extra=b''):
+    return stream(b'<< /Type /XObject ' + extra + b'/Subtype /Image /Width 1 /Height 1 '
+                  b'/ColorSpace /DeviceGray /BitsPerComponent 8 >>', b'\x00')
+
+
+def write_pdf(path, objects):
+    """Write numbered objects (1 = catalog) with a classic xref table."""
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b'%d 0 obj\n' % number + objects[number] + b'\nendobj\n'
+    xref = len(out)
+    size = max(objects) + 1
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for number in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[number]
+    out += b'trailer << /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+    return path
+
+
+def test_counts_images_in_forms_long_and_nested_dictionaries(tmp_path):
+    padding = b'/Padding [' + b' 0' * XOBJECT_HEADER_LENGTH + b'] '
+    path = write_pdf(tmp_path / 'images.pdf', {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] /Rotate 90 '
+           b'/Resources << /XObject << /F0 4 0 R /Long 6 0 R /Measured 7 0 R >> >> /Contents 8 0 R >>',
+        # Two forms that reference each other; only the inner one draws an image
+        4: stream(b'<< /Type /XObject /Subtype /Form /BBox [0 0 10 10] '
+                  b'/Resources << /XObject << /F1 9 0 R >> >> >>', b'/F1 Do'),
+        9: stream(b'<< /Type /XObject /Subtype /Form /BBox [0 0 10 10] '
+                  b'/Resources << /XObject << /Im 5 0 R /Back 4 0 R >> >> >>', b'/Im Do'),
+        5: gray_image(),
+        # /Subtype past the first XOBJECT_HEADER_LENGTH bytes
+        6: gray_image(padding),
+        # A nested dictionary with its own /Subtype ahead of the image's
+        7: gray_image(b'/Measure << /Type /Measure /Subtype /RL >> '),
+        8: stream(b'<< >>', b'/F0 Do /Long Do /Measured Do'),
+    })
+
+    index = inspect_pdf(path)
+
+    assert index['page_count'] == 1
+    assert index['pages'] == [{'width': 200.0, 'height': 100.0, 'rotation': 90}]
+    assert index['encrypted'] is False
+    assert index['image_count'] == 3
+
+
+def test_forms_without_images_count_none(tmp_path):
+    path = write_pdf(tmp_path / 'form.pdf', {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 10 10] '
+           b'/Resources << /XObject << /F0 4 0 R >> >> >>',
+        # /Group's /S is not the form's subtype, and neither is a nested /Subtype
+        4: stream(b'<< /Type /XObject /Group << /S /Transparency >> /OC << /Subtype /Image >> '
+                  b'/Subtype /Form /BBox [0 0 10 10] >>', b''),
+    })
+
+    assert inspect_pdf(path)['image_count'] == 0
@@ -0,0 +1,115 @@
+"""
+Tests for the deduplicating merge engine.
+"""
+
+import os
+import sys
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NullObject, TextStringObject,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from merge_pdfs import dedupe_new_objects, merge_documents, rewrite_references  # noqa: E402
+
+
+def helvetica(writer):
+    return writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+
+
+def form_pdf(path, field):
+    """A one-page PDF with a text field, a named destination and two copies of one font."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(200, 200)
+    widget = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Annot'),
+        NameObject('/Subtype'): NameObject('/Widget'),
+        NameObject('/FT'): NameObject('/Tx'),
+        NameObject('/T'): TextStringObject(field),
+        NameObject('/Rect'): ArrayObject([FloatObject(10), FloatObject(10), FloatObject(100), FloatObject(30)]),
+        NameObject('/DA'): TextStringObject('/Helv 12 Tf 0 g'),
+        NameObject('/P'): page.indirect_reference,
+    }))
+    page[NameObject('/Annots')] = ArrayObject([widget])
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/Helv'): helvetica(writer)}),
+    })
+    writer._root_object[NameObject('/AcroForm')] = DictionaryObject({
+        NameObject('/Fields'): ArrayObject([widget]),
+        NameObject('/DR'): DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/Helv'): helvetica(writer)}),
+        }),
+        NameObject('/DA'): TextStringObject('/Helv 0 Tf 0 g'),
+    })
+    writer.add_named_destination(field, 0)
+    writer.write(path)
+    return path
+
+
+def dangling_references(reader):
+    """Return the references in reader that resolve to nothing."""
+    dangling = []
+    pending = [reader.trailer]
+    seen = set()
+    while pending:
+        obj = pending.pop()
+        if isinstance(obj, IndirectObject):
+            if obj.idnum in seen:
+                continue
+            seen.add(obj.idnum)
+            target = obj.get_object()
+            if target is None or isinstance(target, NullObject):
+                dangling.append(obj.idnum)
+            else:
+                pending.append(target)
+        elif isinstance(obj, DictionaryObject):
+            pending.extend(obj.raw_get(key) for key in obj)
+        elif isinstance(obj, ArrayObject):
+            pending.extend(obj)
+    return dangling
+
+
+def test_merge_keeps_forms_and_dests_with_one_font(tmp_path):
+    output = tmp_path / 'merged.pdf'
+    total_pages = merge_documents(
+        [form_pdf(tmp_path / 'a.pdf', 'first'), form_pdf(tmp_path / 'b.pdf', 'second')], output
+    )
+
+    reader = PdfReader(output, strict=True)
+    assert total_pages == len(reader.pages) == 2
+    assert dangling_references(reader) == []
+
+    acroform = reader.trailer['/Root']['/AcroForm']
+    assert [field['/T'] for field in acroform['/Fields']] == ['first', 'second']
+    assert acroform['/DR']['/Font']['/Helv']['/BaseFont'] == '/Helvetica'
+    assert set(reader.named_destinations) == {'first', 'second'}
+
+    fonts = {page['/Resources']['/Font'].raw_get('/Helv').idnum for page in reader.pages}
+    fonts.add(acroform['/DR']['/Font'].raw_get('/Helv').idnum)
+    assert len(fonts) == 1
+
+
+def test_references_from_earlier_objects_are_rewritten():
+    writer = PdfWriter()
+    digests, replaced = {}, {}
+    canonical = helvetica(writer)
+    dedupe_new_objects(writer, 0, digests, replaced)
+
+    # An object that existed before the append points at a new duplicate
+    start = len(writer._objects)
+    duplicate = helvetica(writer)
+    writer._root_object[NameObject('/AcroForm')] = DictionaryObject({
+        NameObject('/DR'): DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/Helv'): duplicate}),
+        }),
+    })
+    assert dedupe_new_objects(writer, start, digests, replaced) == 1
+    rewrite_references(writer, replaced)
+
+    assert writer._root_object['/AcroForm']['/DR']['/Font'].raw_get('/Helv').idnum == canonical.idnum
@@ -0,0 +1,100 @@
+"""
+Tests for the page selection engine shared by split, extract and rotate.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import compile_page_selection, select_pages  # noqa: E402
+
+
+def pages(spec, total):
+    return list(select_pages(spec, total))
+
+
+@pytest.mark.parametrize('spec, total, expected', [
+    ('1-3,5', 6, [0, 1, 2, 4]),
+    ('5,1-3', 6, [4, 0, 1, 2]),
+    ('2-4,3-5', 6, [1, 2, 3, 4]),
+    ('all', 3, [0, 1, 2]),
+    ('odd', 5, [0, 2, 4]),
+    ('even', 5, [1, 3]),
+    ('1-9:3', 9, [0, 3, 6]),
+])
+def test_pages_and_ranges(spec, total, expected):
+    assert pages(spec, total) == expected
+
+
+@pytest.mark.parametrize('spec, total, expected', [
+    ('3-', 5, [2, 3, 4]),
+    ('5-', 5, [4]),
+    ('1-', 1, [0]),
+    ('2-:2', 6, [1, 3, 5]),
+])
+def test_open_ranges(spec, total, expected):
+    assert pages(spec, total) == expected
+
+
+@pytest.mark.parametrize('spec, total', [
+    ('10-', 5),
+    ('3-', 2),
+    ('6-', 5),
+])
+def test_open_range_past_the_end_selects_nothing(spec, total):
+    assert pages(spec, total) == []
+    assert len(select_pages(spec, total)) == 0
+
+
+@pytest.mark.parametrize('spec, total, expected', [
+    ('-1', 5, [4]),
+    ('-3--1', 5, [2, 3, 4]),
+    ('-2-', 5, [3, 4]),
+    ('1--2', 5, [0, 1, 2, 3]),
+    ('-10-', 5, [0, 1, 2, 3, 4]),
+])
+def test_negative_pages(spec, total, expected):
+    assert pages(spec, total) == expected
+
+
+@pytest.mark.parametrize('spec, total, expected', [
+    ('5-1', 5, [4, 3, 2, 1, 0]),
+    ('9-1:2', 9, [8, 6, 4, 2, 0]),
+    ('-1--3', 5, [4, 3, 2]),
+    # An explicit descending range is clamped to the document
+    ('10-3', 5, [4, 3, 2]),
+])
+def test_reversed_ranges(spec, total, expected):
+    assert pages(spec, total) == expected
+
+
+@pytest.mark.parametrize('spec, total', [
+    ('7', 5),
+    ('6-9', 5),
+    ('-6', 5),
+    ('10-8', 5),
+    ('1', 0),
+])
+def test_out_of_range_selects_nothing(spec, total):
+    assert pages(spec, total) == []
+
+
+def test_out_of_range_items_are_dropped():
+    assert pages('2,7,9-12,4-', 5) == [1, 3, 4]
+
+
+def test_membership_and_count():
+    selection = select_pages('1-3,2,8', 5)
+    assert len(selection) == 3
+    assert 2 in selection
+    assert 4 not in selection
+    assert -1 not in selection
+
+
+@pytest.mark.parametrize('spec', ['', ',', '0', '1-0', '1-3:0', 'abc', '1--', '1-2-3'])
+def test_invalid_syntax(spec):
+    with pytest.raises(ValueError):
+        compile_page_selection(spec)
@@ -0,0 +1,84 @@
+"""
+Tests for the on-disk result cache behind the job routes.
+"""
+
+import io
+import os
+import queue
+import sys
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, run_job  # noqa: E402
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    """Point the app at temporary folders and queue jobs instead of starting job processes."""
+    for key in ('UPLOAD_FOLDER', 'RESULT_CACHE_FOLDER', 'METRICS_FOLDER'):
+        folder = tmp_path / key.lower()
+        folder.mkdir()
+        monkeypatch.setitem(app.config, key, str(folder))
+    pending = queue.Queue()
+    monkeypatch.setattr('app.start_job_slots', lambda: pending)
+    return pending
+
+
+def sample_pdf():
+    writer = PdfWriter()
+    writer.add_blank_page(200, 100)
+    writer.add_blank_page(200, 100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def rotate(client, data, rotation='90'):
+    return client.post('/rotate', data={
+        'file': (io.BytesIO(data), 'in.pdf'),
+        'rotation': rotation,
+        'pages': '1'
+    })
+
+
+def cache_lookups(client):
+    stats = client.get('/cache/stats').get_json()
+    return stats['hits'], stats['misses']
+
+
+def test_identical_request_is_served_from_the_cache(jobs):
+    client = app.test_client()
+    data = sample_pdf()
+    hits, misses = cache_lookups(client)
+
+    queued = rotate(client, data)
+    assert queued.status_code == 202
+    session_folder, task, args, cache_key = jobs.get_nowait()
+    run_job(session_folder, task, args, cache_key)
+    first = client.get(queued.get_json()['result_url']).get_json()
+
+    cached = rotate(client, data)
+    assert cached.status_code == 200
+    assert jobs.empty()
+    payload = cached.get_json()
+    assert payload['cached'] is True
+    assert payload['filename'] == first['filename']
+    assert payload['session_id'] != first['session_id']
+    assert cache_lookups(client) == (hits + 1, misses + 1)
+
+    output = client.get(f"/download/{payload['session_id']}/{payload['filename']}").data
+    assert [page.rotation for page in PdfReader(io.BytesIO(output)).pages] == [90, 0]
+
+
+def test_different_parameters_miss_the_cache(jobs):
+    client = app.test_client()
+    data = sample_pdf()
+
+    rotate(client, data, '90')
+    run_job(*jobs.get_nowait())
+
+    assert rotate(client, data, '180').status_code == 202
+    assert rotate(client, data + b'\n', '90').status_code == 202
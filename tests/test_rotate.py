@@ -0,0 +1,79 @@
+"""
+Tests for rotating PDF pages with an incremental update.
+"""
+
+import os
+import sys
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import rotate_pdf  # noqa: E402
+
+PAGE_COUNT = 4
+
+
+def xref_table_pdf(path):
+    writer = PdfWriter()
+    for _ in range(PAGE_COUNT):
+        writer.add_blank_page(200, 100)
+    writer.write(path)
+    return path
+
+
+def xref_stream_pdf(path):
+    """The same document with a cross-reference stream instead of a table."""
+    kids = ' '.join(f'{n} 0 R' for n in range(3, 3 + PAGE_COUNT))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids.encode(), PAGE_COUNT),
+    ] + [b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] >>'] * PAGE_COUNT
+
+    out = bytearray(b'%PDF-1.5\n')
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + obj + b'\nendobj\n'
+    xref_number = len(objects) + 1
+    offsets.append(len(out))
+    rows = b'\x00' + b'\x00' * 4 + b'\xff\xff' + b''.join(
+        b'\x01' + offset.to_bytes(4, 'big') + b'\x00\x00' for offset in offsets
+    )
+    out += (b'%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R /Length %d >>\nstream\n'
+            % (xref_number, xref_number + 1, len(rows)))
+    out += rows + b'\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n' % offsets[-1]
+    with open(path, 'wb') as f:
+        f.write(out)
+    return path
+
+
+@pytest.mark.parametrize('make_pdf', [xref_table_pdf, xref_stream_pdf])
+def test_incremental_rotate_appends_to_the_original(tmp_path, make_pdf):
+    source = make_pdf(tmp_path / 'in.pdf')
+    output = tmp_path / 'out.pdf'
+
+    success, message, total_pages, rotated = rotate_pdf(source, output, 90, '2,4', incremental=True)
+
+    assert success, message
+    assert (total_pages, rotated) == (PAGE_COUNT, 2)
+    original = source.read_bytes()
+    assert output.read_bytes().startswith(original)
+    assert output.stat().st_size < 2 * len(original)
+
+    reader = PdfReader(output, strict=True)
+    assert [page.rotation for page in reader.pages] == [0, 90, 0, 90]
+    assert [float(page.mediabox.width) for page in reader.pages] == [200] * PAGE_COUNT
+
+
+def test_rotating_twice_stacks_updates(tmp_path):
+    first = tmp_path / 'first.pdf'
+    second = tmp_path / 'second.pdf'
+
+    rotate_pdf(xref_table_pdf(tmp_path / 'in.pdf'), first, 90, 'all', incremental=True)
+    success, message, _, _ = rotate_pdf(first, second, 180, '1', incremental=True)
+
+    assert success, message
+    assert second.read_bytes().startswith(first.read_bytes())
+    assert [page.rotation for page in PdfReader(second, strict=True).pages] == [270, 90, 90, 90]
@@ -0,0 +1,71 @@
+"""
+Tests for splitting a PDF straight into a stored ZIP archive.
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+from pypdf import PdfReader, PdfWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import split_pdf  # noqa: E402
+
+
+def sized_pdf(path, count):
+    """A PDF whose page n (1-based) is 100 * n points wide."""
+    writer = PdfWriter()
+    for n in range(1, count + 1):
+        writer.add_blank_page(100 * n, 100)
+    writer.write(path)
+    return path
+
+
+def page_widths(data):
+    return [float(page.mediabox.width) for page in PdfReader(io.BytesIO(data), strict=True).pages]
+
+
+def test_each_page_becomes_a_stored_entry(tmp_path):
+    zip_path = tmp_path / 'split.zip'
+
+    success, message, output_path, parts, total_pages = split_pdf(
+        sized_pdf(tmp_path / 'in.pdf', 3), 'all', None, str(zip_path)
+    )
+
+    assert success, message
+    assert (output_path, parts, total_pages) == (str(zip_path), 3, 3)
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ['page_1.pdf', 'page_2.pdf', 'page_3.pdf']
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+        assert [page_widths(archive.read(name)) for name in archive.namelist()] == [[100], [200], [300]]
+
+
+def test_chunks_keep_page_order(tmp_path):
+    zip_path = tmp_path / 'split.zip'
+
+    success, message, _, parts, _ = split_pdf(sized_pdf(tmp_path / 'in.pdf', 5), 'chunks', '2', str(zip_path))
+
+    assert success, message
+    assert parts == 3
+    with zipfile.ZipFile(zip_path) as archive:
+        assert [page_widths(archive.read(name)) for name in archive.namelist()] == [
+            [100, 200], [300, 400], [500]
+        ]
+
+
+def test_single_part_is_written_as_a_pdf(tmp_path):
+    zip_path = tmp_path / 'split.zip'
+
+    success, message, output_path, parts, _ = split_pdf(
+        sized_pdf(tmp_path / 'in.pdf', 4), 'range', '4,2', str(zip_path)
+    )
+
+    assert success, message
+    assert parts == 1
+    assert output_path == str(tmp_path / 'extracted_pages.pdf')
+    assert not zip_path.exists()
+    with open(output_path, 'rb') as f:
+        assert page_widths(f.read()) == [400, 200]
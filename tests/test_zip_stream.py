@@ -0,0 +1,60 @@
+"""
+Tests for the ZIP archives streamed at download time.
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import iter_zip_stream, list_zip_stream_files, plan_zip_stream  # noqa: E402
+
+
+def streamed(files):
+    entries, planned_size = plan_zip_stream(files)
+    return planned_size, b''.join(iter_zip_stream(entries))
+
+
+def test_planned_size_matches_the_stream(tmp_path):
+    output = tmp_path / 'output'
+    output.mkdir()
+    contents = {'a.pdf': b'%PDF-1.4 first', 'b.png': os.urandom(300 * 1024), 'empty.txt': b''}
+    for name, data in contents.items():
+        (output / name).write_bytes(data)
+    (output / 'nested').mkdir()
+
+    planned_size, data = streamed(list_zip_stream_files(output))
+
+    assert len(data) == planned_size
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == sorted(contents)
+        assert {name: archive.read(name) for name in archive.namelist()} == contents
+
+
+def test_non_ascii_names_are_kept(tmp_path):
+    path = tmp_path / 'page.pdf'
+    path.write_bytes(b'data')
+
+    planned_size, data = streamed([('résumé.pdf', path)])
+
+    assert len(data) == planned_size
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.read('résumé.pdf') == b'data'
+
+
+def test_too_many_entries_for_zip32_use_zip64_end_records(tmp_path):
+    path = tmp_path / 'page.pdf'
+    path.write_bytes(b'x')
+    count = 0xFFFF
+
+    planned_size, data = streamed([(f'{n}.pdf', path) for n in range(count)])
+
+    assert len(data) == planned_size
+    # The zip64 end of central directory record and its locator precede the classic one
+    assert data[-22 - 20:-22].startswith(b'PK\x06\x07')
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert len(archive.infolist()) == count
+        assert archive.read(f'{count - 1}.pdf') == b'x'